@@ -1,6 +1,45 @@
+import os
+import sys
+import json
+import math
+import time
+import importlib
+import threading
+import contextlib
+import weakref
+import mmap
+import zlib
+import struct
 import pickle
+import argparse
+import datetime
 import hashlib
+import unicodedata
 import getpass
+import heapq
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from itertools import accumulate, compress, islice
+from collections import Counter, OrderedDict, defaultdict
+
+
+class _DeferredModule:
+    """Module chỉ được import ở lần dùng thuộc tính đầu tiên rồi thay chỗ của chính nó trong globals.
+    asyncio, csv, concurrent.futures chiếm phần lớn thời gian import app.py nhưng menu hiếm khi cần."""
+
+    def __init__(self, name, alias=None):
+        self._name = name
+        self._alias = alias or name
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self._name)
+        globals()[self._alias] = module
+        return getattr(module, attr)
+
+
+asyncio = _DeferredModule('asyncio')
+csv = _DeferredModule('csv')
+futures = _DeferredModule('concurrent.futures', 'futures')
 
 
 # ==================== ĐĂNG NHẬP ====================
@@ -49,6 +88,8 @@ class AuthManager:
 
 
 class Patient:
+    __slots__ = ('id', 'name', 'age', 'gender', 'phone', 'visit_date')
+
     def __init__(self, id, name, age, gender, phone, visit_date):
         self.id = id
         self.name = name
@@ -57,6 +98,17 @@ class Patient:
         self.phone = phone
         self.visit_date = visit_date
 
+    def __setstate__(self, state):
+        """Hỗ trợ unpickle cả trạng thái dạng dict (file pickle cũ) lẫn dạng __slots__"""
+        if isinstance(state, tuple):
+            state = state[1]
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def __reduce__(self):
+        # Pickle gọn dạng tham số khởi tạo: nhanh hơn nhiều khi gửi giữa các process
+        return (Patient, (self.id, self.name, self.age, self.gender, self.phone, self.visit_date))
+
     def __str__(self):
         return f"{self.id}: {self.name}"
     
@@ -92,95 +144,651 @@ class Patient:
         return f"ID: {self.id} | Tên: {self.name} | Tuổi: {self.age} | Giới tính: {self.gender} | SĐT: {self.phone} | Ngày khám: {self.visit_date}"
 
 
+# ==================== ĐO HIỆU NĂNG ====================
+class Metrics:
+    """Bộ đếm và histogram độ trễ cho B-Tree/PatientManager"""
+    BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float('inf'))
+
+    def __init__(self):
+        self.counters = defaultdict(int)
+        self.latency = {}  # thao tác -> [số lần theo từng bucket, tổng thời gian, số lần]
+
+    def observe(self, op, seconds):
+        entry = self.latency.get(op)
+        if entry is None:
+            entry = self.latency[op] = [[0] * len(self.BUCKETS), 0.0, 0]
+        entry[0][bisect_left(self.BUCKETS, seconds)] += 1
+        entry[1] += seconds
+        entry[2] += 1
+
+    def quantile(self, op, q):
+        """Ước lượng phân vị q (cận trên của bucket) từ histogram"""
+        entry = self.latency.get(op)
+        if not entry or not entry[2]:
+            return 0.0
+        target = q * entry[2]
+        seen = 0
+        for bound, count in zip(self.BUCKETS, entry[0]):
+            seen += count
+            if seen >= target:
+                return bound
+        return self.BUCKETS[-1]
+
+    def reset(self):
+        self.counters.clear()
+        self.latency.clear()
+
+    def snapshot(self):
+        """Trả về dict có thể chuyển sang JSON"""
+        latency = {}
+        for op, (buckets, total, count) in self.latency.items():
+            latency[op] = {
+                'count': count,
+                'sum': total,
+                'avg': total / count if count else 0.0,
+                'p50': self.quantile(op, 0.50),
+                'p99': self.quantile(op, 0.99),
+                'buckets': {('+Inf' if bound == float('inf') else repr(bound)): n
+                            for bound, n in zip(self.BUCKETS, buckets)},
+            }
+        return {'counters': dict(self.counters), 'latency': latency}
+
+    def to_prometheus(self, prefix='clinic_btree'):
+        """Xuất theo định dạng văn bản của Prometheus"""
+        lines = []
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        lines.append(f"# TYPE {prefix}_latency_seconds histogram")
+        for op, (buckets, total, count) in sorted(self.latency.items()):
+            cumulative = 0
+            for bound, n in zip(self.BUCKETS, buckets):
+                cumulative += n
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{prefix}_latency_seconds_bucket{{op="{op}",le="{le}"}} {cumulative}')
+            lines.append(f'{prefix}_latency_seconds_sum{{op="{op}"}} {total}')
+            lines.append(f'{prefix}_latency_seconds_count{{op="{op}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, filename):
+        """Ghi file textfile cho node_exporter (ghi file tạm rồi thay thế)"""
+        tmp_filename = filename + '.tmp'
+        with open(tmp_filename, 'w', encoding='utf-8') as file:
+            file.write(self.to_prometheus())
+        os.replace(tmp_filename, filename)
+
+
+def _timed(metrics, op, func):
+    """Bọc func để ghi độ trễ vào histogram op"""
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            metrics.observe(op, time.perf_counter() - start)
+    return wrapper
+
+
+def _counted(metrics, counter, func):
+    """Bọc func để tăng bộ đếm counter mỗi lần gọi"""
+    def wrapper(*args, **kwargs):
+        metrics.counters[counter] += 1
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def _key_id(key):
+    """ID dùng để sắp xếp: patient.id (hoặc PatientRef.id), hoặc chính key nếu key là số"""
+    return key.id if isinstance(key, (Patient, PatientRef)) else key
+
+
 class BTreeNode:
-    def __init__(self, leaf=True):
+    __slots__ = ('keys', 'ids', 'children', 'leaf', 'size', 'epoch', 'dirty', 'offset')
+
+    def __init__(self, leaf=True, epoch=0):
         self.keys = []  # Lưu các đối tượng Patient
+        self.ids = array('q')  # ID của từng key (song song với keys) để tìm bằng bisect
         self.children = []
         self.leaf = leaf
+        self.size = 0  # Tổng số key trong cây con gốc tại node này
+        self.epoch = epoch  # Phiên bản cây tạo ra node; node cũ hơn có thể đang thuộc một snapshot
+        self.dirty = True  # Đã thay đổi từ lần checkpoint gần nhất (cả tổ tiên cũng bẩn vì size đổi)
+        self.offset = None  # Vị trí trong file .nodes của lần ghi gần nhất (None nếu chưa ghi)
+
+    def copy(self, epoch):
+        """Bản sao nông (dùng chung các node con) thuộc phiên bản epoch"""
+        node = BTreeNode(self.leaf, epoch)
+        node.keys = self.keys[:]
+        node.ids = self.ids[:]
+        node.children = self.children[:]
+        node.size = self.size
+        node.offset = self.offset  # Bản sao thay thế node cũ trên đĩa
+        return node
+
+    def recompute_size(self):
+        self.size = len(self.keys) + sum(child.size for child in self.children)
 
     def is_full(self, max_keys):
         return len(self.keys) >= max_keys
 
 
 class BTree:
-    def __init__(self, max_keys=5):
+    # Các phương thức được thay bằng bản có đo đạc khi gọi enable_metrics()
+    INSTRUMENTED = ('insert', 'search', 'delete', 'bulk_load', 'search_many', 'insert_many',
+                    '_insert_non_full', '_delete', '_split_child', '_merge', '_fill',
+                    '_borrow_from_prev', '_borrow_from_next')
+    frozen = False  # True với các snapshot chỉ đọc
+    DISPLAY_LIMIT = 200  # Cây nhiều key hơn thì menu chỉ hiển thị dạng tóm tắt
+    COMPACT_REBUILD_RATIO = 0.25  # compact() xây lại cả cây khi tỉ lệ key đã đánh dấu xóa từ mức này
+    _dead = ()  # PagedBTree không dùng tombstone
+
+    def __init__(self, max_keys=5, append_optimized=True, tombstones=False):
         self.root = BTreeNode()
         self.max_keys = max_keys
         self.t = (max_keys + 1) // 2  # Bậc tối thiểu
+        self.metrics = None
+        # ID tăng dần từ get_next_id luôn rơi vào lá phải nhất: chèn thẳng theo cạnh phải
+        self.append_optimized = append_optimized
+        self._max_id = None      # ID lớn nhất trong cây (None khi cây rỗng)
+        self._right_path = None  # Các node từ root tới lá phải nhất (None khi cần tính lại)
+        # Copy-on-write: node có epoch khác version đang được snapshot dùng chung, phải sao chép trước khi sửa
+        self.version = 0
+        self._snapshots = weakref.WeakValueDictionary()  # version -> snapshot còn được tham chiếu
+        self.dropped = []  # Vị trí trên đĩa của các node đã bị bỏ khỏi cây (cho checkpoint tăng dần)
+        # Trong lúc checkpoint nền ghi: node (hoặc bản sao của nó) -> node đang được ghi; NodeStore.apply()
+        # dùng để gán vị trí mới cho cả các bản sao tạo ra trong lúc ghi
+        self.in_flight = None
+        # Xóa kiểu tombstone: delete chỉ đánh dấu ID (một lần đi xuống), key vẫn nằm trong node
+        # cho tới khi compact() xóa thật theo lô
+        self.tombstones = tombstones
+        self._dead = array('q')    # ID đã đánh dấu xóa nhưng còn trong cây, tăng dần
+        self._dead_shared = False  # _dead đang dùng chung với snapshot, phải sao chép trước khi sửa
+
+    # ==================== ĐO HIỆU NĂNG ====================
+    def enable_metrics(self, metrics=None):
+        """Bật đo đạc bằng cách gán bản bọc của các phương thức lên chính đối tượng này;
+        khi chưa bật, các thao tác chạy đúng mã gốc nên không tốn thêm chi phí"""
+        if self.metrics is not None:
+            self.disable_metrics()
+        metrics = metrics if metrics is not None else Metrics()
+        self.metrics = metrics
+        original = {name: getattr(self, name) for name in self.INSTRUMENTED}
+        
+        self.search = _timed(metrics, 'search', self._counted_search)
+        self.insert = _timed(metrics, 'insert', original['insert'])
+        self.delete = _timed(metrics, 'delete', original['delete'])
+        self.bulk_load = _timed(metrics, 'bulk_load', original['bulk_load'])
+        self.search_many = _timed(metrics, 'search_many', original['search_many'])
+        self.insert_many = _timed(metrics, 'insert_many', original['insert_many'])
+        self._insert_non_full = self._counted_descent(original['_insert_non_full'])
+        self._delete = self._counted_delete(original['_delete'])
+        self._split_child = _counted(metrics, 'splits', original['_split_child'])
+        self._merge = _counted(metrics, 'merges', original['_merge'])
+        self._fill = _counted(metrics, 'fills', original['_fill'])
+        self._borrow_from_prev = _counted(metrics, 'borrows', original['_borrow_from_prev'])
+        self._borrow_from_next = _counted(metrics, 'borrows', original['_borrow_from_next'])
+        return metrics
+
+    def disable_metrics(self):
+        for name in self.INSTRUMENTED:
+            self.__dict__.pop(name, None)
+        self.metrics = None
+
+    def _counted_search(self, patient_id, node=None):
+        """Giống search nhưng đếm số node đã đi qua và số phép so sánh (ước lượng theo bisect)"""
+        counters = self.metrics.counters
+        node = self.root if node is None else node
+        while True:
+            counters['node_visits'] += 1
+            counters['comparisons'] += len(node.keys).bit_length()
+            i = self._lower_bound(node, patient_id)
+            if i < len(node.keys) and _key_id(node.keys[i]) == patient_id:
+                if self._dead and self._is_dead(patient_id):
+                    return None
+                return node.keys[i]
+            if node.leaf:
+                return None
+            node = self._child(node, i)
+
+    def _counted_descent(self, insert_non_full):
+        counters = self.metrics.counters
+
+        def wrapper(node, value, value_id=None):
+            # Đếm đường đi từ node xuống lá trước khi chèn
+            key_id = _key_id(value) if value_id is None else value_id
+            current = node
+            while True:
+                counters['node_visits'] += 1
+                counters['comparisons'] += len(current.keys).bit_length()
+                if current.leaf:
+                    break
+                current = current.children[bisect_right(current.ids, key_id)]
+            return insert_non_full(node, value, value_id)
+        return wrapper
+
+    def _counted_delete(self, delete):
+        counters = self.metrics.counters
+
+        def wrapper(node, value):
+            counters['node_visits'] += 1
+            counters['comparisons'] += len(node.keys).bit_length()
+            return delete(node, value)
+        return wrapper
+
+    # ==================== SNAPSHOT (COPY-ON-WRITE) ====================
+    def snapshot(self):
+        """Trả về bản chỉ đọc của cây hiện tại trong O(1). Các node hiện có được dùng chung;
+        sau đó mọi thao tác ghi sao chép các node trên đường đi (path copying) thay vì sửa tại chỗ.
+        Node chỉ còn snapshot tham chiếu được thu hồi khi snapshot không còn được dùng."""
+        snap = object.__new__(type(self))
+        snap.__dict__.update(self.__dict__)
+        for name in self.INSTRUMENTED:
+            snap.__dict__.pop(name, None)
+        snap.metrics = None
+        snap.frozen = True
+        snap._right_path = None
+        self._snapshots[self.version] = snap
+        self.version += 1
+        self._right_path = None  # Các node trên đường cạnh phải giờ thuộc snapshot
+        self._dead_shared = True
+        return snap
+
+    def as_of(self, version):
+        """Snapshot đã tạo ở phiên bản version (KeyError nếu đã bị thu hồi hoặc chưa từng tạo)"""
+        try:
+            return self._snapshots[version]
+        except KeyError:
+            raise KeyError(f"Không còn snapshot của phiên bản {version}") from None
+
+    def _check_writable(self):
+        if self.frozen:
+            raise TypeError(f"Snapshot phiên bản {self.version} chỉ đọc, không thể sửa")
+
+    def _new_node(self, leaf=True):
+        return BTreeNode(leaf, self.version)
+
+    def _own_root(self):
+        """Root thuộc phiên bản hiện tại (sao chép nếu đang dùng chung với snapshot)"""
+        root = self.root
+        if root.epoch != self.version:
+            root = self.root = self._copy(root)
+        return root
+
+    def _drop(self, node):
+        if self.in_flight is not None and node in self.in_flight:
+            # Vị trí mới chỉ biết sau khi checkpoint nền ghi xong: NodeStore.apply() thay node bằng vị trí
+            self.dropped.append(self.in_flight[node])
+        elif node.offset is not None:
+            self.dropped.append(node.offset)
+
+    def _own(self, parent, index):
+        """Con thứ index của parent (parent đã thuộc phiên bản hiện tại), sao chép nếu cần"""
+        child = parent.children[index]
+        if child.epoch != self.version:
+            child = parent.children[index] = self._copy(child)
+        return child
+    
+    def _copy(self, node):
+        copy = node.copy(self.version)
+        if self.in_flight is not None and node in self.in_flight:
+            self.in_flight[copy] = self.in_flight[node]
+        return copy
 
     # ==================== THÊM BỆNH NHÂN ====================
     def insert(self, patient):
         """Thêm bệnh nhân vào B-Tree (sử dụng patient.id để sắp xếp)"""
+        self._check_writable()
         # Kiểm tra xem bệnh nhân đã tồn tại chưa
-        patient_id = patient.id if isinstance(patient, Patient) else patient
+        patient_id = _key_id(patient)
+        if self.append_optimized and (self._max_id is None or patient_id > self._max_id):
+            # Lớn hơn mọi ID hiện có nên chắc chắn không trùng, không cần search
+            self._append(patient, patient_id)
+            return (True, "Thêm thành công")
+        
         existing = self.search(patient_id)
         if existing:
             return (False, f"Mã bệnh nhân {patient_id} đã tồn tại! (Tên: {existing.name})")
+        if self._dead and self._is_dead(patient_id):
+            self._revive(patient, patient_id)
+            return (True, "Thêm thành công")
         
         root = self.root
         
         # Nếu root đầy, cần split
         if root.is_full(self.max_keys):
-            new_root = BTreeNode(leaf=False)
+            new_root = self._new_node(leaf=False)
             new_root.children.append(self.root)
+            new_root.size = self.root.size
             self._split_child(new_root, 0)
             self.root = new_root
         
-        self._insert_non_full(self.root, patient)
+        self._insert_non_full(self._own_root(), patient, patient_id)
+        if self._max_id is None or patient_id > self._max_id:
+            self._max_id = patient_id
         return (True, "Thêm thành công")
 
-    def _insert_non_full(self, node, value):
-        """Thêm key vào node chưa đầy"""
-        i = len(node.keys) - 1
-        
-        if node.leaf:
-            # Thêm vào node lá
-            node.keys.append(None)
-            while i >= 0 and value < node.keys[i]:
-                node.keys[i + 1] = node.keys[i]
-                i -= 1
-            node.keys[i + 1] = value
-        else:
+    def _append(self, value, value_id):
+        """Chèn key lớn hơn mọi key trong cây: dùng đường cạnh phải đã lưu nếu lá còn chỗ,
+        ngược lại đi xuống theo cạnh phải và tách lệch 90/10 để các node bên trái gần đầy"""
+        path = self._right_path
+        if path is not None and len(path[-1].keys) < self.max_keys:
+            for node in path:
+                node.size += 1
+                node.dirty = True
+            leaf = path[-1]
+            leaf.keys.append(value)
+            leaf.ids.append(value_id)
+            self._max_id = value_id
+            return
+        
+        root = self.root
+        if len(root.keys) >= self.max_keys:
+            new_root = self._new_node(leaf=False)
+            new_root.children.append(root)
+            new_root.size = root.size
+            self._split_child(new_root, 0, self._right_split_point(len(root.keys)))
+            self.root = new_root
+        
+        node = self._own_root()
+        path = []
+        while not node.leaf:
+            node.size += 1
+            node.dirty = True
+            path.append(node)
+            child = node.children[-1]
+            if len(child.keys) >= self.max_keys:
+                self._split_child(node, len(node.children) - 1, self._right_split_point(len(child.keys)))
+            node = self._own(node, -1)
+        node.keys.append(value)
+        node.ids.append(value_id)
+        node.size += 1
+        node.dirty = True
+        path.append(node)
+        self._right_path = path
+        self._max_id = value_id
+
+    @staticmethod
+    def _right_split_point(n):
+        """Vị trí tách node đầy ở cạnh phải: giữ ~90% bên trái, bên phải còn ít nhất 1 key.
+        Các node trên cạnh phải vì vậy có thể ít hơn t - 1 key (giống tách trang phải nhất
+        của SQLite/PostgreSQL); _fill vẫn đúng vì gộp node thiếu chỉ cho ít key hơn."""
+        return max(n // 2, min(n * 9 // 10, n - 2))
+
+    def _insert_non_full(self, node, value, value_id=None):
+        """Thêm key vào node chưa đầy (đi xuống lá bằng vòng lặp, tìm vị trí bằng bisect).
+        Key chắc chắn chưa có trong cây nên mọi node trên đường đi đều tăng size thêm 1."""
+        if value_id is None:
+            value_id = _key_id(value)
+        max_keys = self.max_keys
+        
+        while not node.leaf:
+            node.size += 1
+            node.dirty = True
             # Tìm child phù hợp
-            while i >= 0 and value < node.keys[i]:
-                i -= 1
-            i += 1
+            i = bisect_right(node.ids, value_id)
             
             # Nếu child đầy, split nó
-            if node.children[i].is_full(self.max_keys):
+            if len(node.children[i].keys) >= max_keys:
                 self._split_child(node, i)
-                if value > node.keys[i]:
+                if value_id > node.ids[i]:
                     i += 1
-            
-            self._insert_non_full(node.children[i], value)
+            node = self._own(node, i)
+        
+        # Thêm vào node lá
+        i = bisect_right(node.ids, value_id)
+        node.keys.insert(i, value)
+        node.ids.insert(i, value_id)
+        node.size += 1
+        node.dirty = True
 
-    def _split_child(self, parent, index):
-        """Split child thứ index của parent"""
-        child = parent.children[index]
-        mid_point = len(child.keys) // 2
+    def _split_child(self, parent, index, mid_point=None):
+        """Split child thứ index của parent (mặc định tách ở giữa)"""
+        child = self._own(parent, index)
+        if mid_point is None:
+            mid_point = len(child.keys) // 2
+        self._right_path = None  # Cấu trúc thay đổi, đường cạnh phải phải tính lại
         
         # Tạo node mới
-        new_node = BTreeNode(leaf=child.leaf)
+        new_node = self._new_node(leaf=child.leaf)
         
         # Key ở giữa sẽ được đẩy lên parent
         mid_key = child.keys[mid_point]
+        mid_id = child.ids[mid_point]
         
         # Copy các keys sau mid sang new_node
         new_node.keys = child.keys[mid_point + 1:]
+        new_node.ids = child.ids[mid_point + 1:]
         
         # Giữ lại các keys trước mid ở child
         child.keys = child.keys[:mid_point]
+        del child.ids[mid_point:]
         
         # Nếu không phải leaf, copy children tương ứng
         if not child.leaf:
             new_node.children = child.children[mid_point + 1:]
             child.children = child.children[:mid_point + 1]
         
+        # Cập nhật size: phần chuyển sang new_node và mid_key không còn thuộc child
+        new_node.recompute_size()
+        child.size -= new_node.size + 1
+        child.dirty = parent.dirty = True
+        
         # Chèn new_node vào parent
         parent.children.insert(index + 1, new_node)
         
         # Chèn mid_key vào parent
         parent.keys.insert(index, mid_key)
+        parent.ids.insert(index, mid_id)
+
+    # ==================== THAO TÁC THEO LÔ ====================
+    def search_many(self, ids):
+        """Tìm nhiều ID trong một lần duyệt: sắp xếp rồi cùng đi xuống, các ID thuộc cùng
+        cây con dùng chung đoạn đường. Trả về danh sách Patient/None theo thứ tự đầu vào."""
+        ids = list(ids)
+        targets = sorted(set(ids))
+        found = {}
+        stack = [(self.root, 0, len(targets))]
+        while stack:
+            node, start, end = stack.pop()
+            node_ids = node.ids
+            n = len(node_ids)
+            i = 0
+            j = start
+            while j < end:
+                target = targets[j]
+                i = bisect_left(node_ids, target, i)
+                if i < n and node_ids[i] == target:
+                    found[target] = node.keys[i]
+                    j += 1
+                elif node.leaf:
+                    j += 1
+                else:
+                    # Mọi ID nhỏ hơn separator thứ i đều nằm trong child i
+                    stop = bisect_left(targets, node_ids[i], j, end) if i < n else end
+                    if stop - j == 1:
+                        found[target] = BTree.search(self, target, node.children[i])
+                    else:
+                        stack.append((node.children[i], j, stop))
+                    j = stop
+        if self._dead:
+            for patient_id in self._dead_among(found):
+                del found[patient_id]
+        return [found.get(patient_id) for patient_id in ids]
+
+    def insert_many(self, patients):
+        """Thêm nhiều bệnh nhân theo thứ tự ID, kiểm tra trùng ngay trên đường chèn (không search riêng);
+        key rơi vào cùng lá với key vừa chèn được đặt thẳng vào lá đó, không đi lại từ root.
+        Trả về danh sách (thành công, thông báo) theo thứ tự đầu vào như khi gọi insert lần lượt."""
+        self._check_writable()
+        patients = list(patients)
+        ids = [_key_id(patient) for patient in patients]
+        order = sorted(range(len(patients)), key=ids.__getitem__)
+        results = [None] * len(patients)
+        if self.root.size == 0 and patients:
+            unique = []
+            for position in order:
+                if unique and ids[unique[-1]] == ids[position]:
+                    results[position] = self._duplicate(ids[position], patients[unique[-1]])
+                else:
+                    unique.append(position)
+                    results[position] = (True, "Thêm thành công")
+            self.bulk_load([patients[position] for position in unique])
+            return results
+        
+        max_keys = self.max_keys
+        path = None  # Đường tới lá vừa chèn và separator chặn trên của lá đó (None: không chặn)
+        upper = None
+        previous = None
+        for position in order:
+            patient = patients[position]
+            patient_id = ids[position]
+            if patient_id == previous:
+                results[position] = self._duplicate(patient_id)
+                continue
+            previous = patient_id
+            if self._dead and self._is_dead(patient_id):
+                self._revive(patient, patient_id)
+            elif self.append_optimized and (self._max_id is None or patient_id > self._max_id):
+                # Phần còn lại của lô đều lớn hơn mọi key: dùng đường cạnh phải
+                self._append(patient, patient_id)
+                path = None
+            elif (path is not None and (upper is None or patient_id < upper)
+                  and len(path[-1].keys) < max_keys):
+                leaf = path[-1]
+                i = bisect_left(leaf.ids, patient_id)
+                if i < len(leaf.ids) and leaf.ids[i] == patient_id:
+                    results[position] = self._duplicate(patient_id)
+                    continue
+                for node in path:
+                    node.size += 1
+                    node.dirty = True
+                leaf.keys.insert(i, patient)
+                leaf.ids.insert(i, patient_id)
+            else:
+                path, upper = self._insert_tracked(patient, patient_id)
+                if path is None:
+                    results[position] = self._duplicate(patient_id)
+                    continue
+            if self._max_id is None or patient_id > self._max_id:
+                self._max_id = patient_id
+            results[position] = (True, "Thêm thành công")
+        return results
+
+    def _duplicate(self, patient_id, existing=None):
+        if existing is None:
+            existing = self.search(patient_id)
+        return (False, f"Mã bệnh nhân {patient_id} đã tồn tại! (Tên: {existing.name})")
+
+    def _insert_tracked(self, value, value_id):
+        """Chèn như insert nhưng tự phát hiện key trùng trên đường đi xuống. Trả về đường đi
+        từ root tới lá và separator nhỏ nhất lớn hơn value_id trên đường đi, hoặc (None, None)
+        nếu key đã có (các node vừa tách vẫn hợp lệ, chỉ cần trả lại size đã cộng)."""
+        root = self.root
+        if root.is_full(self.max_keys):
+            new_root = self._new_node(leaf=False)
+            new_root.children.append(root)
+            new_root.size = root.size
+            self._split_child(new_root, 0)
+            self.root = new_root
+        
+        max_keys = self.max_keys
+        node = self._own_root()
+        path = []
+        upper = None
+        while True:
+            node.size += 1
+            node.dirty = True
+            path.append(node)
+            ids = node.ids
+            i = bisect_left(ids, value_id)
+            if i < len(ids) and ids[i] == value_id:
+                break
+            if node.leaf:
+                node.keys.insert(i, value)
+                ids.insert(i, value_id)
+                return path, upper
+            if len(node.children[i].keys) >= max_keys:
+                self._split_child(node, i)
+                if value_id == ids[i]:
+                    break
+                if value_id > ids[i]:
+                    i += 1
+            if i < len(ids):
+                upper = ids[i]
+            node = self._own(node, i)
+        
+        for node in path:
+            node.size -= 1
+        return None, None
+
+    # ==================== XÂY CÂY TỪ DỮ LIỆU ĐÃ SẮP XẾP ====================
+    @classmethod
+    def from_sorted(cls, sorted_iterable, max_keys=5, fill_factor=1.0):
+        """Tạo B-Tree mới từ dãy bệnh nhân đã sắp xếp tăng dần theo ID"""
+        tree = cls(max_keys=max_keys)
+        tree.bulk_load(sorted_iterable, fill_factor)
+        return tree
+
+    def bulk_load(self, sorted_iterable, fill_factor=1.0):
+        """Xây cây từ dưới lên trong O(N) (thay thế nội dung hiện tại).
+        Dữ liệu phải tăng dần nghiêm ngặt theo ID; fill_factor là tỉ lệ lấp đầy mỗi node."""
+        self._check_writable()
+        if not 0 < fill_factor <= 1:
+            raise ValueError("fill_factor phải nằm trong (0, 1]")
+        capacity = max(self.t - 1, 1, min(self.max_keys, int(self.max_keys * fill_factor)))
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            self._drop(node)
+            stack.extend(node.children)
+        
+        keys = list(sorted_iterable)
+        ids = [_key_id(key) for key in keys]
+        max_id = ids[-1] if ids else None
+        children = None  # Các node của level bên dưới (None khi đang xây level lá)
+        while True:
+            sizes = self._partition(len(keys), capacity)
+            level = []
+            separators = []
+            separator_ids = []
+            pos = 0
+            child_pos = 0
+            for j, size in enumerate(sizes):
+                node = self._new_node(leaf=children is None)
+                node.keys = keys[pos:pos + size]
+                node.ids = array('q', ids[pos:pos + size])
+                pos += size
+                if children is not None:
+                    node.children = children[child_pos:child_pos + size + 1]
+                    child_pos += size + 1
+                node.recompute_size()
+                level.append(node)
+                # Key nằm giữa hai node liên tiếp được đẩy lên level trên
+                if j < len(sizes) - 1:
+                    separators.append(keys[pos])
+                    separator_ids.append(ids[pos])
+                    pos += 1
+            
+            if len(level) == 1:
+                self.root = level[0]
+                self._right_path = None
+                self._max_id = max_id
+                self._dead = array('q')
+                self._dead_shared = False
+                return
+            keys = separators
+            ids = separator_ids
+            children = level
+
+    def _partition(self, n, capacity):
+        """Chia n key thành các node cùng level (giữa hai node có 1 key phân cách),
+        trả về số key của từng node sao cho mỗi node không phải root có ít nhất t - 1 key"""
+        min_keys = self.t - 1
+        groups = -(-(n + 1) // (capacity + 1))
+        while groups > 1 and (n - groups + 1) // groups < min_keys:
+            groups -= 1
+        base, extra = divmod(n - groups + 1, groups)
+        return [base + 1 if i < extra else base for i in range(groups)]
 
     # ==================== TÌM KIẾM BỆNH NHÂN ====================
     def search(self, patient_id, node=None):
@@ -188,61 +796,88 @@ class BTree:
         if node is None:
             node = self.root
         
-        for i, key in enumerate(node.keys):
-            if patient_id == key:  # So sánh với patient.id
-                return key  # Trả về đối tượng Patient
-            if patient_id < key:
-                if node.leaf:
+        while True:
+            ids = node.ids
+            i = bisect_left(ids, patient_id)
+            if i < len(ids) and ids[i] == patient_id:
+                if self._dead and self._is_dead(patient_id):
                     return None
-                return self.search(patient_id, node.children[i])
-        
-        if node.leaf:
-            return None
-        return self.search(patient_id, node.children[-1])
+                return node.keys[i]  # Trả về đối tượng Patient
+            if node.leaf:
+                return None
+            node = node.children[i]
 
     # ==================== XÓA BỆNH NHÂN ====================
     def delete(self, patient_id):
-        """Xóa bệnh nhân theo ID"""
+        """Xóa bệnh nhân theo ID (chế độ tombstone: chỉ đánh dấu, compact() xóa thật sau)"""
+        self._check_writable()
         if not self.search(patient_id):
             return False
-        
-        self._delete(self.root, patient_id)
+        if self.tombstones:
+            insort(self._own_dead(), patient_id)
+            return True
+        self._remove(patient_id)
+        return True
+    
+    def _remove(self, patient_id):
+        """Xóa thật key có trong cây, cân bằng lại các node trên đường đi"""
+        self._delete(self._own_root(), patient_id)
+        self._right_path = None
         
         # Nếu root rỗng và có con, thì con trở thành root mới
         if len(self.root.keys) == 0 and not self.root.leaf:
+            self._drop(self.root)
             self.root = self.root.children[0]
         
-        return True
+        if patient_id == self._max_id:
+            self._max_id = self.max_id() if self.root.keys else None
+    
+    def max_id(self):
+        """ID lớn nhất trong cây (0 nếu cây rỗng)"""
+        node = self.root
+        while not node.leaf:
+            node = node.children[-1]
+        return node.ids[-1] if node.ids else 0
     
     def _delete(self, node, value):
         t = self.t
         
         # Tìm vị trí của key
-        i = 0
-        while i < len(node.keys) and value > node.keys[i]:
-            i += 1
+        i = bisect_left(node.ids, value)
+        node.dirty = True
+        
+        # Key chắc chắn nằm trong cây con này (delete đã kiểm tra) nên size giảm 1;
+        # borrow/merge chỉ chuyển key giữa các con nên không đổi size của node
+        if not node.leaf:
+            node.size -= 1
         
         # Trường hợp 1: Key nằm trong node này
-        if i < len(node.keys) and value == node.keys[i]:
+        if i < len(node.ids) and value == node.ids[i]:
             if node.leaf:
                 # Node là lá, xóa trực tiếp
                 node.keys.pop(i)
+                del node.ids[i]
+                node.size -= 1
             else:
                 # Node là nút trong
                 if len(node.children[i].keys) >= t:
                     # Lấy predecessor
                     predecessor = self._get_predecessor(node, i)
+                    predecessor_id = _key_id(predecessor)
                     node.keys[i] = predecessor
-                    self._delete(node.children[i], predecessor.id if isinstance(predecessor, Patient) else predecessor)
+                    node.ids[i] = predecessor_id
+                    self._delete(self._own(node, i), predecessor_id)
                 elif len(node.children[i + 1].keys) >= t:
                     # Lấy successor
                     successor = self._get_successor(node, i)
+                    successor_id = _key_id(successor)
                     node.keys[i] = successor
-                    self._delete(node.children[i + 1], successor.id if isinstance(successor, Patient) else successor)
+                    node.ids[i] = successor_id
+                    self._delete(self._own(node, i + 1), successor_id)
                 else:
                     # Merge hai con
                     self._merge(node, i)
-                    self._delete(node.children[i], value)
+                    self._delete(self._own(node, i), value)
         else:
             # Key không nằm trong node này
             if node.leaf:
@@ -253,9 +888,9 @@ class BTree:
                 self._fill(node, i)
             
             if i > len(node.keys):
-                self._delete(node.children[i - 1], value)
+                self._delete(self._own(node, i - 1), value)
             else:
-                self._delete(node.children[i], value)
+                self._delete(self._own(node, i), value)
     
     def _get_predecessor(self, node, index):
         current = node.children[index]
@@ -282,51 +917,187 @@ class BTree:
                 self._merge(node, index - 1)
     
     def _borrow_from_prev(self, node, index):
-        child = node.children[index]
-        sibling = node.children[index - 1]
+        child = self._own(node, index)
+        sibling = self._own(node, index - 1)
         child.keys.insert(0, node.keys[index - 1])
+        child.ids.insert(0, node.ids[index - 1])
         node.keys[index - 1] = sibling.keys.pop()
+        node.ids[index - 1] = sibling.ids.pop()
+        moved = 1
         if not sibling.leaf:
-            child.children.insert(0, sibling.children.pop())
+            moved_child = sibling.children.pop()
+            child.children.insert(0, moved_child)
+            moved += moved_child.size
+        child.size += moved
+        sibling.size -= moved
+        child.dirty = sibling.dirty = True
     
     def _borrow_from_next(self, node, index):
-        child = node.children[index]
-        sibling = node.children[index + 1]
+        child = self._own(node, index)
+        sibling = self._own(node, index + 1)
         child.keys.append(node.keys[index])
+        child.ids.append(node.ids[index])
         node.keys[index] = sibling.keys.pop(0)
+        node.ids[index] = sibling.ids.pop(0)
+        moved = 1
         if not sibling.leaf:
-            child.children.append(sibling.children.pop(0))
+            moved_child = sibling.children.pop(0)
+            child.children.append(moved_child)
+            moved += moved_child.size
+        child.size += moved
+        sibling.size -= moved
+        child.dirty = sibling.dirty = True
     
     def _merge(self, node, index):
-        child = node.children[index]
-        sibling = node.children[index + 1]
+        child = self._own(node, index)
+        sibling = node.children[index + 1]  # Chỉ đọc rồi bỏ khỏi cây, không cần sao chép
         child.keys.append(node.keys.pop(index))
+        child.ids.append(node.ids.pop(index))
         child.keys.extend(sibling.keys)
+        child.ids.extend(sibling.ids)
         if not child.leaf:
             child.children.extend(sibling.children)
+        child.size += 1 + sibling.size
+        child.dirty = True
         node.children.pop(index + 1)
+        self._drop(sibling)
 
+    # ==================== XÓA KIỂU TOMBSTONE ====================
+    @property
+    def dead_count(self):
+        """Số key đã đánh dấu xóa nhưng chưa được compact() xóa thật"""
+        return len(self._dead)
+    
+    def _is_dead(self, patient_id):
+        dead = self._dead
+        i = bisect_left(dead, patient_id)
+        return i < len(dead) and dead[i] == patient_id
+    
+    def _dead_among(self, ids):
+        return [patient_id for patient_id in ids if self._is_dead(patient_id)]
+    
+    def _own_dead(self):
+        if self._dead_shared:
+            self._dead = array('q', self._dead)
+            self._dead_shared = False
+        return self._dead
+    
+    def _skip_dead(self, keys, lo=None):
+        """Bỏ các key đã đánh dấu xóa khỏi dãy key tăng dần (dò song song với _dead)"""
+        dead = self._dead
+        n = len(dead)
+        j = 0 if lo is None else bisect_left(dead, lo)
+        for key in keys:
+            if j < n:
+                key_id = _key_id(key)
+                if dead[j] <= key_id:
+                    j = bisect_left(dead, key_id, j)
+                    if j < n and dead[j] == key_id:
+                        continue
+            yield key
+    
+    def _revive(self, value, value_id):
+        """Thêm lại ID đã đánh dấu xóa: key vẫn nằm trong cây nên chỉ thay tại chỗ, không đổi cấu trúc"""
+        dead = self._own_dead()
+        del dead[bisect_left(dead, value_id)]
+        node = self._own_root()
+        while True:
+            node.dirty = True
+            i = bisect_left(node.ids, value_id)
+            if i < len(node.ids) and node.ids[i] == value_id:
+                node.keys[i] = value
+                return
+            node = self._own(node, i)
+    
+    def delete_many(self, ids):
+        """Xóa nhiều ID: kiểm tra bằng một lần search_many rồi đánh dấu xóa cả lô. Ngoài chế độ
+        tombstone thì compact() ngay (xây lại cây nếu xóa nhiều). Trả về danh sách key đã xóa."""
+        self._check_writable()
+        ids = sorted(set(ids))
+        removed = [key for key in self.search_many(ids) if key is not None]
+        self._mark_dead(removed)
+        return removed
+    
+    def purge_where(self, predicate):
+        """Xóa mọi bệnh nhân thỏa predicate(patient), ví dụ hồ sơ quá hạn lưu trữ.
+        Trả về danh sách bệnh nhân đã xóa."""
+        self._check_writable()
+        removed = [patient for patient in self.iter_range() if predicate(patient)]
+        self._mark_dead(removed)
+        return removed
+    
+    def _mark_dead(self, keys):
+        """Đánh dấu xóa các key còn sống (đã sắp xếp theo ID)"""
+        if not keys:
+            return
+        ids = [_key_id(key) for key in keys]
+        dead = self._dead
+        self._dead = array('q', heapq.merge(dead, ids) if dead else ids)
+        self._dead_shared = False
+        if not self.tombstones:
+            self.compact()
+    
+    def compact(self, limit=None):
+        """Xóa thật các key đã đánh dấu xóa. Không giới hạn và tỉ lệ key đã xóa từ COMPACT_REBUILD_RATIO
+        trở lên thì xây lại cả cây từ các key còn sống (O(N), node đầy đều); ngược lại xóa từng key
+        (tối đa limit key, lấy từ ID lớn nhất) và cân bằng lại như delete. Trả về số key đã xóa thật."""
+        self._check_writable()
+        dead = self._dead
+        if not dead:
+            return 0
+        if limit is None and len(dead) >= self.root.size * self.COMPACT_REBUILD_RATIO:
+            removed = len(dead)
+            self.bulk_load(BTree.in_order_traversal(self))  # Key thô (LazyBTree không đọc bản ghi)
+            return removed
+        
+        count = len(dead) if limit is None else min(limit, len(dead))
+        batch = dead[len(dead) - count:]
+        for patient_id in reversed(batch):
+            self._remove(patient_id)
+        del self._own_dead()[len(dead) - count:]
+        return count
+    
     # ==================== HIỂN THỊ CẤU TRÚC B-TREE ====================
     def get_tree_height(self, node=None):
-        if node is None:
-            node = self.root
-        if node.leaf:
-            return 1
-        return 1 + self.get_tree_height(node.children[0])
+        """Số level của cây (mọi lá cùng độ sâu nên chỉ cần đi theo nhánh trái nhất)"""
+        node = self.root if node is None else node
+        height = 1
+        while not node.leaf:
+            node = self._child(node, 0)
+            height += 1
+        return height
     
-    def get_nodes_at_level(self, target_level, node=None, current_level=0, result=None):
-        if result is None:
-            result = []
-        if node is None:
-            node = self.root
-        
-        if current_level == target_level:
-            result.append(node)
-        elif not node.leaf:
-            for child in node.children:
-                self.get_nodes_at_level(target_level, child, current_level + 1, result)
-        
-        return result
+    def iter_levels(self, node=None):
+        """Duyệt BFS một lượt từ node (mặc định root), lần lượt trả về (level, các node ở level đó)"""
+        nodes = [self.root if node is None else node]
+        level = 0
+        while True:
+            yield level, nodes
+            if nodes[0].leaf:
+                return
+            children = self._children
+            nodes = [child for parent in nodes for child in children(parent)]
+            level += 1
+    
+    def get_nodes_at_level(self, target_level, node=None):
+        for level, nodes in self.iter_levels(node):
+            if level == target_level:
+                return nodes
+        return []
+    
+    def _node_label(self, node):
+        """Danh sách ID của node để hiển thị; key đã đánh dấu xóa (chờ compact) được ghi trong ngoặc"""
+        if not self._dead:
+            return f"[{', '.join(str(_key_id(k)) for k in node.keys)}]"
+        labels = []
+        for key in node.keys:
+            key_id = _key_id(key)
+            labels.append(f"({key_id})" if self._is_dead(key_id) else str(key_id))
+        return f"[{', '.join(labels)}]"
+    
+    def _print_dead_legend(self):
+        if self._dead:
+            print(f"  (ID) = đã đánh dấu xóa, chờ compact: {len(self._dead)} key")
 
     def display(self):
         """Hiển thị cấu trúc B-Tree theo từng level"""
@@ -338,17 +1109,14 @@ class BTree:
             print("Cây rỗng!")
             return
         
-        height = self.get_tree_height()
+        height = 0
         total_nodes = 0
         
-        for level in range(height):
-            nodes = self.get_nodes_at_level(level)
+        for level, nodes in self.iter_levels():
+            height += 1
             total_nodes += len(nodes)
             
-            nodes_str = []
-            for node in nodes:
-                keys_str = [str(k.id) if isinstance(k, Patient) else str(k) for k in node.keys]
-                nodes_str.append(f"[{', '.join(keys_str)}]")
+            nodes_str = [self._node_label(node) for node in nodes]
             
             if level == 0:
                 print(f"\n  Level {level} (Root): {' '.join(nodes_str)}")
@@ -359,6 +1127,7 @@ class BTree:
         print(f"  Chiều cao cây: {height}")
         print(f"  Tổng số node: {total_nodes}")
         print(f"  Tổng số bệnh nhân: {self.count()}")
+        self._print_dead_legend()
         print("="*70)
 
     def display_visual(self):
@@ -371,24 +1140,74 @@ class BTree:
             print("Cây rỗng!")
             return
         
-        height = self.get_tree_height()
-        
-        for level in range(height):
-            nodes = self.get_nodes_at_level(level)
+        for level, nodes in self.iter_levels():
             indent = "    " * level
             
             for i, node in enumerate(nodes):
-                keys_str = [str(k.id) if isinstance(k, Patient) else str(k) for k in node.keys]
+                label = self._node_label(node)
                 node_type = "(Root)" if level == 0 else "(Leaf)" if node.leaf else "(Internal)"
                 
                 if level == 0:
                     print(f"  ┌{'─'*50}┐")
-                    print(f"  │  Level 0: [{', '.join(keys_str)}] {node_type}")
+                    print(f"  │  Level 0: {label} {node_type}")
                     print(f"  └{'─'*50}┘")
                 else:
                     prefix = "├──" if i < len(nodes) - 1 else "└──"
-                    print(f"  {indent}{prefix} [{', '.join(keys_str)}] {node_type}")
+                    print(f"  {indent}{prefix} {label} {node_type}")
+        
+        self._print_dead_legend()
+        print("="*70)
+
+    def level_summary(self):
+        """Thống kê một lượt BFS: với mỗi level trả về dict số node, số key (kể cả key đã đánh dấu xóa,
+        đếm riêng trong 'dead'), số key ít/nhiều nhất trong một node, ID nhỏ/lớn nhất; kèm histogram
+        tỉ lệ lấp đầy (10 khoảng 10%) của mọi node"""
+        levels = []
+        histogram = [0] * 10
+        max_keys = self.max_keys
+        for level, nodes in self.iter_levels():
+            sizes = [len(node.keys) for node in nodes]
+            for size in sizes:
+                histogram[min(size * 10 // max_keys, 9)] += 1
+            first = next((node.keys[0] for node in nodes if node.keys), None)
+            last = next((node.keys[-1] for node in reversed(nodes) if node.keys), None)
+            dead = sum(len(self._dead_among(node.ids)) for node in nodes) if self._dead else 0
+            levels.append({'level': level, 'nodes': len(nodes), 'keys': sum(sizes), 'dead': dead,
+                           'min_keys': min(sizes), 'max_keys': max(sizes),
+                           'min_id': _key_id(first) if first is not None else None,
+                           'max_id': _key_id(last) if last is not None else None})
+        return levels, histogram
+
+    def display_summary(self):
+        """Hiển thị cây dạng tóm tắt (dùng cho cây lớn): bảng theo level và histogram lấp đầy"""
+        print("\n" + "="*70)
+        print(f"TÓM TẮT CẤU TRÚC B-TREE (max_keys = {self.max_keys})")
+        print("="*70)
+        
+        if not self.root.keys:
+            print("Cây rỗng!")
+            return
         
+        levels, histogram = self.level_summary()
+        dead_column = f" {'Đã xóa':>8}" if self._dead else ''
+        print(f"  {'Level':>5} {'Số node':>10} {'Số key':>12}{dead_column} {'Key/node':>10} {'Lấp đầy':>8}  Khoảng ID")
+        for row in levels:
+            fill = row['keys'] / (row['nodes'] * self.max_keys)
+            dead = f" {row['dead']:>8}" if self._dead else ''
+            print(f"  {row['level']:>5} {row['nodes']:>10} {row['keys']:>12}{dead} "
+                  f"{row['min_keys']:>4} - {row['max_keys']:<3} {fill:>8.1%}  {row['min_id']} .. {row['max_id']}")
+        
+        total_nodes = sum(histogram)
+        print("\n  Phân bố tỉ lệ lấp đầy của node:")
+        for bucket, count in enumerate(histogram):
+            bar = '█' * (round(count / total_nodes * 40) if total_nodes else 0)
+            print(f"    {bucket * 10:>3}-{bucket * 10 + 10:>3}% {count:>10}  {bar}")
+        
+        print("\n" + "-"*70)
+        print(f"  Chiều cao cây: {len(levels)}")
+        print(f"  Tổng số node: {total_nodes}")
+        print(f"  Tổng số bệnh nhân: {self.count()}")
+        self._print_dead_legend()
         print("="*70)
 
     # ==================== DUYỆT CÂY ====================
@@ -396,124 +1215,3449 @@ class BTree:
         """Duyệt cây theo thứ tự tăng dần của patient.id"""
         if result is None:
             result = []
-        if node is None:
-            node = self.root
+        if not self._dead:
+            return self._collect(node, result)
+        dead = set(self._dead)
+        result.extend(key for key in self._collect(node, []) if _key_id(key) not in dead)
+        return result
+    
+    def _collect(self, node, result):
+        """Ghi mọi key của cây con vào result (kể cả key đã đánh dấu xóa), cùng thứ tự duyệt
+        với iter_in_order nhưng ghi thẳng vào list (nhanh hơn generator)"""
+        append = result.append
+        extend = result.extend
+        child_of = self._child
+        stack = [(self.root if node is None else node, 0)]
+        while stack:
+            node, i = stack.pop()
+            if node.leaf:
+                extend(node.keys)
+                continue
+            keys = node.keys
+            if i > 0:
+                append(keys[i - 1])
+            child = child_of(node, i)
+            if child.leaf:
+                extend(child.keys)
+                for j in range(i, len(keys)):
+                    append(keys[j])
+                    extend(child_of(node, j + 1).keys)
+                continue
+            if i < len(keys):
+                stack.append((node, i + 1))
+            stack.append((child, 0))
+        return result
+    
+    def iter_in_order(self, node=None):
+        """Các key của cây con (mặc định cả cây) theo thứ tự tăng dần, dùng stack tường minh
+        thay cho đệ quy; bỏ qua các key đã đánh dấu xóa"""
+        keys = self._iter_in_order(node)
+        return self._skip_dead(keys) if self._dead else keys
+    
+    def _iter_in_order(self, node):
+        # Phần tử (node, i) của stack nghĩa là: trả về key i - 1 rồi đi xuống child i
+        stack = [(self.root if node is None else node, 0)]
+        while stack:
+            node, i = stack.pop()
+            if node.leaf:
+                yield from node.keys
+                continue
+            keys = node.keys
+            if i > 0:
+                yield keys[i - 1]
+            child = self._child(node, i)
+            if child.leaf:
+                # Các con đều là lá: đi hết node này ngay, không qua stack
+                yield from child.keys
+                for j in range(i, len(keys)):
+                    yield keys[j]
+                    yield from self._child(node, j + 1).keys
+                continue
+            if i < len(keys):
+                stack.append((node, i + 1))
+            stack.append((child, 0))
+    
+    def _child(self, node, index):
+        """Node con thứ index (PagedBTree ghi đè để đọc theo số trang)"""
+        return node.children[index]
+
+    def _children(self, node):
+        return node.children
+    
+    def _lower_bound(self, node, patient_id):
+        """Vị trí key đầu tiên có ID >= patient_id trong node"""
+        return bisect_left(node.ids, patient_id)
+    
+    def iter_range(self, lo=None, hi=None):
+        """Duyệt lười các bệnh nhân có ID trong [lo, hi] theo thứ tự tăng dần.
+        Chỉ đi xuống từ root một lần tới key đầu tiên, dùng stack tường minh thay vì đệ quy;
+        không được sửa cây trong lúc đang duyệt. Bỏ qua các key đã đánh dấu xóa."""
+        keys = self._iter_keys(lo, hi)
+        return self._skip_dead(keys, lo) if self._dead else keys
+    
+    def _iter_keys(self, lo, hi):
+        stack = []  # (node, vị trí key kế tiếp cần trả về)
+        node = self.root
+        while True:
+            i = 0 if lo is None else self._lower_bound(node, lo)
+            stack.append((node, i))
+            if node.leaf:
+                break
+            node = self._child(node, i)
         
-        for i, key in enumerate(node.keys):
+        while stack:
+            node, i = stack.pop()
+            if i >= len(node.keys):
+                continue
+            key = node.keys[i]
+            if hi is not None and _key_id(key) > hi:
+                return
+            yield key
+            stack.append((node, i + 1))
             if not node.leaf:
-                self.in_order_traversal(node.children[i], result)
-            result.append(key)
-        
-        if not node.leaf:
-            self.in_order_traversal(node.children[-1], result)
-        
-        return result
+                # Cây con bên phải key vừa trả về: đi xuống nhánh trái nhất
+                child = self._child(node, i + 1)
+                while True:
+                    stack.append((child, 0))
+                    if child.leaf:
+                        break
+                    child = self._child(child, 0)
+    
+    def iter_from(self, patient_id):
+        """Duyệt lười từ bệnh nhân có ID >= patient_id tới hết cây"""
+        return self.iter_range(patient_id, None)
+    
+    def page(self, after_id=None, limit=20):
+        """Trả về tối đa limit bệnh nhân có ID > after_id (phân trang theo ID)"""
+        lo = None if after_id is None else after_id + 1
+        return list(islice(self.iter_range(lo, None), limit))
     
     def count(self):
-        """Đếm số lượng bệnh nhân trong cây"""
-        return len(self.in_order_traversal())
+        """Đếm số lượng bệnh nhân trong cây (O(1) nhờ size của root)"""
+        return self.root.size - len(self._dead)
+    
+    # ==================== THỨ HẠNG (RANK/SELECT) ====================
+    def rank(self, patient_id):
+        """Số bệnh nhân có ID nhỏ hơn patient_id (cũng là vị trí của patient_id nếu có)"""
+        return self._rank(patient_id, inclusive=False) - bisect_left(self._dead, patient_id)
+    
+    def _rank(self, patient_id, inclusive):
+        result = 0
+        node = self.root
+        while True:
+            ids = node.ids
+            i = bisect_right(ids, patient_id) if inclusive else bisect_left(ids, patient_id)
+            result += i
+            if node.leaf:
+                return result
+            for child in node.children[:i]:
+                result += child.size
+            node = node.children[i]
+    
+    def select(self, k):
+        """Trả về bệnh nhân đứng thứ k (đánh số từ 0) theo thứ tự ID"""
+        count = self.count()
+        if not 0 <= k < count:
+            raise IndexError(f"Vị trí {k} nằm ngoài khoảng [0, {count})")
+        if not self._dead:
+            return self._select(k)
+        # Vị trí thật = k + số key đã xóa đứng trước; tăng dần vị trí cho tới khi ổn định
+        position = k
+        while True:
+            key = self._select(position)
+            key_id = _key_id(key)
+            skipped = bisect_right(self._dead, key_id)
+            if position - skipped == k and not self._is_dead(key_id):
+                return key
+            position = k + skipped
+    
+    def _select(self, k):
+        node = self.root
+        while not node.leaf:
+            for i, child in enumerate(node.children):
+                if k < child.size:
+                    node = child
+                    break
+                k -= child.size
+                if k == 0:
+                    return node.keys[i]
+                k -= 1
+        return node.keys[k]
+    
+    def count_range(self, lo, hi):
+        """Số bệnh nhân có ID trong [lo, hi]"""
+        if hi < lo:
+            return 0
+        dead = bisect_right(self._dead, hi) - bisect_left(self._dead, lo)
+        return self._rank(hi, inclusive=True) - self._rank(lo, inclusive=False) - dead
+    
+    def check_invariants(self):
+        """Kiểm tra cấu trúc cây (thứ tự key, keys/ids khớp nhau, size, độ sâu lá);
+        ném AssertionError nếu sai. Dùng khi kiểm thử."""
+        leaf_depths = set()
+        dead = self._dead
+        assert all(a < b for a, b in zip(dead, dead[1:])), "danh sách ID đã xóa không tăng dần"
+        dead_found = 0
+        stack = [(self.root, 0, None, None)]
+        while stack:
+            node, depth, lo, hi = stack.pop()
+            ids = list(node.ids)
+            if dead:
+                dead_found += len(self._dead_among(ids))
+            assert ids == [_key_id(key) for key in node.keys], "keys và ids không khớp"
+            assert all(a < b for a, b in zip(ids, ids[1:])), "key trong node không tăng dần"
+            assert len(ids) <= self.max_keys, "node có quá nhiều key"
+            assert all((lo is None or lo < x) and (hi is None or x < hi) for x in ids), "key nằm sai cây con"
+            if node is not self.root:
+                assert ids, "node rỗng"
+            assert node.epoch <= self.version, "node thuộc phiên bản tương lai"
+            if node.leaf:
+                assert node.size == len(ids), "size của lá sai"
+                leaf_depths.add(depth)
+                continue
+            assert len(node.children) == len(ids) + 1, "số con không bằng số key + 1"
+            assert node.size == len(ids) + sum(child.size for child in node.children), "size của node trong sai"
+            bounds = [lo] + ids + [hi]
+            for i, child in enumerate(node.children):
+                stack.append((child, depth + 1, bounds[i], bounds[i + 1]))
+        assert len(leaf_depths) <= 1, "các lá không cùng độ sâu"
+        assert dead_found == len(dead), "ID đã xóa không còn trong cây"
+        return True
 
 
-# ==================== QUẢN LÝ FILE NHỊ PHÂN ====================
-def save_to_binary(patients, filename='patients.pat'):
-    """Lưu danh sách bệnh nhân vào file nhị phân .pat"""
-    try:
-        with open(filename, 'wb') as file:
-            pickle.dump(patients, file)
-        print(f"✓ Đã lưu {len(patients)} bệnh nhân vào file nhị phân '{filename}'")
-        return True
-    except Exception as e:
-        print(f"✗ Lỗi khi lưu file: {e}")
-        return False
+# ==================== B-TREE TRÊN ĐĨA (PAGED) ====================
+class PagedNode:
+    """Node của PagedBTree: children lưu số trang thay vì đối tượng node"""
+    def __init__(self, page_no, leaf=True):
+        self.page_no = page_no
+        self.keys = []
+        self.children = []
+        self.leaf = leaf
 
+    def is_full(self, max_keys):
+        return len(self.keys) >= max_keys
 
-def load_from_binary(filename='patients.pat'):
-    """Đọc danh sách bệnh nhân từ file nhị phân .pat"""
-    patients = []
-    try:
-        with open(filename, 'rb') as file:
-            patients = pickle.load(file)
-        print(f"✓ Đã đọc {len(patients)} bệnh nhân từ file nhị phân '{filename}'")
-    except FileNotFoundError:
-        print(f"✗ File '{filename}' không tồn tại! Sẽ tạo file mới khi lưu.")
-    except Exception as e:
-        print(f"✗ Lỗi khi đọc file: {e}")
-    return patients
 
+class PagedBTree(BTree):
+    """B-Tree lưu mỗi node trong một trang cố định của file, truy cập qua mmap.
+    Chỉ đọc header khi mở file; các trang được đọc khi cần và giữ trong cache LRU."""
+    MAGIC = b'PBT1'
+    FILE_HEADER = struct.Struct('<4sHHIIIIQ')  # magic, version, max_keys, page_size, root, page_count, free_head, count
+    NODE_HEADER = struct.Struct('<BxH')        # leaf, số key
+    RECORD = struct.Struct('<qH96s8s20s16s')   # id, tuổi, tên, giới tính, SĐT, ngày khám
+    CHILD = struct.Struct('<I')
+    NO_PAGE = 0
 
-# ==================== QUẢN LÝ HỒ SƠ BỆNH NHÂN ====================
-class PatientManager:
-    def __init__(self, filename='patients.pat', max_keys=5):
+    def __init__(self, filename, max_keys=5, cache_pages=256):
         self.filename = filename
-        self.btree = BTree(max_keys=max_keys)
-        self.next_id = 1  # ID tự động tăng
-        self.load_from_file()
-    
-    def load_from_file(self):
-        """Đọc dữ liệu từ file nhị phân và thêm vào B-Tree"""
-        patients = load_from_binary(self.filename)
-        max_id = 0
-        for patient in patients:
-            self.btree.insert(patient)
-            if patient.id > max_id:
-                max_id = patient.id
-        # Cập nhật next_id = max_id + 1
-        self.next_id = max_id + 1
-    
-    def get_next_id(self):
-        """Lấy ID tiếp theo và tự động tăng"""
-        current_id = self.next_id
-        self.next_id += 1
-        return current_id
-    
-    def save_to_file(self):
-        """Lưu tất cả bệnh nhân từ B-Tree vào file nhị phân"""
-        patients = self.btree.in_order_traversal()
-        save_to_binary(patients, self.filename)
-    
-    def add_patient(self):
-        """Thêm bệnh nhân mới"""
-        print("\n" + "-"*40)
-        print("THÊM BỆNH NHÂN MỚI")
-        print("-"*40)
-        
-        try:
-            # ID tự động tăng
-            id = self.get_next_id()
-            print(f"Mã bệnh nhân (ID): {id} (tự động)")
-            
-            name = input("Nhập họ tên bệnh nhân: ")
-            age = int(input("Nhập tuổi: "))
-            gender = input("Nhập giới tính (Nam/Nu): ")
-            phone = input("Nhập số điện thoại: ")
-            visit_date = input("Nhập ngày khám (YYYY-MM-DD): ")
-            
-            patient = Patient(id, name, age, gender, phone, visit_date)
-            success, message = self.btree.insert(patient)
-            
-            if success:
-                self.save_to_file()
-                print(f"✓ Đã thêm bệnh nhân thành công!")
-                print(f"  {patient.display()}")
-            else:
-                print(f"✗ Thêm bệnh nhân thất bại! {message}")
-                # Giảm lại ID nếu thêm thất bại
-                self.next_id -= 1
-            
-        except ValueError:
-            print("✗ Dữ liệu không hợp lệ!")
-            # Giảm lại ID nếu có lỗi
-            self.next_id -= 1
-    
-    def search_patient(self):
-        """Tìm kiếm bệnh nhân theo ID"""
-        print("\n" + "-"*40)
-        print("TÌM KIẾM BỆNH NHÂN")
-        print("-"*40)
+        self.cache_pages = max(cache_pages, 64)
+        self.metrics = None
+        self.cache = OrderedDict()  # page_no -> PagedNode (chỉ node sạch)
+        self.dirty = {}             # page_no -> PagedNode chờ ghi xuống mmap
         
-        try:
+        if not os.path.exists(filename) or os.path.getsize(filename) == 0:
+            self._create(max_keys)
+        self.file = open(filename, 'r+b')
+        self.mm = mmap.mmap(self.file.fileno(), 0)
+        self._read_header()
+
+    # ---------- Quản lý file và trang ----------
+    def _page_size_for(self, max_keys):
+        return (self.NODE_HEADER.size + max_keys * self.RECORD.size
+                + (max_keys + 1) * self.CHILD.size)
+
+    def _create(self, max_keys):
+        page_size = max(self._page_size_for(max_keys), self.FILE_HEADER.size)
+        with open(self.filename, 'wb') as file:
+            # Trang 0 là header, trang 1 là root (lá rỗng)
+            file.write(self.FILE_HEADER.pack(self.MAGIC, 1, max_keys, page_size, 1, 2, self.NO_PAGE, 0))
+            file.write(b'\0' * (page_size - self.FILE_HEADER.size))
+            root = self.NODE_HEADER.pack(1, 0)
+            file.write(root + b'\0' * (page_size - len(root)))
+            file.flush()
+            os.fsync(file.fileno())
+
+    def _read_header(self):
+        magic, version, max_keys, page_size, root, page_count, free_head, count = \
+            self.FILE_HEADER.unpack_from(self.mm, 0)
+        if magic != self.MAGIC or version != 1:
+            self.close()
+            raise ValueError(f"File '{self.filename}' không phải file B-Tree dạng trang!")
+        self.max_keys = max_keys
+        self.t = (max_keys + 1) // 2
+        self.page_size = page_size
+        self.root_page = root
+        self.page_count = page_count
+        self.free_head = free_head
+        self.record_count = count
+
+    def _write_header(self):
+        self.FILE_HEADER.pack_into(self.mm, 0, self.MAGIC, 1, self.max_keys, self.page_size,
+                                   self.root_page, self.page_count, self.free_head, self.record_count)
+
+    def _ensure_capacity(self, page_count):
+        """Mở rộng file (gấp đôi) và map lại khi cần thêm trang"""
+        needed = page_count * self.page_size
+        if needed <= len(self.mm):
+            return
+        new_size = max(needed, len(self.mm) * 2)
+        self.mm.close()
+        self.file.truncate(new_size)
+        self.mm = mmap.mmap(self.file.fileno(), 0)
+
+    def _allocate(self, leaf):
+        if self.free_head != self.NO_PAGE:
+            page_no = self.free_head
+            self.free_head = self.CHILD.unpack_from(self.mm, page_no * self.page_size)[0]
+        else:
+            page_no = self.page_count
+            self.page_count += 1
+            self._ensure_capacity(self.page_count)
+        node = PagedNode(page_no, leaf)
+        self.dirty[page_no] = node
+        return node
+
+    def _free(self, node):
+        """Đưa trang vào danh sách trang trống"""
+        self.dirty.pop(node.page_no, None)
+        self.cache.pop(node.page_no, None)
+        self.CHILD.pack_into(self.mm, node.page_no * self.page_size, self.free_head)
+        self.free_head = node.page_no
+
+    def _node(self, page_no):
+        """Lấy node theo số trang (ưu tiên trang bẩn, rồi cache, cuối cùng đọc từ mmap)"""
+        node = self.dirty.get(page_no)
+        if node is not None:
+            return node
+        node = self.cache.get(page_no)
+        if node is not None:
+            self.cache.move_to_end(page_no)
+            return node
+        node = self._decode(page_no)
+        self.cache[page_no] = node
+        if len(self.cache) > self.cache_pages:
+            self.cache.popitem(last=False)
+        return node
+
+    def _touch(self, node):
+        """Đánh dấu node đã thay đổi, giữ trong bộ nhớ đến lần flush kế tiếp"""
+        self.cache.pop(node.page_no, None)
+        self.dirty[node.page_no] = node
+
+    def _encode_record(self, patient):
+        fields = []
+        for value, size in ((patient.name, 96), (patient.gender, 8), (patient.phone, 20), (patient.visit_date, 16)):
+            data = str(value).encode('utf-8')
+            if len(data) > size:
+                raise ValueError(f"Trường '{value}' dài quá {size} byte")
+            fields.append(data)
+        if not 0 <= patient.age <= 0xFFFF:
+            raise ValueError(f"Tuổi không hợp lệ: {patient.age}")
+        return self.RECORD.pack(patient.id, patient.age, *fields)
+
+    def _decode(self, page_no):
+        offset = page_no * self.page_size
+        leaf, nkeys = self.NODE_HEADER.unpack_from(self.mm, offset)
+        node = PagedNode(page_no, bool(leaf))
+        pos = offset + self.NODE_HEADER.size
+        for _ in range(nkeys):
+            id, age, name, gender, phone, visit_date = self.RECORD.unpack_from(self.mm, pos)
+            node.keys.append(Patient(id, name.rstrip(b'\0').decode('utf-8'), age,
+                                     gender.rstrip(b'\0').decode('utf-8'), phone.rstrip(b'\0').decode('utf-8'),
+                                     visit_date.rstrip(b'\0').decode('utf-8')))
+            pos += self.RECORD.size
+        if not node.leaf:
+            pos = offset + self.NODE_HEADER.size + self.max_keys * self.RECORD.size
+            node.children = [self.CHILD.unpack_from(self.mm, pos + j * self.CHILD.size)[0]
+                             for j in range(nkeys + 1)]
+        return node
+
+    def _write_node(self, node):
+        offset = node.page_no * self.page_size
+        self.NODE_HEADER.pack_into(self.mm, offset, 1 if node.leaf else 0, len(node.keys))
+        pos = offset + self.NODE_HEADER.size
+        for key in node.keys:
+            self.mm[pos:pos + self.RECORD.size] = self._encode_record(key)
+            pos += self.RECORD.size
+        pos = offset + self.NODE_HEADER.size + self.max_keys * self.RECORD.size
+        for j, child in enumerate(node.children):
+            self.CHILD.pack_into(self.mm, pos + j * self.CHILD.size, child)
+
+    def flush(self, sync=True):
+        """Ghi các trang bẩn và header xuống file"""
+        for node in self.dirty.values():
+            self._write_node(node)
+            self.cache[node.page_no] = node
+        self.dirty.clear()
+        while len(self.cache) > self.cache_pages:
+            self.cache.popitem(last=False)
+        self._write_header()
+        if sync:
+            self.mm.flush()
+
+    def close(self):
+        if getattr(self, 'mm', None) is not None and not self.mm.closed:
+            if self.dirty:
+                self.flush()
+            self.mm.close()
+        if getattr(self, 'file', None) is not None:
+            self.file.close()
+
+    @property
+    def root(self):
+        return self._node(self.root_page)
+
+    def _child(self, node, index):
+        return self._node(node.children[index])
+
+    def _children(self, node):
+        return [self._node(page_no) for page_no in node.children]
+
+    def _lower_bound(self, node, patient_id):
+        return bisect_left(node.keys, patient_id, key=_key_id)
+
+    # ---------- Thêm ----------
+    def insert(self, patient):
+        result = self._insert(patient)
+        if result[0]:
+            self.flush()
+        return result
+
+    def insert_many(self, patients):
+        """Chèn lần lượt theo thứ tự ID (các trang trên đường đi còn nóng trong cache)
+        và chỉ ghi các trang bẩn xuống file một lần ở cuối lô"""
+        patients = list(patients)
+        results = [None] * len(patients)
+        for position in sorted(range(len(patients)), key=lambda position: _key_id(patients[position])):
+            results[position] = self._insert(patients[position])
+        self.flush()
+        return results
+
+    def _insert(self, patient):
+        patient_id = patient.id if isinstance(patient, Patient) else patient
+        existing = self.search(patient_id)
+        if existing:
+            return (False, f"Mã bệnh nhân {patient_id} đã tồn tại! (Tên: {existing.name})")
+        self._encode_record(patient)  # Kiểm tra trước khi sửa cây
+        
+        root = self.root
+        if root.is_full(self.max_keys):
+            new_root = self._allocate(leaf=False)
+            new_root.children.append(root.page_no)
+            self._split_child(new_root, 0)
+            self.root_page = new_root.page_no
+            root = new_root
+        
+        node = root
+        while not node.leaf:
+            i = bisect_left(node.keys, patient_id, key=_key_id)
+            child = self._node(node.children[i])
+            if child.is_full(self.max_keys):
+                self._split_child(node, i)
+                if patient_id > node.keys[i].id:
+                    i += 1
+                child = self._node(node.children[i])
+            node = child
+        node.keys.insert(bisect_left(node.keys, patient_id, key=_key_id), patient)
+        self._touch(node)
+        self.record_count += 1
+        return (True, "Thêm thành công")
+
+    def _split_child(self, parent, index):
+        child = self._node(parent.children[index])
+        mid_point = len(child.keys) // 2
+        new_node = self._allocate(leaf=child.leaf)
+        mid_key = child.keys[mid_point]
+        new_node.keys = child.keys[mid_point + 1:]
+        child.keys = child.keys[:mid_point]
+        if not child.leaf:
+            new_node.children = child.children[mid_point + 1:]
+            child.children = child.children[:mid_point + 1]
+        parent.children.insert(index + 1, new_node.page_no)
+        parent.keys.insert(index, mid_key)
+        self._touch(child)
+        self._touch(parent)
+
+    # ---------- Tìm kiếm ----------
+    def search(self, patient_id, node=None):
+        node = self.root if node is None else node
+        while True:
+            i = bisect_left(node.keys, patient_id, key=_key_id)
+            if i < len(node.keys) and node.keys[i].id == patient_id:
+                return node.keys[i]
+            if node.leaf:
+                return None
+            node = self._node(node.children[i])
+
+    def search_many(self, ids):
+        return [self.search(patient_id) for patient_id in ids]
+
+    def max_id(self):
+        node = self.root
+        while not node.leaf:
+            node = self._node(node.children[-1])
+        return node.keys[-1].id if node.keys else 0
+
+    # ---------- Xóa ----------
+    def delete(self, patient_id):
+        if not self.search(patient_id):
+            return False
+        root = self.root
+        self._delete(root, patient_id)
+        if len(root.keys) == 0 and not root.leaf:
+            self.root_page = root.children[0]
+            self._free(root)
+        self.record_count -= 1
+        self.flush()
+        return True
+
+    def _mark_dead(self, keys):
+        """PagedBTree không có tombstone: xóa thật từng key"""
+        for key in keys:
+            self.delete(_key_id(key))
+
+    def _delete(self, node, value):
+        t = self.t
+        i = bisect_left(node.keys, value, key=_key_id)
+        
+        if i < len(node.keys) and node.keys[i].id == value:
+            if node.leaf:
+                node.keys.pop(i)
+                self._touch(node)
+                return
+            left = self._node(node.children[i])
+            right = self._node(node.children[i + 1])
+            if len(left.keys) >= t:
+                predecessor = self._get_predecessor(node, i)
+                node.keys[i] = predecessor
+                self._touch(node)
+                self._delete(left, predecessor.id)
+            elif len(right.keys) >= t:
+                successor = self._get_successor(node, i)
+                node.keys[i] = successor
+                self._touch(node)
+                self._delete(right, successor.id)
+            else:
+                self._merge(node, i)
+                self._delete(self._node(node.children[i]), value)
+        else:
+            if node.leaf:
+                return
+            if len(self._node(node.children[i]).keys) < t:
+                self._fill(node, i)
+            if i > len(node.keys):
+                self._delete(self._node(node.children[i - 1]), value)
+            else:
+                self._delete(self._node(node.children[i]), value)
+
+    def _get_predecessor(self, node, index):
+        current = self._node(node.children[index])
+        while not current.leaf:
+            current = self._node(current.children[-1])
+        return current.keys[-1]
+
+    def _get_successor(self, node, index):
+        current = self._node(node.children[index + 1])
+        while not current.leaf:
+            current = self._node(current.children[0])
+        return current.keys[0]
+
+    def _fill(self, node, index):
+        t = self.t
+        if index > 0 and len(self._node(node.children[index - 1]).keys) >= t:
+            self._borrow_from_prev(node, index)
+        elif index < len(node.children) - 1 and len(self._node(node.children[index + 1]).keys) >= t:
+            self._borrow_from_next(node, index)
+        elif index < len(node.keys):
+            self._merge(node, index)
+        else:
+            self._merge(node, index - 1)
+
+    def _borrow_from_prev(self, node, index):
+        child = self._node(node.children[index])
+        sibling = self._node(node.children[index - 1])
+        child.keys.insert(0, node.keys[index - 1])
+        node.keys[index - 1] = sibling.keys.pop()
+        if not sibling.leaf:
+            child.children.insert(0, sibling.children.pop())
+        self._touch(child)
+        self._touch(sibling)
+        self._touch(node)
+
+    def _borrow_from_next(self, node, index):
+        child = self._node(node.children[index])
+        sibling = self._node(node.children[index + 1])
+        child.keys.append(node.keys[index])
+        node.keys[index] = sibling.keys.pop(0)
+        if not sibling.leaf:
+            child.children.append(sibling.children.pop(0))
+        self._touch(child)
+        self._touch(sibling)
+        self._touch(node)
+
+    def _merge(self, node, index):
+        child = self._node(node.children[index])
+        sibling = self._node(node.children[index + 1])
+        child.keys.append(node.keys.pop(index))
+        child.keys.extend(sibling.keys)
+        if not child.leaf:
+            child.children.extend(sibling.children)
+        node.children.pop(index + 1)
+        self._touch(child)
+        self._touch(node)
+        self._free(sibling)
+
+    # ---------- Xây cây, duyệt và hiển thị ----------
+    def bulk_load(self, sorted_iterable, fill_factor=1.0):
+        """Xây cây trong bộ nhớ bằng BTree.bulk_load rồi ghi từng node thành trang"""
+        if self.record_count:
+            raise ValueError("bulk_load chỉ dùng cho file B-Tree rỗng")
+        tree = BTree.from_sorted(sorted_iterable, self.max_keys, fill_factor)
+        old_root = self.root
+        self.root_page = self._store_subtree(tree.root)
+        self._free(old_root)
+        self.record_count = tree.count()
+        self.flush()
+
+    def _store_subtree(self, mem_node):
+        """Ghi một cây con BTreeNode thành các trang, trả về số trang của gốc"""
+        children = [self._store_subtree(child) for child in mem_node.children]
+        for key in mem_node.keys:
+            self._encode_record(key)
+        node = self._allocate(leaf=mem_node.leaf)
+        node.keys = list(mem_node.keys)
+        node.children = children
+        if len(self.dirty) >= self.cache_pages:
+            self.flush(sync=False)
+        return node.page_no
+
+    def count(self):
+        return self.record_count
+
+    def rank(self, patient_id):
+        """Trang không lưu size của cây con nên đếm bằng cách duyệt các key nhỏ hơn (O(N) như count_range)"""
+        return sum(1 for _ in self.iter_range(None, patient_id - 1))
+
+    def select(self, k):
+        """Bệnh nhân thứ k (từ 0) theo thứ tự ID, duyệt từ đầu cây tới vị trí k"""
+        if not 0 <= k < self.record_count:
+            raise IndexError(f"Vị trí {k} nằm ngoài khoảng [0, {self.record_count})")
+        return next(islice(self.iter_range(), k, None))
+
+    def snapshot(self):
+        """Trang được ghi tại chỗ nên không thể dùng chung node như BTree.snapshot: chép mọi bệnh nhân
+        sang một BTree chỉ đọc trong bộ nhớ (O(N) thời gian và bộ nhớ, không phải O(1))"""
+        snap = BTree.from_sorted(self.iter_range(), self.max_keys)
+        snap.frozen = True
+        return snap
+
+    def count_range(self, lo, hi):
+        return sum(1 for _ in self.iter_range(lo, hi))
+
+
+# ==================== QUẢN LÝ FILE NHỊ PHÂN ====================
+# Định dạng .pat (phiên bản 1):
+#   Header:  magic 'PATB' | version (H) | flags (H) | số bản ghi (Q) | vị trí bảng chuỗi (Q)
+#   Bản ghi: id (q) | tuổi (B) | giới tính (B, chỉ số trong bảng chuỗi) | cờ (B) | số chữ số SĐT (B)
+#            | SĐT dạng số (Q) | ngày khám dạng ordinal (I) | độ dài tên (H) | tên (UTF-8)
+#            | [SĐT thô] | [ngày khám thô]  (B độ dài + UTF-8, chỉ có khi bật cờ tương ứng)
+#   Bảng chuỗi (cuối file): số chuỗi (H) | mỗi chuỗi: B độ dài + UTF-8
+BINARY_MAGIC = b'PATB'
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct('<4sHHQQ')
+BINARY_RECORD = struct.Struct('<qBBBBQIH')
+FLAG_RAW_PHONE = 0x01
+FLAG_RAW_DATE = 0x02
+
+
+def _encode_short_string(value):
+    data = value.encode('utf-8')
+    if len(data) > 255:
+        raise ValueError(f"Chuỗi '{value}' dài quá 255 byte")
+    return bytes((len(data),)) + data
+
+
+def _encode_phone(phone):
+    """SĐT toàn chữ số được lưu thành số nguyên + số chữ số (giữ số 0 ở đầu)"""
+    if phone.isascii() and phone.isdigit() and len(phone) <= 19:
+        return 0, len(phone), int(phone)
+    return FLAG_RAW_PHONE, 0, 0
+
+
+def _encode_date(visit_date):
+    """Ngày dạng YYYY-MM-DD được lưu thành số ngày (date.toordinal)"""
+    try:
+        day = datetime.date.fromisoformat(visit_date)
+    except (TypeError, ValueError):
+        return FLAG_RAW_DATE, 0
+    if day.isoformat() != visit_date:
+        return FLAG_RAW_DATE, 0
+    return 0, day.toordinal()
+
+
+def _gender_index(strings, gender):
+    index = strings.get(gender)
+    if index is None:
+        if len(strings) >= 256:
+            raise ValueError("Quá nhiều giá trị giới tính khác nhau")
+        index = strings[gender] = len(strings)
+    return index
+
+
+def encode_patient(patient, strings):
+    """Mã hóa một Patient thành bytes; strings là dict chuỗi -> chỉ số của bảng chuỗi"""
+    if not 0 <= patient.age <= 255:
+        raise ValueError(f"Tuổi không hợp lệ: {patient.age}")
+    gender = _gender_index(strings, patient.gender)
+    
+    phone_flag, ndigits, phone = _encode_phone(patient.phone)
+    date_flag, ordinal = _encode_date(patient.visit_date)
+    name = patient.name.encode('utf-8')
+    if len(name) > 0xFFFF:
+        raise ValueError("Tên quá dài")
+    
+    parts = [BINARY_RECORD.pack(patient.id, patient.age, gender, phone_flag | date_flag,
+                                ndigits, phone, ordinal, len(name)), name]
+    if phone_flag:
+        parts.append(_encode_short_string(patient.phone))
+    if date_flag:
+        parts.append(_encode_short_string(patient.visit_date))
+    return b''.join(parts)
+
+
+def _read_exact(file, size):
+    data = file.read(size)
+    if len(data) != size:
+        raise ValueError("File nhị phân bị cắt cụt")
+    return data
+
+
+def _read_short_string(file):
+    return _read_exact(file, _read_exact(file, 1)[0]).decode('utf-8')
+
+
+def _short_string_at(buf, pos):
+    """Đọc chuỗi (B độ dài + UTF-8) tại pos, trả về (chuỗi, vị trí kết thúc) hoặc None nếu thiếu dữ liệu"""
+    if pos >= len(buf):
+        return None
+    end = pos + 1 + buf[pos]
+    if end > len(buf):
+        return None
+    return buf[pos + 1:end].decode('utf-8'), end
+
+
+def encode_deltas(values, out=None, start=0):
+    """Mã hóa dãy số nguyên không giảm (từ start) thành hiệu giữa hai số liên tiếp, mỗi hiệu là một varint
+    (7 bit mỗi byte, bit cao = còn byte tiếp theo). ID tuần tự chỉ tốn khoảng 1 byte mỗi số."""
+    if out is None:
+        out = bytearray()
+    previous = start
+    for value in values:
+        delta = value - previous
+        previous = value
+        while delta >= 0x80:
+            out.append(delta & 0x7F | 0x80)
+            delta >>= 7
+        out.append(delta)
+    return out
+
+
+def decode_deltas(buf, pos, count, start=0):
+    """Giải mã count số do encode_deltas tạo ra bắt đầu từ pos, trả về (danh sách số, vị trí kết thúc)"""
+    values = []
+    value = start
+    for _ in range(count):
+        byte = buf[pos]
+        pos += 1
+        delta = byte & 0x7F
+        shift = 7
+        while byte & 0x80:
+            byte = buf[pos]
+            pos += 1
+            delta |= (byte & 0x7F) << shift
+            shift += 7
+        value += delta
+        values.append(value)
+    return values, pos
+
+
+def decode_patient(buf, pos, strings):
+    """Giải mã bản ghi tại vị trí pos của buffer, trả về (Patient, vị trí kết thúc);
+    trả về None nếu buffer chưa chứa đủ bản ghi"""
+    end = pos + BINARY_RECORD.size
+    if end > len(buf):
+        return None
+    id, age, gender, flags, ndigits, phone, ordinal, name_len = BINARY_RECORD.unpack_from(buf, pos)
+    pos, end = end, end + name_len
+    if end > len(buf):
+        return None
+    name = buf[pos:end].decode('utf-8')
+    
+    if flags & FLAG_RAW_PHONE:
+        item = _short_string_at(buf, end)
+        if item is None:
+            return None
+        phone, end = item
+    else:
+        phone = str(phone).zfill(ndigits) if ndigits else ''
+    if flags & FLAG_RAW_DATE:
+        item = _short_string_at(buf, end)
+        if item is None:
+            return None
+        visit_date, end = item
+    else:
+        visit_date = datetime.date.fromordinal(ordinal).isoformat()
+    return Patient(id, name, age, strings[gender], phone, visit_date), end
+
+
+def write_binary(patients, file):
+    """Ghi tuần tự các bệnh nhân (iterable bất kỳ) vào file đã mở, trả về số bản ghi"""
+    start = file.tell()
+    file.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, 0, 0, 0))
+    strings = {}
+    count = 0
+    for patient in patients:
+        file.write(encode_patient(patient, strings))
+        count += 1
+    
+    table_offset = file.tell() - start
+    file.write(struct.pack('<H', len(strings)))
+    for value in strings:
+        file.write(_encode_short_string(value))
+    end = file.tell()
+    # Điền lại header khi đã biết số bản ghi và vị trí bảng chuỗi
+    file.seek(start)
+    file.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, 0, count, table_offset))
+    file.seek(end)
+    return count
+
+
+def iter_binary(filename, chunk_size=1 << 20):
+    """Đọc lần lượt từng bệnh nhân trong file .pat nhị phân (phiên bản 1 đọc theo khối, phiên bản 2 theo block)"""
+    if binary_version(filename) == BLOCK_VERSION:
+        reader = BlockReader(filename)
+        try:
+            yield from reader.iter_range()
+        finally:
+            reader.close()
+        return
+    with open(filename, 'rb') as file:
+        magic, version, flags, count, table_offset = BINARY_HEADER.unpack(_read_exact(file, BINARY_HEADER.size))
+        if magic != BINARY_MAGIC:
+            raise ValueError(f"File '{filename}' không đúng định dạng .pat")
+        if version != BINARY_VERSION:
+            raise ValueError(f"Không hỗ trợ phiên bản định dạng {version}")
+        
+        file.seek(table_offset)
+        strings = [_read_short_string(file) for _ in range(struct.unpack('<H', _read_exact(file, 2))[0])]
+        file.seek(BINARY_HEADER.size)
+        buf = b''
+        pos = 0
+        for _ in range(count):
+            item = decode_patient(buf, pos, strings)
+            while item is None:
+                more = file.read(chunk_size)
+                if not more:
+                    raise ValueError("File nhị phân bị cắt cụt")
+                buf = buf[pos:] + more
+                pos = 0
+                item = decode_patient(buf, pos, strings)
+            patient, pos = item
+            yield patient
+
+
+# Định dạng .pat phiên bản 2 (mặc định khi lưu): bản ghi sắp theo ID, mỗi BLOCK_RECORDS bản ghi được mã hóa
+# theo cột (encode_block) rồi nén zlib thành một block; đọc một bệnh nhân chỉ cần giải nén block chứa nó
+#   Header:  như phiên bản 1 (version = 2), trường cuối là vị trí chỉ mục block
+#   Block:   zlib(encode_block(các bản ghi))
+#   Chỉ mục (cuối file): số block (I) | mỗi block: ID đầu (q) | vị trí (Q) | độ dài nén (I) | số bản ghi (I)
+#            | bảng chuỗi: số chuỗi (H) | mỗi chuỗi: B độ dài + UTF-8
+BLOCK_VERSION = 2
+BLOCK_RECORDS = 4096
+BLOCK_INDEX = struct.Struct('<qQII')
+BLOCK_HEADER = struct.Struct('<IIBBB')  # độ dài phần ID | ngày nhỏ nhất | kiểu mảng ngày | kiểu mảng SĐT | có chuỗi thô
+NAME_RESTART = 16  # Cứ NAME_RESTART tên thì một tên được ghi đầy đủ để đọc lẻ một bản ghi không phải giải cả block
+
+
+def _array_bytes(values):
+    """Dữ liệu little-endian của mảng (không đổi mảng gốc)"""
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _array_at(typecode, buf, pos, count):
+    """Đọc count phần tử little-endian kiểu typecode tại pos, trả về (mảng, vị trí kết thúc)"""
+    values = array(typecode)
+    end = pos + count * values.itemsize
+    values.frombytes(buf[pos:end])
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values, end
+
+
+def encode_block(patients, strings, first_id):
+    """Mã hóa các bệnh nhân (ID không giảm, bắt đầu từ first_id) thành các cột của một block, chưa nén:
+    BLOCK_HEADER | ID (encode_deltas tính từ first_id) | tuổi (B) | giới tính (B, chỉ số bảng chuỗi)
+    | ngày khám - ngày nhỏ nhất (mảng B/H/I) | số chữ số SĐT (B) | SĐT dạng số (mảng I/Q)
+    | độ dài phần đầu trùng với tên trước (B) | độ dài phần còn lại của tên (H) | phần còn lại của các tên
+    | [cờ (B) | SĐT/ngày thô (B độ dài + UTF-8), chỉ có khi có bản ghi bật cờ]"""
+    ages = bytearray()
+    genders = bytearray()
+    days = []
+    ndigits = bytearray()
+    phones = array('Q')
+    prefixes = bytearray()
+    lengths = array('H')
+    suffixes = []
+    flags = bytearray()
+    raw = []
+    dates = {}  # Ngày khám trong một block thường lặp lại: chỉ phân tích mỗi chuỗi ngày một lần
+    previous = b''
+    for j, patient in enumerate(patients):
+        if not 0 <= patient.age <= 255:
+            raise ValueError(f"Tuổi không hợp lệ: {patient.age}")
+        ages.append(patient.age)
+        genders.append(_gender_index(strings, patient.gender))
+        date = dates.get(patient.visit_date)
+        if date is None:
+            date = dates[patient.visit_date] = _encode_date(patient.visit_date)
+        date_flag, ordinal = date
+        days.append(ordinal)
+        phone_flag, digits, phone = _encode_phone(patient.phone)
+        ndigits.append(digits)
+        phones.append(phone)
+        name = patient.name.encode('utf-8')
+        if len(name) > 0xFFFF:
+            raise ValueError("Tên quá dài")
+        shared = 0
+        if j % NAME_RESTART:
+            limit = min(len(name), len(previous), 255)
+            while shared < limit and name[shared] == previous[shared]:
+                shared += 1
+        prefixes.append(shared)
+        lengths.append(len(name) - shared)
+        suffixes.append(name[shared:])
+        previous = name
+        flags.append(phone_flag | date_flag)
+        if phone_flag:
+            raw.append(_encode_short_string(patient.phone))
+        if date_flag:
+            raw.append(_encode_short_string(patient.visit_date))
+    
+    ids = encode_deltas((patient.id for patient in patients), start=first_id)
+    valid = [day for day in days if day]
+    base = min(valid) if valid else 0
+    span = max(valid) - base if valid else 0
+    typecode = 'B' if span < 1 << 8 else 'H' if span < 1 << 16 else 'I'
+    offsets = array(typecode, (day - base if day else 0 for day in days))
+    if phones and max(phones) < 1 << 32:
+        phones = array('I', phones)  # SĐT 10 chữ số bắt đầu bằng 0 vừa 4 byte
+    parts = [BLOCK_HEADER.pack(len(ids), base, ord(typecode), ord(phones.typecode), bool(raw)), ids, ages, genders,
+             _array_bytes(offsets), ndigits, _array_bytes(phones), prefixes, _array_bytes(lengths)]
+    parts += suffixes
+    if raw:
+        parts.append(flags)
+        parts += raw
+    return b''.join(parts)
+
+
+class PatientBlock:
+    """Các cột của một block phiên bản 2 đã giải nén; Patient chỉ được tạo khi đọc tới"""
+    __slots__ = ('ids', 'ages', 'genders', 'base', 'days', 'ndigits', 'phones', 'prefixes', 'starts',
+                 'data', 'raw', 'strings')
+
+    def __init__(self, data, count, first_id, strings):
+        ids_size, self.base, typecode, phone_typecode, has_raw = BLOCK_HEADER.unpack_from(data)
+        pos = BLOCK_HEADER.size
+        if ids_size == count:
+            # Mỗi hiệu đúng một byte (ID gần như liên tiếp): cộng dồn bằng accumulate thay vì giải từng varint
+            self.ids = list(accumulate(data[pos:pos + count], initial=first_id))
+            del self.ids[0]
+        else:
+            self.ids = decode_deltas(data, pos, count, first_id)[0]
+        pos += ids_size
+        self.ages = data[pos:pos + count]
+        self.genders = data[pos + count:pos + 2 * count]
+        self.days, pos = _array_at(chr(typecode), data, pos + 2 * count, count)
+        self.ndigits = data[pos:pos + count]
+        self.phones, pos = _array_at(chr(phone_typecode), data, pos + count, count)
+        self.prefixes = data[pos:pos + count]
+        lengths, pos = _array_at('H', data, pos + count, count)
+        self.starts = list(accumulate(lengths, initial=pos))  # Vị trí phần còn lại của từng tên
+        self.data = data
+        self.strings = strings
+        self.raw = {}  # chỉ số bản ghi -> (SĐT thô hoặc None, ngày thô hoặc None)
+        if has_raw:
+            pos = self.starts[-1]
+            flags = data[pos:pos + count]
+            pos += count
+            for j, flag in enumerate(flags):
+                if flag:
+                    phone = date = None
+                    if flag & FLAG_RAW_PHONE:
+                        phone, pos = _short_string_at(data, pos)
+                    if flag & FLAG_RAW_DATE:
+                        date, pos = _short_string_at(data, pos)
+                    self.raw[j] = (phone, date)
+
+    def find(self, patient_id):
+        """Chỉ số bản ghi có ID patient_id, -1 nếu không có"""
+        j = bisect_left(self.ids, patient_id)
+        return j if j < len(self.ids) and self.ids[j] == patient_id else -1
+
+    def _make(self, j, name, dates):
+        """Tạo Patient thứ j; dates là cache số ngày -> chuỗi ngày dùng chung khi đọc nhiều bản ghi"""
+        raw = self.raw.get(j)
+        phone = raw[0] if raw is not None else None
+        if phone is None:
+            digits = self.ndigits[j]
+            phone = str(self.phones[j]).zfill(digits) if digits else ''
+        visit_date = raw[1] if raw is not None else None
+        if visit_date is None:
+            day = self.days[j]
+            visit_date = dates.get(day)
+            if visit_date is None:
+                visit_date = dates[day] = datetime.date.fromordinal(self.base + day).isoformat()
+        return Patient(self.ids[j], name.decode('utf-8'), self.ages[j], self.strings[self.genders[j]],
+                       phone, visit_date)
+
+    def patient(self, j):
+        """Patient thứ j: chỉ ghép lại tên từ điểm ghi đầy đủ gần nhất trước nó"""
+        name = b''
+        data, starts, prefixes = self.data, self.starts, self.prefixes
+        for k in range(j - j % NAME_RESTART, j + 1):
+            name = name[:prefixes[k]] + data[starts[k]:starts[k + 1]]
+        return self._make(j, name, {})
+
+    def patients(self, start=0):
+        """Lần lượt các Patient từ bản ghi thứ start tới cuối block (vòng lặp của _make viết gộp vào đây
+        vì đây là đường nạp cả file)"""
+        data, starts, prefixes = self.data, self.starts, self.prefixes
+        ids, ages, genders, strings = self.ids, self.ages, self.genders, self.strings
+        days, ndigits, phones, raw, base = self.days, self.ndigits, self.phones, self.raw, self.base
+        dates = {}
+        name = b''
+        for k in range(start - start % NAME_RESTART, start):
+            name = name[:prefixes[k]] + data[starts[k]:starts[k + 1]]
+        for j in range(start, len(ids)):
+            name = name[:prefixes[j]] + data[starts[j]:starts[j + 1]]
+            if raw and j in raw:
+                yield self._make(j, name, dates)
+                continue
+            day = days[j]
+            visit_date = dates.get(day)
+            if visit_date is None:
+                visit_date = dates[day] = datetime.date.fromordinal(base + day).isoformat()
+            digits = ndigits[j]
+            yield Patient(ids[j], name.decode('utf-8'), ages[j], strings[genders[j]],
+                          str(phones[j]).zfill(digits) if digits else '', visit_date)
+
+
+class BlockWriter:
+    """Ghi file .pat phiên bản 2 vào file đã mở từ các bệnh nhân theo ID không giảm. add_block chép nguyên
+    một block đã nén của file khác (khởi tạo với bảng chuỗi của file đó) mà không cần giải nén.
+    Mức nén zlib 4: file lớn hơn mức 6 vài phần trăm nhưng nén nhanh gấp đôi."""
+
+    def __init__(self, file, strings=(), block_records=BLOCK_RECORDS, level=4):
+        self.file = file
+        self.start = file.tell()
+        self.strings = {value: i for i, value in enumerate(strings)}
+        self.block_records = block_records
+        self.level = level
+        self.index = []  # (ID đầu, vị trí, độ dài nén, số bản ghi) của từng block
+        self.count = 0
+        self._patients = []
+        self._last_id = None
+        file.write(BINARY_HEADER.pack(BINARY_MAGIC, BLOCK_VERSION, 0, 0, 0))
+
+    def add(self, patient):
+        if self._last_id is not None and patient.id < self._last_id:
+            raise ValueError("Định dạng phiên bản 2 cần bệnh nhân theo thứ tự ID tăng dần")
+        self._last_id = patient.id
+        self._patients.append(patient)
+        if len(self._patients) >= self.block_records:
+            self._flush()
+
+    def add_block(self, first_id, data, count):
+        self._flush()
+        self._write_block(first_id, data, count)
+        self._last_id = first_id
+
+    def _flush(self):
+        if self._patients:
+            first_id = self._patients[0].id
+            data = zlib.compress(encode_block(self._patients, self.strings, first_id), self.level)
+            self._write_block(first_id, data, len(self._patients))
+            self._patients = []
+
+    def _write_block(self, first_id, data, count):
+        self.index.append((first_id, self.file.tell() - self.start, len(data), count))
+        self.file.write(data)
+        self.count += count
+
+    def finish(self):
+        """Ghi chỉ mục block, bảng chuỗi và điền lại header; trả về số bản ghi"""
+        self._flush()
+        index_offset = self.file.tell() - self.start
+        self.file.write(struct.pack('<I', len(self.index)))
+        for entry in self.index:
+            self.file.write(BLOCK_INDEX.pack(*entry))
+        self.file.write(struct.pack('<H', len(self.strings)))
+        for value in self.strings:
+            self.file.write(_encode_short_string(value))
+        end = self.file.tell()
+        self.file.seek(self.start)
+        self.file.write(BINARY_HEADER.pack(BINARY_MAGIC, BLOCK_VERSION, 0, self.count, index_offset))
+        self.file.seek(end)
+        return self.count
+
+
+def write_blocks(patients, file, block_records=BLOCK_RECORDS):
+    """Ghi các bệnh nhân (theo ID tăng dần) thành file .pat phiên bản 2, trả về số bản ghi"""
+    writer = BlockWriter(file, block_records=block_records)
+    for patient in patients:
+        writer.add(patient)
+    return writer.finish()
+
+
+class BlockReader:
+    """Đọc file .pat phiên bản 2 qua mmap mà không nạp cả file: bộ nhớ chỉ giữ chỉ mục block (ID đầu, vị trí);
+    tìm một ID là tìm nhị phân trên chỉ mục rồi giải nén đúng một block (vài block gần nhất giữ trong LRU)"""
+
+    def __init__(self, filename, cache_blocks=8):
+        self.filename = filename
+        self.cache_blocks = cache_blocks
+        self.cache = OrderedDict()  # số thứ tự block -> PatientBlock
+        self._file = open(filename, 'rb')
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, flags, self.record_count, index_offset = BINARY_HEADER.unpack_from(self._mm, 0)
+            if magic != BINARY_MAGIC:
+                raise ValueError(f"File '{filename}' không đúng định dạng .pat")
+            if version != BLOCK_VERSION:
+                raise ValueError(f"Không hỗ trợ phiên bản định dạng {version}")
+            blocks = struct.unpack_from('<I', self._mm, index_offset)[0]
+            self.first_ids = array('q')
+            self.offsets = array('Q')
+            self.sizes = array('I')
+            self.counts = array('I')
+            pos = index_offset + 4
+            table_offset = pos + blocks * BLOCK_INDEX.size
+            for first_id, offset, size, count in BLOCK_INDEX.iter_unpack(self._mm[pos:table_offset]):
+                self.first_ids.append(first_id)
+                self.offsets.append(offset)
+                self.sizes.append(size)
+                self.counts.append(count)
+            pos = table_offset + 2
+            self.strings = []
+            for _ in range(struct.unpack_from('<H', self._mm, table_offset)[0]):
+                value, pos = _short_string_at(self._mm, pos)
+                self.strings.append(value)
+            self.last_id = self._read_block(blocks - 1).ids[-1] if blocks else 0
+        except Exception:
+            self.close()
+            raise
+        self._lock = threading.Lock()
+
+    def raw_block(self, i):
+        """Dữ liệu đã nén của block i (để chép sang file khác)"""
+        offset = self.offsets[i]
+        return self._mm[offset:offset + self.sizes[i]]
+
+    def _read_block(self, i):
+        """Giải nén và tách cột block i, không qua cache"""
+        return PatientBlock(zlib.decompress(self.raw_block(i)), self.counts[i], self.first_ids[i], self.strings)
+
+    def _block(self, i):
+        with self._lock:
+            block = self.cache.get(i)
+            if block is not None:
+                self.cache.move_to_end(i)
+                return block
+        block = self._read_block(i)
+        with self._lock:
+            self.cache[i] = block
+            if len(self.cache) > self.cache_blocks:
+                self.cache.popitem(last=False)
+        return block
+
+    def get(self, patient_id):
+        """Trả về Patient có ID patient_id hoặc None"""
+        if patient_id > self.last_id:
+            return None
+        i = bisect_right(self.first_ids, patient_id) - 1
+        if i < 0:
+            return None
+        block = self._block(i)
+        j = block.find(patient_id)
+        return block.patient(j) if j >= 0 else None
+
+    def iter_range(self, lo=None, hi=None):
+        """Duyệt bệnh nhân có lo <= ID <= hi theo thứ tự ID; đọc thẳng từng block, không làm xáo trộn cache"""
+        start = 0 if lo is None else max(bisect_right(self.first_ids, lo) - 1, 0)
+        for i in range(start, len(self.first_ids)):
+            if hi is not None and self.first_ids[i] > hi:
+                return
+            block = self._read_block(i)
+            for patient in block.patients(0 if lo is None else bisect_left(block.ids, lo)):
+                if hi is not None and patient.id > hi:
+                    return
+                yield patient
+
+    def nbytes(self):
+        """Kích thước file"""
+        return len(self._mm) if self._mm is not None else 0
+
+    def close(self):
+        self.cache.clear()
+        mm = getattr(self, '_mm', None)
+        if mm is not None:
+            mm.close()
+            self._mm = None
+        self._file.close()
+
+
+class _LegacyUnpickler(pickle.Unpickler):
+    """Chỉ cho phép nạp lớp Patient từ file pickle cũ"""
+    def find_class(self, module, name):
+        if name == 'Patient' and module in ('__main__', 'app'):
+            return Patient
+        raise pickle.UnpicklingError(f"Không cho phép nạp {module}.{name} từ file .pat")
+
+
+def load_legacy_pickle(filename):
+    """Đọc file .pat cũ được ghi bằng pickle"""
+    with open(filename, 'rb') as file:
+        return list(_LegacyUnpickler(file).load())
+
+
+def parse_patient_line(line, delimiter='#'):
+    """Tách một dòng 'id#tên#tuổi#giới tính#SĐT#ngày khám' thành Patient"""
+    fields = line.rstrip('\r\n').split(delimiter)
+    if len(fields) != 6:
+        raise ValueError(f"Cần 6 trường, nhận được {len(fields)}")
+    id, name, age, gender, phone, visit_date = (field.strip() for field in fields)
+    return Patient(int(id), name, int(age), gender, phone, visit_date)
+
+
+def load_from_text(filename, delimiter='#'):
+    """Đọc danh sách bệnh nhân từ file văn bản (như patients.txt)"""
+    with open(filename, 'r', encoding='utf-8') as file:
+        return [parse_patient_line(line, delimiter) for line in file if line.strip()]
+
+
+def detect_format(filename):
+    """Nhận dạng file: 'binary' (định dạng mới), 'pickle' (định dạng cũ) hoặc 'text'"""
+    with open(filename, 'rb') as file:
+        head = file.read(4)
+    if head == BINARY_MAGIC:
+        return 'binary'
+    if head[:1] == b'\x80':
+        return 'pickle'
+    return 'text'
+
+
+def binary_version(filename):
+    """Phiên bản định dạng ghi trong header của file .pat nhị phân"""
+    with open(filename, 'rb') as file:
+        return BINARY_HEADER.unpack(_read_exact(file, BINARY_HEADER.size))[1]
+
+
+def save_to_binary(patients, filename='patients.pat', version=BLOCK_VERSION, before_replace=None):
+    """Lưu danh sách bệnh nhân vào file nhị phân .pat (ghi file tạm rồi thay thế). Phiên bản 2 (mặc định)
+    cần bệnh nhân theo thứ tự ID; phiên bản 1 giữ nguyên thứ tự và cho phép đọc từng bản ghi theo vị trí.
+    before_replace() được gọi sau khi ghi xong file tạm, ngay trước khi thay file (để đóng mmap của file cũ:
+    Windows không cho thay file đang mở)."""
+    tmp_filename = filename + '.tmp'
+    try:
+        with open(tmp_filename, 'wb') as file:
+            if version == BLOCK_VERSION:
+                count = write_blocks(patients, file)
+            else:
+                count = write_binary(patients, file)
+            file.flush()
+            os.fsync(file.fileno())
+        if before_replace is not None:
+            before_replace()
+        os.replace(tmp_filename, filename)
+        print(f"✓ Đã lưu {count} bệnh nhân vào file nhị phân '{filename}'")
+        return True
+    except Exception as e:
+        print(f"✗ Lỗi khi lưu file: {e}")
+        return False
+
+
+def load_from_binary(filename='patients.pat'):
+    """Đọc danh sách bệnh nhân từ file nhị phân .pat (tự nhận dạng file pickle cũ)"""
+    patients = []
+    try:
+        if detect_format(filename) == 'pickle':
+            patients = load_legacy_pickle(filename)
+        else:
+            patients = list(iter_binary(filename))
+        print(f"✓ Đã đọc {len(patients)} bệnh nhân từ file nhị phân '{filename}'")
+    except FileNotFoundError:
+        print(f"✗ File '{filename}' không tồn tại! Sẽ tạo file mới khi lưu.")
+    except Exception as e:
+        print(f"✗ Lỗi khi đọc file: {e}")
+    return patients
+
+
+def convert_to_binary(source, target='patients.pat'):
+    """Chuyển file pickle cũ hoặc file văn bản '#' sang định dạng .pat mới"""
+    file_format = detect_format(source)
+    if file_format == 'pickle':
+        patients = load_legacy_pickle(source)
+    elif file_format == 'text':
+        patients = load_from_text(source)
+    else:
+        patients = list(iter_binary(source))
+    patients.sort(key=lambda patient: patient.id)
+    return save_to_binary(patients, target)
+
+
+def is_sorted_by_id(patients):
+    """Kiểm tra danh sách bệnh nhân có tăng dần nghiêm ngặt theo ID hay không"""
+    return all(patients[i].id < patients[i + 1].id for i in range(len(patients) - 1))
+
+
+# ==================== NẠP BẢN GHI THEO YÊU CẦU (LAZY) ====================
+class PatientRef:
+    """Khóa nhẹ trong cây ở chế độ lazy: chỉ giữ ID và vị trí bản ghi trong file .pat"""
+    __slots__ = ('id', 'offset')
+
+    def __init__(self, id, offset):
+        self.id = id
+        self.offset = offset
+
+    def __repr__(self):
+        return f"PatientRef({self.id}, {self.offset})"
+
+
+def _record_end(buf, pos):
+    """Trả về (ID, vị trí kết thúc) của bản ghi tại pos mà không giải mã các trường còn lại"""
+    id, _, _, flags, _, _, _, name_len = BINARY_RECORD.unpack_from(buf, pos)
+    end = pos + BINARY_RECORD.size + name_len
+    if flags & FLAG_RAW_PHONE:
+        end += 1 + buf[end]
+    if flags & FLAG_RAW_DATE:
+        end += 1 + buf[end]
+    return id, end
+
+
+def patient_nbytes(patient):
+    """Ước lượng bộ nhớ của một Patient (đối tượng + giá trị các trường)"""
+    return sys.getsizeof(patient) + sum(sys.getsizeof(getattr(patient, name)) for name in Patient.__slots__)
+
+
+class RecordStore:
+    """Đọc Patient từ file .pat theo vị trí bản ghi (qua mmap) và giữ các bản ghi đã giải mã
+    trong LRU giới hạn theo số bản ghi (max_entries) và/hoặc số byte ước lượng (max_bytes)"""
+
+    def __init__(self, filename, max_entries=10000, max_bytes=None):
+        self.filename = filename
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._file = open(filename, 'rb')
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, flags, self.record_count, table_offset = BINARY_HEADER.unpack_from(self._mm, 0)
+            if magic != BINARY_MAGIC:
+                raise ValueError(f"File '{filename}' không đúng định dạng .pat")
+            if version != BINARY_VERSION:
+                raise ValueError(f"Không hỗ trợ phiên bản định dạng {version}")
+            pos = table_offset + 2
+            self.strings = []
+            for _ in range(struct.unpack_from('<H', self._mm, table_offset)[0]):
+                value, pos = _short_string_at(self._mm, pos)
+                self.strings.append(value)
+        except Exception:
+            self.close()
+            raise
+        self.cache = OrderedDict()  # offset -> (Patient, số byte ước lượng)
+        self._lock = threading.Lock()  # Máy chủ cho nhiều luồng đọc cùng lúc
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def refs(self):
+        """Duyệt file một lần, sinh PatientRef của từng bản ghi theo thứ tự trong file"""
+        pos = BINARY_HEADER.size
+        for _ in range(self.record_count):
+            id, end = _record_end(self._mm, pos)
+            yield PatientRef(id, pos)
+            pos = end
+
+    def read(self, ref):
+        """Giải mã bản ghi của ref trực tiếp từ file, không qua cache"""
+        item = decode_patient(self._mm, ref.offset, self.strings)
+        if item is None:
+            raise ValueError(f"Bản ghi tại vị trí {ref.offset} bị cắt cụt")
+        return item[0]
+
+    def get(self, ref):
+        """Trả về Patient của ref, ưu tiên lấy từ cache (cập nhật thứ tự LRU)"""
+        with self._lock:
+            entry = self.cache.get(ref.offset)
+            if entry is not None:
+                self.hits += 1
+                self.cache.move_to_end(ref.offset)
+                return entry[0]
+            self.misses += 1
+            patient = self.read(ref)
+            size = patient_nbytes(patient)
+            self.cache[ref.offset] = (patient, size)
+            self.nbytes += size
+            self._evict()
+            return patient
+
+    def _evict(self):
+        cache = self.cache
+        while cache and ((self.max_entries is not None and len(cache) > self.max_entries)
+                         or (self.max_bytes is not None and self.nbytes > self.max_bytes)):
+            _, (_, size) = cache.popitem(last=False)
+            self.nbytes -= size
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'entries': len(self.cache), 'bytes': self.nbytes, 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'hit_rate': self.hits / lookups if lookups else 0.0}
+
+    def close(self):
+        self.cache.clear()
+        self.nbytes = 0
+        mm = getattr(self, '_mm', None)
+        if mm is not None:
+            mm.close()
+            self._mm = None
+        self._file.close()
+
+
+class LazyBTree(BTree):
+    """B-Tree giữ PatientRef thay cho Patient; bản ghi được đọc từ RecordStore khi cần.
+    Bệnh nhân thêm sau khi nạp vẫn là Patient trong cây cho tới lần lưu file kế tiếp."""
+
+    def __init__(self, max_keys=5, store=None, tombstones=False):
+        super().__init__(max_keys, tombstones=tombstones)
+        self.store = store
+
+    def _resolve(self, key):
+        if type(key) is PatientRef:
+            return self.store.get(key)
+        return key
+
+    def search(self, patient_id, node=None):
+        return self._resolve(BTree.search(self, patient_id, node))
+
+    def search_many(self, ids):
+        return [self._resolve(key) for key in BTree.search_many(self, ids)]
+
+    def _counted_search(self, patient_id, node=None):
+        return self._resolve(BTree._counted_search(self, patient_id, node))
+
+    def iter_range(self, lo=None, hi=None, cached=True):
+        """Như BTree.iter_range; cached=False đọc thẳng từ file để lần quét toàn bộ
+        (lưu file, tạo chỉ mục) không đẩy các bản ghi nóng ra khỏi cache"""
+        keys = BTree.iter_range(self, lo, hi)
+        if cached:
+            return map(self._resolve, keys)
+        read = self.store.read if self.store is not None else None
+        return (read(key) if type(key) is PatientRef else key for key in keys)
+
+    def select(self, k):
+        return self._resolve(BTree.select(self, k))
+
+    def iter_in_order(self, node=None):
+        return map(self._resolve, BTree.iter_in_order(self, node))
+
+    def in_order_traversal(self, node=None, result=None):
+        if result is None:
+            result = []
+        result.extend(self.iter_in_order(node))
+        return result
+
+
+# ==================== NHẬT KÝ GHI TRƯỚC (WAL) ====================
+def patient_to_fields(patient):
+    """Chuyển Patient thành danh sách trường để ghi nhật ký"""
+    return [patient.id, patient.name, patient.age, patient.gender, patient.phone, patient.visit_date]
+
+
+def patient_from_fields(fields):
+    """Tạo lại Patient từ danh sách trường trong nhật ký"""
+    return Patient(*fields)
+
+
+class Journal:
+    """Nhật ký chỉ ghi thêm: mỗi thao tác thêm/xóa là một bản ghi có độ dài và CRC32"""
+    HEADER = struct.Struct('<II')  # (độ dài payload, crc32 của payload)
+    MAX_RECORD = 1 << 20
+
+    def __init__(self, filename, fsync=True):
+        self.filename = filename
+        self.rotated_filename = filename + '.old'  # Phần nhật ký đang chờ checkpoint nền ghi xong
+        self.fsync = fsync
+        self.file = None
+        self.entries = 0  # Số bản ghi kể từ checkpoint gần nhất
+
+    def replay(self, truncate=True):
+        """Đọc lại các bản ghi hợp lệ (phần đã xoay vòng trước, nếu còn); phần đuôi bị cắt dở/hỏng
+        sẽ bị bỏ và cắt khỏi file. truncate=False thì không sửa file: tiến trình khác có thể đang
+        ghi dở bản ghi cuối"""
+        records = self._replay_file(self.rotated_filename, truncate) + self._replay_file(self.filename, truncate)
+        self.entries = len(records)
+        return records
+
+    def _replay_file(self, filename, truncate=True):
+        records = []
+        valid_end = 0
+        try:
+            with open(filename, 'rb') as file:
+                data = file.read()
+        except FileNotFoundError:
+            return records
+        
+        offset = 0
+        header_size = self.HEADER.size
+        while offset + header_size <= len(data):
+            length, crc = self.HEADER.unpack_from(data, offset)
+            start = offset + header_size
+            end = start + length
+            if length > self.MAX_RECORD or end > len(data):
+                break
+            payload = data[start:end]
+            if zlib.crc32(payload) != crc:
+                break
+            try:
+                op, value = json.loads(payload.decode('utf-8'))
+            except (ValueError, UnicodeDecodeError):
+                break
+            records.append((op, value))
+            offset = valid_end = end
+        
+        if valid_end < len(data) and truncate:
+            print(f"✗ Nhật ký '{filename}' bị cắt dở, bỏ qua {len(data) - valid_end} byte cuối")
+            with open(filename, 'r+b') as file:
+                file.truncate(valid_end)
+        return records
+
+    def open(self):
+        if self.file is None:
+            self.file = open(self.filename, 'ab')
+
+    def append(self, op, value, sync=True):
+        """Ghi một bản ghi; sync=True thì fsync trước khi trả về,
+        sync=False để gom nhiều bản ghi rồi gọi sync() một lần (group commit)"""
+        self.open()
+        payload = json.dumps([op, value], ensure_ascii=False).encode('utf-8')
+        self.file.write(self.HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+        self.entries += 1
+        if sync:
+            self.sync()
+
+    def sync(self):
+        """Đẩy các bản ghi đang nằm trong bộ đệm xuống đĩa"""
+        if self.file is None:
+            return
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+
+    def reset(self):
+        """Xóa nhật ký sau khi snapshot đã được ghi an toàn"""
+        self.open()
+        self.file.truncate(0)
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+        self.discard_rotated()
+        self.entries = 0
+
+    def rotate(self):
+        """Chuyển các bản ghi hiện có sang file .old cho checkpoint nền, ghi tiếp vào file mới.
+        Nếu .old còn sót lại (checkpoint trước bị lỗi) thì nối thêm vào cuối file đó."""
+        self.sync()
+        self.close()
+        if os.path.exists(self.rotated_filename):
+            with open(self.filename, 'rb') as source, open(self.rotated_filename, 'ab') as target:
+                target.write(source.read())
+                target.flush()
+                if self.fsync:
+                    os.fsync(target.fileno())
+            os.remove(self.filename)
+        elif os.path.exists(self.filename):
+            os.replace(self.filename, self.rotated_filename)
+        self.entries = 0
+        self.open()
+
+    def discard_rotated(self):
+        """Xóa phần nhật ký đã xoay vòng khi checkpoint chứa nó đã ghi xong"""
+        try:
+            os.remove(self.rotated_filename)
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+# ==================== CHECKPOINT TĂNG DẦN ====================
+# File .nodes (chỉ ghi thêm): mỗi checkpoint ghi thêm các node bẩn (con trước cha) và bảng chuỗi,
+# fsync, rồi mới ghi header trỏ tới root mới. Node không đổi giữ nguyên vị trí cũ trong file.
+#   Header: 2 bản ở vị trí 0 và 64, ghi luân phiên; dùng bản có CRC đúng và seq lớn nhất
+#           magic 'PATN' | version (H) | max_keys (H) | seq (Q) | vị trí root (Q) | cuối dữ liệu (Q)
+#           | vị trí bảng chuỗi (Q) | số byte node còn dùng (Q) | crc32 (I)
+#   Node:   cờ lá (B) | số key (H) | các bản ghi như file .pat | [vị trí các con (Q) nếu là node trong]
+#   Bảng chuỗi: số chuỗi (H) | mỗi chuỗi: B độ dài + UTF-8
+NODE_MAGIC = b'PATN'
+NODE_VERSION = 1
+NODE_FILE_HEADER = struct.Struct('<4sHHQQQQQ')
+NODE_HEADER_SLOT = 64
+NODE_DATA_START = 2 * NODE_HEADER_SLOT
+NODE_HEADER = struct.Struct('<BH')
+NODE_CHILD = struct.Struct('<Q')
+
+
+def dirty_nodes(root, include_clean=False):
+    """Các node cần ghi theo thứ tự con trước cha. Node sạch có cả cây con sạch
+    nên không cần đi xuống; include_clean=True lấy toàn bộ cây (khi ghi lại từ đầu)"""
+    result = []
+    stack = [(root, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded:
+            result.append(node)
+            continue
+        if not (include_clean or node.dirty):
+            continue
+        stack.append((node, True))
+        if not node.leaf:
+            stack.extend((child, False) for child in reversed(node.children))
+    return result
+
+
+class NodeStore:
+    """Lưu các node của BTree trong bộ nhớ vào file .nodes; mỗi checkpoint chỉ ghi các node bẩn.
+    File được ghi lại từ đầu khi phần dữ liệu cũ không còn dùng chiếm quá nửa file."""
+    COMPACT_MIN_BYTES = 1 << 20
+
+    def __init__(self, filename, max_keys=5, fsync=True):
+        self.filename = filename
+        self.max_keys = max_keys
+        self.fsync = fsync
+        self.seq = 0
+        self.root_offset = None  # None khi chưa có checkpoint nào hoàn tất
+        self.end = NODE_DATA_START
+        self.table_offset = 0
+        self.live_bytes = 0
+        self.strings = {}  # Chuỗi dùng chung (giới tính) -> chỉ số, như bảng chuỗi của .pat
+        self.extents = {}  # Vị trí node còn dùng -> số byte
+        self.bytes_written = 0
+        self._read_header()
+
+    def _read_header(self):
+        try:
+            with open(self.filename, 'rb') as file:
+                data = file.read(NODE_DATA_START)
+        except FileNotFoundError:
+            return
+        best = None
+        for slot in range(2):
+            raw = data[slot * NODE_HEADER_SLOT:slot * NODE_HEADER_SLOT + NODE_FILE_HEADER.size + 4]
+            if len(raw) < NODE_FILE_HEADER.size + 4:
+                continue
+            if zlib.crc32(raw[:NODE_FILE_HEADER.size]) != struct.unpack_from('<I', raw, NODE_FILE_HEADER.size)[0]:
+                continue
+            fields = NODE_FILE_HEADER.unpack_from(raw)
+            if fields[0] == NODE_MAGIC and (best is None or fields[3] > best[3]):
+                best = fields
+        if best is None:
+            return  # Checkpoint đầu tiên chưa hoàn tất: coi như chưa có
+        _, version, _, self.seq, self.root_offset, self.end, self.table_offset, self.live_bytes = best
+        if version != NODE_VERSION:
+            raise ValueError(f"Không hỗ trợ phiên bản file node {version}")
+
+    def exists(self):
+        return self.root_offset is not None
+
+    # ---------- Đọc ----------
+    def load(self, tree):
+        """Dựng lại cây từ checkpoint gần nhất vào tree; mọi node đều sạch. Trả về số bệnh nhân."""
+        with open(self.filename, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            strings = []
+            pos = self.table_offset + 2
+            for _ in range(struct.unpack_from('<H', buf, self.table_offset)[0]):
+                value, pos = _short_string_at(buf, pos)
+                strings.append(value)
+            self.strings = {value: i for i, value in enumerate(strings)}
+            self.extents = {}
+            tree.root = self._load_node(buf, self.root_offset, strings, tree.version)
+        tree._right_path = None
+        tree._max_id = tree.max_id() if tree.root.keys else None
+        return tree.root.size
+
+    def _load_node(self, buf, offset, strings, epoch):
+        leaf, count = NODE_HEADER.unpack_from(buf, offset)
+        node = BTreeNode(bool(leaf), epoch)
+        pos = offset + NODE_HEADER.size
+        for _ in range(count):
+            item = decode_patient(buf, pos, strings)
+            if item is None:
+                raise ValueError(f"Node tại vị trí {offset} bị cắt cụt")
+            patient, pos = item
+            node.keys.append(patient)
+        node.ids = array('q', (patient.id for patient in node.keys))
+        if not leaf:
+            for _ in range(count + 1):
+                node.children.append(self._load_node(buf, NODE_CHILD.unpack_from(buf, pos)[0], strings, epoch))
+                pos += NODE_CHILD.size
+        node.recompute_size()
+        node.dirty = False
+        node.offset = offset
+        self.extents[offset] = pos - offset
+        return node
+
+    # ---------- Ghi ----------
+    def prepare(self, tree):
+        """Bước đồng bộ của checkpoint (chạy khi không có thao tác ghi xen vào): gom node bẩn (cả cây nếu
+        lần này ghi lại file từ đầu), lấy danh sách vị trí bị bỏ và chốt phiên bản để luồng nền ghi trên
+        các node bất biến. Kết quả của write() phải được apply() trên luồng sở hữu cây."""
+        garbage = self.end - NODE_DATA_START - self.live_bytes
+        rewrite = tree.root.dirty and self.end > self.COMPACT_MIN_BYTES and garbage > self.live_bytes
+        nodes = dirty_nodes(tree.root, include_clean=rewrite)
+        dropped, tree.dropped = tree.dropped, []
+        tree.in_flight = {node: node for node in nodes}
+        return tree.snapshot().root, nodes, dropped, rewrite
+
+    def write(self, root, nodes, dropped, rewrite=False):
+        """Ghi thêm các node (con trước cha) rồi chuyển header sang root mới; trả về (các node đã đặt,
+        số byte đã ghi). Không sửa node: cây có thể đang được ghi tiếp trên luồng khác."""
+        if not nodes:
+            return [], 0
+        if rewrite:
+            return self.rewrite(root)
+        
+        live_bytes = self.live_bytes - sum(self.extents.get(offset, 0) for offset in dropped)
+        placed, data = self._encode_nodes(nodes, self.end)
+        for node, offset, length in placed:
+            if node.offset is not None:
+                live_bytes -= self.extents.get(node.offset, 0)
+            live_bytes += length
+        table_offset = self.end + len(data)
+        data += self._encode_strings()
+        
+        with open(self.filename, 'r+b' if os.path.exists(self.filename) else 'w+b') as file:
+            file.seek(self.end)
+            file.write(data)
+            file.truncate()
+            self._sync(file)
+            self._write_header(file, placed[-1][1], self.end + len(data), table_offset, live_bytes)
+        
+        for offset in dropped:
+            self.extents.pop(offset, None)
+        self._place(placed)
+        self.end += len(data)
+        self.table_offset = table_offset
+        self.live_bytes = live_bytes
+        self.bytes_written += len(data) + NODE_HEADER_SLOT
+        return placed, len(data) + NODE_HEADER_SLOT
+
+    def rewrite(self, root):
+        """Ghi toàn bộ cây sang file mới (bỏ phần dữ liệu cũ) rồi thay file bằng os.replace"""
+        placed, data = self._encode_nodes(dirty_nodes(root, include_clean=True), NODE_DATA_START)
+        table_offset = NODE_DATA_START + len(data)
+        data += self._encode_strings()
+        tmp_filename = self.filename + '.tmp'
+        with open(tmp_filename, 'w+b') as file:
+            file.write(bytes(NODE_DATA_START) + data)
+            self._sync(file)
+            self._write_header(file, placed[-1][1], NODE_DATA_START + len(data), table_offset,
+                               table_offset - NODE_DATA_START)
+        os.replace(tmp_filename, self.filename)
+        
+        self.extents = {}
+        self._place(placed)
+        self.end = NODE_DATA_START + len(data)
+        self.table_offset = table_offset
+        self.live_bytes = table_offset - NODE_DATA_START
+        self.bytes_written += NODE_DATA_START + len(data)
+        return placed, NODE_DATA_START + len(data)
+
+    def _encode_nodes(self, nodes, start):
+        """Mã hóa các node liên tiếp từ vị trí start; con luôn đứng trước cha nên đã biết vị trí mới"""
+        offsets = {}
+        placed = []
+        chunks = []
+        pos = start
+        for node in nodes:
+            parts = [NODE_HEADER.pack(node.leaf, len(node.keys))]
+            parts.extend(encode_patient(patient, self.strings) for patient in node.keys)
+            if not node.leaf:
+                parts.extend(NODE_CHILD.pack(offsets.get(child, child.offset)) for child in node.children)
+            data = b''.join(parts)
+            offsets[node] = pos
+            placed.append((node, pos, len(data)))
+            chunks.append(data)
+            pos += len(data)
+        return placed, b''.join(chunks)
+
+    def _encode_strings(self):
+        return struct.pack('<H', len(self.strings)) + b''.join(_encode_short_string(value) for value in self.strings)
+
+    def _place(self, placed):
+        """Cập nhật bảng vị trí còn dùng sau khi checkpoint đã an toàn trên đĩa"""
+        for node, _, _ in placed:
+            if node.offset is not None:
+                self.extents.pop(node.offset, None)
+        for node, offset, length in placed:
+            self.extents[offset] = length
+
+    @staticmethod
+    def apply(tree, placed):
+        """Chạy trên luồng sở hữu cây khi write() đã xong (placed rỗng nếu ghi lỗi): gán vị trí mới và
+        xóa cờ bẩn của các node đã ghi. Bản sao tạo ra trong lúc ghi nền thay thế node đã ghi nên nhận
+        vị trí mới của nó, các node bị bỏ trong lúc đó được thay bằng vị trí tương ứng."""
+        for node, offset, _ in placed:
+            node.offset = offset
+            node.dirty = False
+        in_flight, tree.in_flight = tree.in_flight, None
+        if in_flight:
+            for node, written in in_flight.items():
+                if node is not written:
+                    node.offset = written.offset
+        tree.dropped = [item.offset if isinstance(item, BTreeNode) else item for item in tree.dropped]
+        tree.dropped = [offset for offset in tree.dropped if offset is not None]
+
+    def _write_header(self, file, root_offset, end, table_offset, live_bytes):
+        self.seq += 1
+        header = NODE_FILE_HEADER.pack(NODE_MAGIC, NODE_VERSION, self.max_keys, self.seq,
+                                       root_offset, end, table_offset, live_bytes)
+        file.seek((self.seq % 2) * NODE_HEADER_SLOT)
+        file.write(header + struct.pack('<I', zlib.crc32(header)))
+        self._sync(file)
+        self.root_offset = root_offset
+
+    def _sync(self, file):
+        file.flush()
+        if self.fsync:
+            os.fsync(file.fileno())
+
+
+# ==================== PHÂN TẦNG NÓNG/LẠNH ====================
+# Phân đoạn lạnh .cold là một file .pat phiên bản 2 (chỉ đọc, bản ghi sắp theo ID)
+# File .cold.del: các ID đã xóa khỏi phân đoạn, số ID (I) + encode_deltas; được bỏ hẳn ở lần lưu trữ kế tiếp
+SEGMENT_BLOCK_RECORDS = 1024  # Block nhỏ hơn file .pat để tìm lẻ một bệnh nhân lạnh chỉ giải nén ít dữ liệu
+
+
+class ColdSegment(BlockReader):
+    """Phân đoạn lạnh chỉ đọc: tìm một ID chỉ giải nén một block (xem BlockReader).
+    Xóa chỉ thêm ID vào deleted (lưu ra file .del)."""
+
+    def __init__(self, filename, cache_blocks=32, deleted=None):
+        super().__init__(filename, cache_blocks)
+        self._deleted_dirty = deleted is not None
+        self.deleted = set(deleted) if deleted is not None else self._load_deleted()
+
+    def __len__(self):
+        return self.record_count - len(self.deleted)
+
+    def get(self, patient_id):
+        """Trả về Patient có ID patient_id, None nếu không có hoặc đã xóa"""
+        if patient_id in self.deleted:
+            return None
+        return super().get(patient_id)
+
+    def iter_range(self, lo=None, hi=None):
+        deleted = self.deleted
+        return (patient for patient in super().iter_range(lo, hi) if patient.id not in deleted)
+
+    def delete(self, patient_id):
+        """Đánh dấu xóa; trả về Patient đã xóa hoặc None nếu không có trong phân đoạn"""
+        patient = self.get(patient_id)
+        if patient is not None:
+            self.deleted.add(patient_id)
+            self._deleted_dirty = True
+        return patient
+
+    def delete_many(self, ids):
+        return [patient for patient in map(self.delete, sorted(set(ids))) if patient is not None]
+
+    def purge_where(self, predicate):
+        removed = [patient for patient in self.iter_range() if predicate(patient)]
+        if removed:
+            self.deleted.update(patient.id for patient in removed)
+            self._deleted_dirty = True
+        return removed
+
+    def _load_deleted(self):
+        try:
+            with open(self.filename + '.del', 'rb') as file:
+                data = file.read()
+        except FileNotFoundError:
+            return set()
+        return set(decode_deltas(data, 4, struct.unpack_from('<I', data)[0])[0])
+
+    def save_deleted(self):
+        """Ghi danh sách ID đã xóa ra file .del (ghi file tạm rồi thay thế) nếu có thay đổi"""
+        if not self._deleted_dirty:
+            return
+        filename = self.filename + '.del'
+        with open(filename + '.tmp', 'wb') as file:
+            file.write(struct.pack('<I', len(self.deleted)))
+            file.write(encode_deltas(sorted(self.deleted)))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(filename + '.tmp', filename)
+        self._deleted_dirty = False
+
+
+def write_segment(filename, migrated, segment=None, deleted=(), block_records=SEGMENT_BLOCK_RECORDS):
+    """Ghi phân đoạn mới vào filename = các bản ghi của segment trừ ID trong deleted + migrated (Patient
+    sắp theo ID, trùng ID thì lấy bản trong migrated). Block cũ không chứa ID đã xóa và không xen với bản ghi mới
+    được chép nguyên, nên chuyển thêm bệnh nhân ID lớn (trường hợp thường gặp) không phải nén lại cả kho."""
+    with open(filename, 'wb') as file:
+        writer = BlockWriter(file, segment.strings if segment is not None else (), block_records)
+        m = 0
+        if segment is not None:
+            dead = sorted(deleted)
+            blocks = len(segment.first_ids)
+            for i in range(blocks):
+                first_id = segment.first_ids[i]
+                limit = segment.first_ids[i + 1] if i + 1 < blocks else math.inf
+                while m < len(migrated) and migrated[m].id < first_id:
+                    writer.add(migrated[m])
+                    m += 1
+                untouched = m == len(migrated) or migrated[m].id >= limit
+                k = bisect_left(dead, first_id)
+                if untouched and (k == len(dead) or dead[k] >= limit):
+                    writer.add_block(first_id, segment.raw_block(i), segment.counts[i])
+                    continue
+                for patient in BlockReader.iter_range(segment, first_id, limit - 1):
+                    while m < len(migrated) and migrated[m].id < patient.id:
+                        writer.add(migrated[m])
+                        m += 1
+                    if m < len(migrated) and migrated[m].id == patient.id:
+                        continue  # Bản mới hơn nằm trong migrated, được ghi ở lượt sau
+                    if patient.id not in deleted:
+                        writer.add(patient)
+        for patient in migrated[m:]:
+            writer.add(patient)
+        count = writer.finish()
+        file.flush()
+        os.fsync(file.fileno())
+    return count
+
+
+def merge_tiers(hot, cold):
+    """Trộn hai dãy bệnh nhân đã sắp theo ID; ID có ở cả hai tầng thì lấy bản ở tầng nóng"""
+    last_id = None
+    for patient in heapq.merge(hot, cold, key=lambda patient: patient.id):
+        if patient.id != last_id:
+            last_id = patient.id
+            yield patient
+
+
+def _merge_removed(removed, cold_removed):
+    """Gộp các bệnh nhân đã xóa ở hai tầng; ID có ở cả hai tầng chỉ tính một lần"""
+    ids = {patient.id for patient in removed}
+    return removed + [patient for patient in cold_removed if patient.id not in ids]
+
+
+# ==================== CHỈ MỤC PHỤ ====================
+def normalize_name(name):
+    """Chuẩn hóa tên để tìm kiếm: bỏ dấu tiếng Việt, chữ thường, gộp khoảng trắng"""
+    text = unicodedata.normalize('NFD', name.replace('đ', 'd').replace('Đ', 'D'))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(text.lower().split())
+
+
+def normalize_phone(phone):
+    """Chỉ giữ lại chữ số của số điện thoại"""
+    return ''.join(ch for ch in phone if ch.isdigit())
+
+
+class PatientIndex:
+    """Chỉ mục phụ: băm theo SĐT, danh sách sắp xếp theo tên (tìm theo tiền tố)
+    và theo ngày khám (tìm theo khoảng)"""
+    def __init__(self):
+        self.by_phone = {}  # SĐT đã chuẩn hóa -> set ID
+        self.names = []     # [(tên đã chuẩn hóa, ID)] đã sắp xếp
+        self.dates = []     # [(ngày khám, ID)] đã sắp xếp
+
+    @classmethod
+    def build(cls, patients):
+        """Tạo chỉ mục từ danh sách bệnh nhân (sắp xếp một lần thay vì chèn từng phần tử)"""
+        index = cls()
+        for patient in patients:
+            index.by_phone.setdefault(normalize_phone(patient.phone), set()).add(patient.id)
+            index.names.append((normalize_name(patient.name), patient.id))
+            index.dates.append((patient.visit_date, patient.id))
+        index.names.sort()
+        index.dates.sort()
+        return index
+
+    def add(self, patient):
+        self.by_phone.setdefault(normalize_phone(patient.phone), set()).add(patient.id)
+        insort(self.names, (normalize_name(patient.name), patient.id))
+        insort(self.dates, (patient.visit_date, patient.id))
+
+    def remove(self, patient):
+        phone = normalize_phone(patient.phone)
+        ids = self.by_phone.get(phone)
+        if ids is not None:
+            ids.discard(patient.id)
+            if not ids:
+                del self.by_phone[phone]
+        self._remove_sorted(self.names, (normalize_name(patient.name), patient.id))
+        self._remove_sorted(self.dates, (patient.visit_date, patient.id))
+
+    @staticmethod
+    def _remove_sorted(items, item):
+        i = bisect_left(items, item)
+        if i < len(items) and items[i] == item:
+            del items[i]
+
+    def find_phone(self, phone):
+        """Trả về danh sách ID có số điện thoại trùng khớp"""
+        return sorted(self.by_phone.get(normalize_phone(phone), ()))
+
+    def find_name_prefix(self, prefix, limit=None):
+        """Trả về ID của các bệnh nhân có tên (đã chuẩn hóa) bắt đầu bằng prefix"""
+        prefix = normalize_name(prefix)
+        result = []
+        i = bisect_left(self.names, (prefix,))
+        while i < len(self.names) and self.names[i][0].startswith(prefix):
+            result.append(self.names[i][1])
+            if limit is not None and len(result) >= limit:
+                break
+            i += 1
+        return result
+
+    def find_dates(self, start, end=None):
+        """Trả về ID của các bệnh nhân có ngày khám trong [start, end] (YYYY-MM-DD)"""
+        if end is None:
+            end = start
+        lo = bisect_left(self.dates, (start,))
+        hi = bisect_right(self.dates, (end, float('inf')))
+        return [patient_id for _, patient_id in self.dates[lo:hi]]
+
+
+# File .names (chỉ mục tên, ghi lại toàn bộ khi đóng; số thứ tự được đánh lại, bỏ tên/từ không còn dùng):
+#   Header:  magic 'PATG' | version (H) | dấu vết file dữ liệu lúc ghi: 3 x (kích thước q, mtime_ns q)
+#            | số tên (I) | số từ (I) | số trigram (I)
+#   Tên:     độ dài (H) + UTF-8 | số trigram (B) | số bệnh nhân (I) | các ID bệnh nhân (delta + varint)
+#   Từ:      độ dài (B) + UTF-8 | số tên (I) | số thứ tự các tên chứa từ (delta + varint)
+#   Trigram: độ dài (B) + UTF-8 | số từ (I) | số thứ tự các từ chứa trigram (delta + varint)
+#   Cuối file: mảng suffixes (q, little-endian) đã sắp xếp, để khỏi phải sắp lại khi đọc
+NAMES_MAGIC = b'PATG'
+NAMES_VERSION = 1
+NAMES_HEADER = struct.Struct('<4sH6qIII')
+NAMES_COUNT = struct.Struct('<I')
+NAMES_TERM = struct.Struct('<BI')
+
+
+def _file_stamp(filename):
+    """(kích thước, mtime_ns) của file .pat, .nodes, .log: đổi mỗi khi dữ liệu trên đĩa đổi"""
+    stamp = []
+    for suffix in ('', '.nodes', '.log'):
+        try:
+            stat = os.stat(filename + suffix)
+            stamp += (stat.st_size, stat.st_mtime_ns)
+        except FileNotFoundError:
+            stamp += (0, 0)
+    return tuple(stamp)
+
+
+def name_trigrams(name):
+    """Tập trigram của tên đã chuẩn hóa; mỗi từ được đệm hai khoảng trắng ở đầu, một ở cuối
+    nên từ ngắn như 'an' vẫn có trigram và gõ sai một chữ chỉ làm hỏng vài trigram"""
+    grams = set()
+    for word in name.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _add_sorted(items, value):
+    """Thêm value vào mảng tăng dần (số thứ tự mới luôn lớn nhất nên thường chỉ là append)"""
+    if not items or items[-1] < value:
+        items.append(value)
+        return
+    i = bisect_left(items, value)
+    if items[i] != value:
+        items.insert(i, value)
+
+
+def _discard_sorted(items, value):
+    i = bisect_left(items, value)
+    if i < len(items) and items[i] == value:
+        del items[i]
+        return True
+    return False
+
+
+class NameIndex:
+    """Chỉ mục tên cho tìm gần đúng (gõ sai, không dấu) và gợi ý theo tiền tố.
+    Tên được chuẩn hóa rồi gom thành các tên phân biệt (nhiều bệnh nhân trùng họ tên), mỗi tên có mảng
+    ID bệnh nhân tăng dần. Tên tiếng Việt ghép từ một tập âm tiết nhỏ nên danh sách trigram -> tên
+    dài gần bằng cả danh sách tên; vì vậy trigram được lập trên từ điển các từ (trigram -> từ), mỗi từ
+    có mảng các tên chứa nó, còn độ giống của cả tên vẫn tính bằng trigram."""
+    WORD_THRESHOLD = 0.3  # Độ giống tối thiểu để một từ trong từ điển được coi là khớp với từ đã gõ
+
+    def __init__(self):
+        self.terms = []         # số thứ tự tên -> tên đã chuẩn hóa
+        self.term_ids = {}      # tên đã chuẩn hóa -> số thứ tự
+        self.patients = []      # số thứ tự tên -> array ID bệnh nhân (rỗng: tên không còn ai dùng)
+        self.term_sizes = array('B')  # số thứ tự tên -> số trigram của tên
+        self.words = []         # số thứ tự từ -> từ
+        self.word_ids = {}
+        self.word_terms = []    # số thứ tự từ -> array số thứ tự các tên chứa từ
+        self.grams = {}         # trigram -> array số thứ tự các từ chứa trigram
+        self.sorted_terms = []  # các tên đang dùng, đã sắp xếp (gợi ý theo tiền tố)
+        # Phần tên tính từ từ thứ hai trở đi, mã hóa số thứ tự tên << 8 | vị trí ký tự, sắp theo nội dung
+        # (gợi ý khi gõ từ tên đệm/tên gọi)
+        self.suffixes = array('q')
+        self.stamp = None       # dấu vết file dữ liệu ứng với nội dung đã ghi ra file .names
+
+    @classmethod
+    def build(cls, patients):
+        index = cls()
+        normalized = {}
+        for patient in patients:
+            term = normalized.get(patient.name)
+            if term is None:
+                term = normalized[patient.name] = normalize_name(patient.name)
+            index._add(term, patient.id, keep_sorted=False)
+        index.sorted_terms.sort()
+        index.suffixes = array('q', sorted(index.suffixes, key=index._suffix_key))
+        return index
+
+    def add(self, patient):
+        self._add(normalize_name(patient.name), patient.id)
+
+    def _add(self, term, patient_id, keep_sorted=True):
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            term_id = self.term_ids[term] = len(self.terms)
+            self.terms.append(term)
+            self.patients.append(array('q'))
+            self.term_sizes.append(min(len(name_trigrams(term)), 255))
+        ids = self.patients[term_id]
+        if not ids:
+            # Tên mới (hoặc được dùng lại): đưa vào danh sách của từng từ
+            for word in set(term.split()):
+                _add_sorted(self.word_terms[self._word_id(word)], term_id)
+            if keep_sorted:
+                insort(self.sorted_terms, term)
+                for code in self._suffix_codes(term_id):
+                    insort(self.suffixes, code, key=self._suffix_key)
+            else:
+                self.sorted_terms.append(term)
+                self.suffixes.extend(self._suffix_codes(term_id))
+        _add_sorted(ids, patient_id)
+
+    def _suffix_codes(self, term_id):
+        term = self.terms[term_id]
+        return [term_id << 8 | i + 1 for i, ch in enumerate(term[:255]) if ch == ' ']
+
+    def _suffix_key(self, code):
+        term = self.terms[code >> 8]
+        return term[code & 0xFF:], term
+
+    def _word_id(self, word):
+        word_id = self.word_ids.get(word)
+        if word_id is None:
+            word_id = self.word_ids[word] = len(self.words)
+            self.words.append(word)
+            self.word_terms.append(array('i'))
+            for gram in name_trigrams(word):
+                self.grams.setdefault(gram, array('i')).append(word_id)
+        return word_id
+
+    def remove(self, patient):
+        term = normalize_name(patient.name)
+        term_id = self.term_ids.get(term)
+        if term_id is None or not _discard_sorted(self.patients[term_id], patient.id):
+            return
+        if not self.patients[term_id]:
+            # Không còn bệnh nhân nào mang tên này; từ điển từ giữ nguyên (nhỏ, sẽ được dùng lại)
+            for word in set(term.split()):
+                _discard_sorted(self.word_terms[self.word_ids[word]], term_id)
+            _discard_sorted(self.sorted_terms, term)
+            for code in self._suffix_codes(term_id):
+                del self.suffixes[bisect_left(self.suffixes, self._suffix_key(code), key=self._suffix_key)]
+
+    def _similar_words(self, word):
+        """Số thứ tự các từ trong từ điển có độ giống trigram với word từ WORD_THRESHOLD trở lên"""
+        grams = name_trigrams(word)
+        common = Counter()
+        for gram in grams:
+            common.update(self.grams.get(gram, ()))
+        result = []
+        for word_id, shared in common.items():
+            size = len(name_trigrams(self.words[word_id]))
+            if shared / (len(grams) + size - shared) >= self.WORD_THRESHOLD:
+                result.append(word_id)
+        return result
+
+    def search(self, query, limit=10, threshold=0.3):
+        """Tìm gần đúng, trả về [(độ giống, tên, mảng ID)] xếp theo độ giống giảm dần.
+        Ứng viên là các tên chứa một từ giống với mỗi từ đã gõ (không có thì cho phép thiếu một từ);
+        độ giống = |trigram chung| / |hợp hai tập trigram| (Jaccard) của cả tên."""
+        query = normalize_name(query)
+        grams = name_trigrams(query)
+        if not grams:
+            return []
+        # Mỗi từ đã gõ: các mảng tên của những từ giống nó, nhóm ngắn nhất trước
+        groups = [[self.word_terms[word_id] for word_id in self._similar_words(word)]
+                  for word in set(query.split())]
+        groups.sort(key=lambda lists: sum(map(len, lists)))
+        candidates = self._intersect(groups)
+        if not candidates and len(groups) > 1:
+            for skip in range(len(groups)):
+                candidates |= self._intersect(groups[:skip] + groups[skip + 1:])
+        # Trigram chung của cả tên = hợp các trigram chung của từng từ (tính một lần cho mỗi từ)
+        overlaps = {}
+        results = []
+        for term_id in candidates:
+            term = self.terms[term_id]
+            shared = set()
+            for word in term.split():
+                word_overlap = overlaps.get(word)
+                if word_overlap is None:
+                    word_overlap = overlaps[word] = grams & name_trigrams(word)
+                shared |= word_overlap
+            common = len(shared)
+            score = common / (len(grams) + self.term_sizes[term_id] - common)
+            if score >= threshold:
+                results.append((score, term, term_id))
+        results = heapq.nsmallest(limit, results, key=lambda result: (-result[0], result[1]))
+        return [(score, term, self.patients[term_id]) for score, term, term_id in results]
+
+    @staticmethod
+    def _intersect(groups):
+        """Các tên có mặt trong mọi nhóm (nhóm = hợp nhiều mảng). Chỉ nhóm đầu tiên (ngắn nhất) được
+        dựng thành set, các nhóm sau chỉ được dò qua set ứng viên đang thu nhỏ dần."""
+        candidates = set().union(*groups[0])
+        for lists in groups[1:]:
+            if not candidates:
+                break
+            candidates = set().union(*(candidates.intersection(term_ids) for term_ids in lists))
+        return candidates
+
+    def complete(self, prefix, limit=10):
+        """Gợi ý tên theo tiền tố, trả về [(tên, số bệnh nhân)]: trước hết các tên bắt đầu bằng prefix,
+        sau đó các tên có phần từ một từ ở giữa bắt đầu bằng prefix (gõ 'van an' vẫn gợi ý 'nguyen van an'),
+        sắp theo phần đó"""
+        prefix = normalize_name(prefix)
+        if not prefix:
+            return []
+        result = []
+        pos = bisect_left(self.sorted_terms, prefix)
+        while pos < len(self.sorted_terms) and len(result) < limit and self.sorted_terms[pos].startswith(prefix):
+            result.append(self.sorted_terms[pos])
+            pos += 1
+        seen = set(result)
+        pos = bisect_left(self.suffixes, (prefix,), key=self._suffix_key)
+        while pos < len(self.suffixes) and len(result) < limit:
+            suffix, term = self._suffix_key(self.suffixes[pos])
+            if not suffix.startswith(prefix):
+                break
+            if term not in seen:
+                seen.add(term)
+                result.append(term)
+            pos += 1
+        return [(term, len(self.patients[self.term_ids[term]])) for term in result]
+
+    def save(self, filename, stamp):
+        """Ghi chỉ mục ra file (file tạm rồi thay thế)"""
+        terms = [term_id for term_id, ids in enumerate(self.patients) if ids]
+        term_numbers = {term_id: i for i, term_id in enumerate(terms)}
+        words = [word_id for word_id, term_ids in enumerate(self.word_terms) if term_ids]
+        word_numbers = {word_id: i for i, word_id in enumerate(words)}
+        grams = {}
+        for gram, word_ids in self.grams.items():
+            word_ids = [word_numbers[word_id] for word_id in word_ids if word_id in word_numbers]
+            if word_ids:
+                grams[gram] = word_ids
+        body = bytearray()
+        for term_id in terms:
+            data = self.terms[term_id].encode('utf-8')
+            body += struct.pack('<H', len(data)) + data
+            body += NAMES_TERM.pack(self.term_sizes[term_id], len(self.patients[term_id]))
+            encode_deltas(self.patients[term_id], body)
+        for word_id in words:
+            body += _encode_short_string(self.words[word_id]) + NAMES_COUNT.pack(len(self.word_terms[word_id]))
+            encode_deltas([term_numbers[term_id] for term_id in self.word_terms[word_id]], body)
+        for gram, word_ids in grams.items():
+            body += _encode_short_string(gram) + NAMES_COUNT.pack(len(word_ids))
+            encode_deltas(word_ids, body)
+        suffixes = array('q', (term_numbers[code >> 8] << 8 | code & 0xFF for code in self.suffixes))
+        if sys.byteorder == 'big':
+            suffixes.byteswap()
+        body += suffixes.tobytes()
+        tmp_filename = filename + '.tmp'
+        with open(tmp_filename, 'wb') as file:
+            file.write(NAMES_HEADER.pack(NAMES_MAGIC, NAMES_VERSION, *stamp, len(terms), len(words), len(grams)))
+            file.write(body)
+        os.replace(tmp_filename, filename)
+        self.stamp = stamp
+
+    @classmethod
+    def load(cls, filename, stamp):
+        """Đọc chỉ mục từ file; None nếu chưa có file, file hỏng hoặc được ghi cho dữ liệu khác (stamp)"""
+        try:
+            with open(filename, 'rb') as file:
+                buf = file.read()
+            magic, version, *saved, term_count, word_count, gram_count = NAMES_HEADER.unpack_from(buf)
+            if magic != NAMES_MAGIC or version != NAMES_VERSION or tuple(saved) != stamp:
+                return None
+            index = cls()
+            pos = NAMES_HEADER.size
+            for term_id in range(term_count):
+                size = struct.unpack_from('<H', buf, pos)[0]
+                term = buf[pos + 2:pos + 2 + size].decode('utf-8')
+                gram_size, count = NAMES_TERM.unpack_from(buf, pos + 2 + size)
+                ids, pos = decode_deltas(buf, pos + 2 + size + NAMES_TERM.size, count)
+                index.terms.append(term)
+                index.term_sizes.append(gram_size)
+                index.term_ids[term] = term_id
+                index.patients.append(array('q', ids))
+            for word_id in range(word_count):
+                word, pos = _short_string_at(buf, pos)
+                count = NAMES_COUNT.unpack_from(buf, pos)[0]
+                term_ids, pos = decode_deltas(buf, pos + NAMES_COUNT.size, count)
+                index.words.append(word)
+                index.word_ids[word] = word_id
+                index.word_terms.append(array('i', term_ids))
+            for _ in range(gram_count):
+                gram, pos = _short_string_at(buf, pos)
+                count = NAMES_COUNT.unpack_from(buf, pos)[0]
+                word_ids, pos = decode_deltas(buf, pos + NAMES_COUNT.size, count)
+                index.grams[gram] = array('i', word_ids)
+            index.suffixes.frombytes(buf[pos:])
+        except (OSError, ValueError, IndexError, TypeError, struct.error):
+            return None
+        if sys.byteorder == 'big':
+            index.suffixes.byteswap()
+        index.sorted_terms = sorted(index.terms)
+        index.stamp = stamp
+        return index
+
+
+# ==================== THỐNG KÊ DẠNG CỘT ====================
+def _optional_module(name):
+    """Import module tùy chọn (chỉ khi cần, không làm chậm khởi động); None nếu chưa cài"""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+class PatientColumns:
+    """Bảng cột cho thống kê, giữ song song với B-Tree như PatientIndex: mỗi thuộc tính là một mảng liền
+    (id, tuổi, mã giới tính, ngày khám = số ngày từ 1970-01-01, cũng là biểu diễn của datetime64[D]).
+    Có NumPy thì truy vấn chạy trên view không sao chép của các mảng; không có thì dùng vòng lặp Python.
+    Xóa chỉ đánh dấu dòng, bảng được dọn lại khi quá nửa số dòng đã xóa."""
+    EPOCH = datetime.date(1970, 1, 1).toordinal()
+    NAT = -2 ** 63  # NaT của datetime64: ngày khám không đọc được
+    COMPACT_MIN = 1024
+    GROUPS = ('gender', 'age', 'day', 'month')
+
+    def __init__(self, use_numpy=None):
+        # use_numpy=None: dùng NumPy nếu đã cài; False: luôn dùng vòng lặp Python
+        self.np = _optional_module('numpy') if use_numpy is not False else None
+        if use_numpy and self.np is None:
+            raise ImportError("Chưa cài NumPy")
+        self.ids = array('q')
+        self.ages = array('B')
+        self.genders = array('H')
+        self.days = array('q')
+        self.live = bytearray()
+        self.rows = {}          # ID -> số dòng
+        self.gender_names = []  # mã giới tính -> chuỗi
+        self._gender_codes = {}
+        self._day_cache = {}
+        self.dead = 0
+
+    @classmethod
+    def build(cls, patients, use_numpy=None):
+        columns = cls(use_numpy)
+        for patient in patients:
+            columns.add(patient)
+        return columns
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, patient):
+        self.remove(patient.id)
+        code = self._gender_codes.get(patient.gender)
+        if code is None:
+            code = self._gender_codes[patient.gender] = len(self.gender_names)
+            self.gender_names.append(patient.gender)
+        day = self._day_cache.get(patient.visit_date)
+        if day is None:
+            try:
+                day = datetime.date.fromisoformat(patient.visit_date).toordinal() - self.EPOCH
+            except (TypeError, ValueError):
+                day = self.NAT
+            self._day_cache[patient.visit_date] = day
+        self.rows[patient.id] = len(self.ids)
+        self.ids.append(patient.id)
+        self.ages.append(min(max(patient.age, 0), 255))
+        self.genders.append(code)
+        self.days.append(day)
+        self.live.append(1)
+
+    def remove(self, patient_id):
+        row = self.rows.pop(patient_id, None)
+        if row is None:
+            return
+        self.live[row] = 0
+        self.dead += 1
+        if self.dead > self.COMPACT_MIN and self.dead * 2 > len(self.ids):
+            self._compact()
+
+    def _compact(self):
+        """Bỏ các dòng đã xóa (compress chạy ở tốc độ C, không cần NumPy)"""
+        live = self.live
+        self.ids = array('q', compress(self.ids, live))
+        self.ages = array('B', compress(self.ages, live))
+        self.genders = array('H', compress(self.genders, live))
+        self.days = array('q', compress(self.days, live))
+        self.live = bytearray(b'\x01') * len(self.ids)
+        self.rows = {patient_id: row for row, patient_id in enumerate(self.ids)}
+        self.dead = 0
+
+    @classmethod
+    def _to_day(cls, value):
+        return datetime.date.fromisoformat(value).toordinal() - cls.EPOCH
+
+    @classmethod
+    def _from_day(cls, day):
+        return datetime.date.fromordinal(day + cls.EPOCH).isoformat()
+
+    # ----- Lọc -----
+    def _mask(self, start=None, end=None, gender=None, min_age=None, max_age=None, dated=False):
+        """Mảng bool các dòng thỏa điều kiện (NumPy). Ngày NaT không bao giờ thỏa điều kiện ngày."""
+        np = self.np
+        mask = np.frombuffer(self.live, dtype=np.bool_).copy()
+        if dated or start is not None or end is not None:
+            days = np.frombuffer(self.days, dtype='datetime64[D]')
+            mask &= ~np.isnat(days)
+            if start is not None:
+                mask &= days >= np.datetime64(self._to_day(start), 'D')
+            if end is not None:
+                mask &= days <= np.datetime64(self._to_day(end), 'D')
+        if gender is not None:
+            code = self._gender_codes.get(gender)
+            if code is None:
+                mask[:] = False
+            else:
+                mask &= np.frombuffer(self.genders, dtype=np.uint16) == code
+        if min_age is not None or max_age is not None:
+            ages = np.frombuffer(self.ages, dtype=np.uint8)
+            if min_age is not None:
+                mask &= ages >= min_age
+            if max_age is not None:
+                mask &= ages <= max_age
+        return mask
+
+    def _selectors(self, start=None, end=None, gender=None, min_age=None, max_age=None):
+        """Cờ 0/1 của từng dòng thỏa điều kiện, dùng với itertools.compress (bản không cần NumPy)"""
+        if start is end is gender is min_age is max_age is None:
+            return self.live
+        # Một lượt duyệt cho mọi điều kiện; điều kiện không dùng là khoảng bao hết giá trị của cột
+        first = self._to_day(start) if start is not None else self.NAT + (end is not None)
+        last = self._to_day(end) if end is not None else -self.NAT - 1
+        if gender is None:
+            code_lo, code_hi = 0, 0xFFFF
+        else:
+            code_lo = code_hi = self._gender_codes.get(gender, -1)
+        youngest = min_age if min_age is not None else 0
+        oldest = max_age if max_age is not None else 255
+        return bytes(s and first <= day <= last and code_lo <= code <= code_hi and youngest <= age <= oldest
+                     for s, day, code, age in zip(self.live, self.days, self.genders, self.ages))
+
+    def count(self, **filters):
+        """Số bệnh nhân thỏa điều kiện lọc (start, end, gender, min_age, max_age)"""
+        if not filters:
+            return len(self.rows)
+        if self.np is not None:
+            return int(self._mask(**filters).sum()) if self.ids else 0
+        return self._selectors(**filters).count(1)
+
+    def select_ids(self, **filters):
+        """ID (tăng dần) của các bệnh nhân thỏa điều kiện lọc"""
+        if not self.ids:
+            return []
+        if self.np is not None:
+            np = self.np
+            return np.sort(np.frombuffer(self.ids, dtype=np.int64)[self._mask(**filters)]).tolist()
+        return sorted(compress(self.ids, self._selectors(**filters)))
+
+    # ----- Nhóm và biểu đồ -----
+    def group_count(self, by, bin_width=10, **filters):
+        """Đếm theo nhóm: by='gender' (giới tính), 'age' (tuổi đầu nhóm, mỗi nhóm bin_width tuổi),
+        'day' (YYYY-MM-DD) hoặc 'month' (YYYY-MM). Trả về dict nhóm -> số bệnh nhân, sắp theo nhóm."""
+        if by not in self.GROUPS:
+            raise ValueError(f"Không thể nhóm theo '{by}'")
+        if not self.ids:
+            return {}
+        dated = by in ('day', 'month')
+        if self.np is not None:
+            return self._group_numpy(by, bin_width, self._mask(dated=dated, **filters))
+        # Đếm giá trị thô bằng Counter (chạy ở tốc độ C) rồi mới gộp nhóm trên vài trăm khóa;
+        # ngày NaT bị bỏ khi gộp nên không cần thêm điều kiện lọc
+        selectors = self._selectors(**filters)
+        if by == 'gender':
+            counts = Counter(compress(self.genders, selectors))
+            return dict(sorted((self.gender_names[code], n) for code, n in counts.items()))
+        result = {}
+        if by == 'age':
+            for age, n in sorted(Counter(compress(self.ages, selectors)).items()):
+                low = age // bin_width * bin_width
+                result[low] = result.get(low, 0) + n
+            return result
+        for day, n in sorted(Counter(compress(self.days, selectors)).items()):
+            if day == self.NAT:
+                continue
+            key = self._from_day(day)
+            if by == 'month':
+                key = key[:7]
+            result[key] = result.get(key, 0) + n
+        return result
+
+    def _group_numpy(self, by, bin_width, mask):
+        np = self.np
+        if by == 'gender':
+            codes = np.frombuffer(self.genders, dtype=np.uint16)[mask]
+            counts = np.bincount(codes, minlength=len(self.gender_names))
+            return dict(sorted((self.gender_names[code], int(n)) for code, n in enumerate(counts) if n))
+        if by == 'age':
+            bins = np.frombuffer(self.ages, dtype=np.uint8)[mask] // bin_width
+            return {int(b) * bin_width: int(n) for b, n in enumerate(np.bincount(bins)) if n}
+        # bincount trên khoảng ngày thay vì np.unique (phải sắp xếp cả mảng); gộp tháng trên các ngày có mặt
+        days = np.frombuffer(self.days, dtype=np.int64)[mask]
+        if not len(days):
+            return {}
+        first = days.min()
+        counts = np.bincount(days - first)
+        present = np.flatnonzero(counts)
+        labels = np.datetime_as_string((present + first).astype('datetime64[D]')).tolist()
+        result = {}
+        for label, n in zip(labels, counts[present].tolist()):
+            key = label[:7] if by == 'month' else label
+            result[key] = result.get(key, 0) + n
+        return result
+
+    def histogram(self, bin_width=10, **filters):
+        """Phân bố tuổi theo giới tính: dict giới tính -> {tuổi đầu nhóm: số bệnh nhân}"""
+        if not self.ids:
+            return {}
+        result = {}
+        if self.np is not None:
+            np = self.np
+            mask = self._mask(**filters)
+            nbins = 255 // bin_width + 1
+            cells = np.frombuffer(self.genders, dtype=np.uint16)[mask].astype(np.int64) * nbins
+            cells += np.frombuffer(self.ages, dtype=np.uint8)[mask] // bin_width
+            table = np.bincount(cells, minlength=len(self.gender_names) * nbins)
+            for code, gender_counts in enumerate(table.reshape(-1, nbins)):
+                if gender_counts.any():
+                    result[self.gender_names[code]] = {b * bin_width: int(n)
+                                                       for b, n in enumerate(gender_counts) if n}
+            return dict(sorted(result.items()))
+        selectors = self._selectors(**filters)
+        counts = Counter(zip(compress(self.genders, selectors), compress(self.ages, selectors)))
+        for (code, age), n in sorted(counts.items()):
+            gender_counts = result.setdefault(self.gender_names[code], {})
+            low = age // bin_width * bin_width
+            gender_counts[low] = gender_counts.get(low, 0) + n
+        return dict(sorted(result.items()))
+
+
+# ==================== NHẬP/XUẤT HÀNG LOẠT ====================
+def delimiter_for(filename):
+    """File .csv dùng dấu phẩy, còn lại dùng định dạng '#' như patients.txt"""
+    return ',' if filename.lower().endswith('.csv') else '#'
+
+
+def validate_patient(patient):
+    """Kiểm tra dữ liệu của một bệnh nhân, ném ValueError nếu không hợp lệ"""
+    for field, kind in (('id', int), ('age', int), ('name', str), ('gender', str), ('phone', str),
+                        ('visit_date', str)):
+        value = getattr(patient, field)
+        if not isinstance(value, kind) or isinstance(value, bool):
+            raise ValueError(f"Trường {field} phải là {'số nguyên' if kind is int else 'chuỗi'}: {value!r}")
+    if patient.id <= 0:
+        raise ValueError(f"Mã bệnh nhân phải là số dương: {patient.id}")
+    if not patient.name:
+        raise ValueError("Thiếu họ tên")
+    if not 0 <= patient.age <= 150:
+        raise ValueError(f"Tuổi không hợp lệ: {patient.age}")
+    try:
+        datetime.date.fromisoformat(patient.visit_date)
+    except ValueError:
+        raise ValueError(f"Ngày khám không hợp lệ: {patient.visit_date}") from None
+
+
+def parse_chunk(chunk):
+    """Phân tích một khối dòng (số dòng đầu tiên, các dòng, dấu phân cách).
+    Trả về (danh sách (số dòng, Patient) hợp lệ, danh sách (số dòng, lỗi)). Chạy được trong process khác."""
+    first_line, lines, delimiter = chunk
+    rows = csv.reader(lines, delimiter=delimiter) if delimiter == ',' else \
+        (line.rstrip('\r\n').split(delimiter) for line in lines)
+    patients = []
+    errors = []
+    for line_no, fields in enumerate(rows, first_line):
+        if not fields or not ''.join(fields).strip():
+            continue
+        try:
+            if len(fields) != 6:
+                raise ValueError(f"Cần 6 trường, nhận được {len(fields)}")
+            id, name, age, gender, phone, visit_date = (field.strip() for field in fields)
+            patient = Patient(int(id), name, int(age), gender, phone, visit_date)
+            validate_patient(patient)
+        except ValueError as e:
+            # Bỏ qua dòng tiêu đề của file CSV
+            if line_no == 1 and delimiter == ',' and not fields[0].strip().isdigit():
+                continue
+            errors.append((line_no, str(e)))
+            continue
+        patients.append((line_no, patient))
+    return patients, errors
+
+
+def read_chunks(filename, delimiter, chunk_size):
+    """Đọc file theo từng khối chunk_size dòng"""
+    with open(filename, 'r', encoding='utf-8', newline='') as file:
+        line_no = 1
+        while True:
+            lines = list(islice(file, chunk_size))
+            if not lines:
+                return
+            yield line_no, lines, delimiter
+            line_no += len(lines)
+
+
+def format_patient_row(patient, delimiter='#'):
+    return delimiter.join(str(value) for value in patient_to_fields(patient))
+
+
+# ==================== QUẢN LÝ HỒ SƠ BỆNH NHÂN ====================
+class PatientManager:
+    BACKENDS = ('memory', 'paged', 'lazy')
+
+    def __init__(self, filename='patients.pat', max_keys=5, journal=False, checkpoint_interval=1000,
+                 backend='memory', metrics=False, cache_entries=10000, cache_bytes=None, incremental=False,
+                 background_load=False, tombstones=False, hot_days=None, archive_interval=600, read_only=False):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Backend không hợp lệ: {backend} (chọn một trong {self.BACKENDS})")
+        if backend == 'paged' and journal:
+            raise ValueError("Backend 'paged' ghi trực tiếp xuống file, không dùng nhật ký")
+        if incremental and backend != 'memory':
+            raise ValueError("Checkpoint tăng dần chỉ dùng với backend 'memory'")
+        if tombstones and backend == 'paged':
+            raise ValueError("Backend 'paged' xóa trực tiếp trên file, không dùng tombstone")
+        if hot_days is not None and backend != 'memory':
+            raise ValueError("Phân tầng nóng/lạnh chỉ dùng với backend 'memory'")
+        self.filename = filename
+        self.backend = backend
+        # Chỉ đọc (vd. export trong lúc máy chủ đang chạy): phát lại nhật ký nhưng không cắt, không lưu trữ
+        # bệnh nhân cũ và close() không checkpoint hay ghi lại file nào
+        self.read_only = read_only
+        self._loader = None  # Luồng nạp nền (None khi đã nạp xong hoặc nạp đồng bộ)
+        self._load_error = None
+        # 'memory': toàn bộ cây trong RAM, lưu thành file .pat
+        # 'paged': mỗi node là một trang trong file, truy cập qua mmap
+        # 'lazy': cây chỉ giữ ID + vị trí bản ghi, Patient được đọc từ .pat khi cần và giữ trong LRU
+        if backend == 'paged':
+            self.btree = PagedBTree(filename, max_keys=max_keys)
+        elif backend == 'lazy':
+            self.btree = LazyBTree(max_keys=max_keys, tombstones=tombstones)
+        else:
+            self.btree = BTree(max_keys=max_keys, tombstones=tombstones)
+        self.next_id = 1  # ID tự động tăng
+        # Chế độ nhật ký: mỗi thao tác ghi vào file .log, snapshot .pat chỉ ghi lại khi checkpoint
+        self.journal = Journal(filename + '.log') if journal else None
+        self.checkpoint_interval = checkpoint_interval
+        self.cache_entries = cache_entries
+        self.cache_bytes = cache_bytes
+        # Chế độ tăng dần: thay vì ghi lại cả file .pat, checkpoint chỉ ghi các node bẩn vào file .nodes;
+        # khi có nhật ký, việc ghi chạy trên một luồng nền
+        self.node_store = NodeStore(filename + '.nodes', max_keys) if incremental else None
+        self._checkpointer = futures.ThreadPoolExecutor(max_workers=1) if incremental else None
+        self._pending_checkpoint = None
+        # Phân tầng: bệnh nhân có ngày khám cũ hơn hot_days ngày được luồng nền chuyển sang phân đoạn
+        # lạnh filename + '.cold' (nén, chỉ đọc) sau mỗi archive_interval giây; cây và file .pat chỉ giữ phần nóng
+        self.hot_days = hot_days
+        self.archive_interval = archive_interval
+        self.cold = None
+        self._archiver = futures.ThreadPoolExecutor(max_workers=1) \
+            if hot_days is not None and not read_only else None
+        self._pending_archive = None
+        self._archive_root = None  # Root của cây tại snapshot mà lần lưu trữ đang chờ dùng
+        self._last_archive = 0.0
+        self._index = None  # Chỉ mục phụ, tạo khi cần lần đầu
+        self._columns = None  # Bảng cột cho thống kê, tạo khi cần lần đầu
+        self._names = None  # Chỉ mục trigram của tên, đọc từ file .names hoặc tạo khi cần lần đầu
+        self._disk_stamp = None  # Dấu vết file dữ liệu khi dữ liệu trong bộ nhớ trùng với trên đĩa
+        self._unsaved = False  # Có thay đổi chưa ghi file (khi lưu trễ, không dùng nhật ký)
+        self.metrics = None
+        if metrics:
+            self.enable_metrics(metrics if isinstance(metrics, Metrics) else None)
+        # Nạp nền: constructor trả về ngay, lần truy cập btree/next_id đầu tiên chờ luồng nạp xong
+        if background_load and backend != 'paged':
+            self._loader = threading.Thread(target=self._load_in_background, name='patient-loader', daemon=True)
+            self._loader.start()
+        else:
+            self.load_from_file()
+    
+    @property
+    def btree(self):
+        if self._loader is not None:
+            self.wait_loaded()
+        return self._btree
+    
+    @btree.setter
+    def btree(self, tree):
+        self._btree = tree
+    
+    @property
+    def next_id(self):
+        if self._loader is not None:
+            self.wait_loaded()
+        return self._next_id
+    
+    @next_id.setter
+    def next_id(self, value):
+        self._next_id = value
+    
+    @property
+    def loaded(self):
+        """True khi dữ liệu đã nạp xong (luôn True nếu không nạp nền)"""
+        return self._loader is None or not self._loader.is_alive()
+    
+    def _load_in_background(self):
+        try:
+            self.load_from_file()
+        except BaseException as e:
+            self._load_error = e
+    
+    def wait_loaded(self, timeout=None):
+        """Chờ luồng nạp nền xong; trả về False nếu hết timeout. Lỗi khi nạp được ném lại ở đây."""
+        loader = self._loader
+        if loader is None or loader is threading.current_thread():
+            return True
+        loader.join(timeout)
+        if loader.is_alive():
+            return False
+        self._loader = None
+        if self._load_error is not None:
+            error, self._load_error = self._load_error, None
+            raise error
+        return True
+    
+    def load_from_file(self):
+        """Đọc dữ liệu từ file nhị phân và thêm vào B-Tree, sau đó phát lại nhật ký (nếu có)"""
+        if self.backend == 'paged':
+            # Cây đã nằm sẵn trong file, chỉ cần tìm ID lớn nhất
+            self.next_id = self.btree.max_id() + 1
+            return
+        
+        max_id = 0
+        if os.path.exists(self.filename + '.cold'):
+            # Luôn mở phân đoạn đã có (kể cả khi không bật hot_days) để không mất bệnh nhân đã chuyển
+            self.cold = ColdSegment(self.filename + '.cold')
+            max_id = self.cold.last_id
+            print(f"✓ Đã mở phân đoạn lạnh '{self.cold.filename}' ({len(self.cold)} bệnh nhân, "
+                  f"{len(self.cold.first_ids)} block)")
+        if self.node_store is not None and self.node_store.exists():
+            count = self.node_store.load(self.btree)
+            max_id = max(max_id, self.btree.max_id())
+            print(f"✓ Đã đọc {count} bệnh nhân từ checkpoint '{self.node_store.filename}'")
+        else:
+            # Không bật chế độ tăng dần nhưng phiên trước đã checkpoint vào .nodes: file đó mới hơn .pat
+            patients = self._checkpoint_patients() if self.node_store is None else None
+            if patients is None:
+                if self.backend == 'lazy' and self._open_store():
+                    # Chỉ đọc ID + vị trí từng bản ghi, Patient được giải mã khi cần
+                    patients = list(self.btree.store.refs())
+                else:
+                    patients = load_from_binary(self.filename)
+            if is_sorted_by_id(patients):
+                # save_to_file luôn ghi theo thứ tự ID nên có thể xây cây trong O(N)
+                self.btree.bulk_load(patients)
+                if patients:
+                    max_id = max(max_id, patients[-1].id)
+            else:
+                for patient in patients:
+                    self.btree.insert(patient)
+                    if patient.id > max_id:
+                        max_id = patient.id
+        
+        if self.journal is not None:
+            records = self.journal.replay(truncate=not self.read_only)
+            for op, value in records:
+                if op == 'I':
+                    patient = patient_from_fields(value)
+                    # Phát lại có tính lũy đẳng: bản ghi sau cùng của mỗi ID quyết định trạng thái
+                    self.btree.delete(patient.id)
+                    self.btree.insert(patient)
+                    if patient.id > max_id:
+                        max_id = patient.id
+                elif op == 'D':
+                    self.btree.delete(value)
+                    if self.cold is not None:
+                        self.cold.delete(value)
+            if records:
+                print(f"✓ Đã phát lại {len(records)} thao tác từ nhật ký '{self.journal.filename}'")
+            if not self.read_only:
+                self.journal.open()
+        # Cập nhật next_id = max_id + 1
+        self.next_id = max_id + 1
+        self._disk_stamp = _file_stamp(self.filename)
+        if self._archiver is not None:
+            self._start_archive()
+    
+    def _checkpoint_patients(self):
+        """Bệnh nhân (theo thứ tự ID) trong file .nodes do một phiên --incremental để lại;
+        None nếu chưa có checkpoint nào hoàn tất"""
+        store = NodeStore(self.filename + '.nodes')
+        if not store.exists():
+            return None
+        tree = BTree()
+        count = store.load(tree)
+        print(f"✓ Đã đọc {count} bệnh nhân từ checkpoint '{store.filename}'")
+        return tree.in_order_traversal()
+    
+    def _open_store(self):
+        """Mở (lại) file .pat ở chế độ lazy; trả về False nếu file chưa có hoặc không phải định dạng mới"""
+        self._close_store()
+        try:
+            # Cần vị trí từng bản ghi nên chỉ đọc trực tiếp file phiên bản 1 (lần lưu kế tiếp sẽ ghi lại như vậy)
+            if detect_format(self.filename) != 'binary' or binary_version(self.filename) != BINARY_VERSION:
+                return False
+            self.btree.store = RecordStore(self.filename, self.cache_entries, self.cache_bytes)
+        except FileNotFoundError:
+            return False
+        print(f"✓ Đã lập chỉ mục {self.btree.store.record_count} bệnh nhân từ file nhị phân "
+              f"'{self.filename}' (đọc bản ghi khi cần)")
+        return True
+    
+    def _close_store(self):
+        if self.btree.store is not None:
+            self.btree.store.close()
+            self.btree.store = None
+    
+    def _scan(self):
+        """Duyệt toàn bộ bệnh nhân theo ID (cả phân đoạn lạnh nếu có) trên một snapshot nên thao tác
+        ghi xen vào không ảnh hưởng; ở chế độ lazy đọc thẳng từ file, không làm xáo trộn cache"""
+        self.wait_loaded()
+        if self.cold is not None:
+            return merge_tiers(self._scan_hot(), self.cold.iter_range())
+        return self._scan_hot()
+    
+    def _scan_hot(self):
+        """Như _scan nhưng chỉ các bệnh nhân trong cây (phần được ghi vào file .pat)"""
+        if self.backend == 'paged':
+            return self.btree.iter_range()
+        snapshot = self.btree.snapshot()
+        if self.backend == 'lazy':
+            return snapshot.iter_range(cached=False)
+        return snapshot.iter_range()
+    
+    def get_next_id(self):
+        """Lấy ID tiếp theo và tự động tăng"""
+        current_id = self.next_id
+        self.next_id += 1
+        return current_id
+    
+    def search(self, patient_id):
+        """Tìm bệnh nhân theo ID: trong cây (phần nóng) trước, không có thì tìm trong phân đoạn lạnh"""
+        self.wait_loaded()
+        patient = self.btree.search(patient_id)
+        if patient is None and self.cold is not None:
+            patient = self.cold.get(patient_id)
+        return patient
+    
+    def search_many(self, ids):
+        """Như search cho nhiều ID, trả về danh sách Patient/None theo thứ tự đầu vào"""
+        self.wait_loaded()
+        ids = list(ids)
+        patients = self.btree.search_many(ids)
+        if self.cold is not None:
+            get = self.cold.get
+            patients = [get(patient_id) if patient is None else patient for patient_id, patient in zip(ids, patients)]
+        return patients
+    
+    def count(self):
+        """Tổng số bệnh nhân ở cả hai tầng"""
+        self.wait_loaded()
+        return self.btree.count() + (len(self.cold) if self.cold is not None else 0)
+    
+    def iter_range(self, lo=None, hi=None):
+        """Duyệt bệnh nhân có lo <= ID <= hi theo thứ tự ID ở cả hai tầng"""
+        self.wait_loaded()
+        if self.cold is None:
+            return self.btree.iter_range(lo, hi)
+        return merge_tiers(self.btree.iter_range(lo, hi), self.cold.iter_range(lo, hi))
+    
+    def page(self, after_id=None, limit=20):
+        """Tối đa limit bệnh nhân có ID > after_id (phân trang theo ID)"""
+        self.wait_loaded()
+        if self.cold is None:
+            return self.btree.page(after_id, limit)
+        return list(islice(self.iter_range(None if after_id is None else after_id + 1), limit))
+    
+    def save_to_file(self):
+        """Lưu tất cả bệnh nhân từ B-Tree vào file nhị phân (checkpoint khi dùng nhật ký)"""
+        self.wait_loaded()
+        if self.backend == 'paged':
+            self.btree.flush()
+            print(f"✓ Đã lưu {self.btree.count()} bệnh nhân vào file '{self.filename}'")
+            return
+        if self.cold is not None:
+            self.cold.save_deleted()
+        # Lưu cả file là dịp dọn các key đã đánh dấu xóa (file .nodes không lưu danh sách này)
+        self.btree.compact()
+        if self.node_store is not None:
+            # Ghi ngay trên luồng hiện tại, chỉ các node thay đổi từ lần ghi trước
+            self._wait_checkpoint()
+            placed = []
+            try:
+                placed, written = self.node_store.write(*self.node_store.prepare(self.btree))
+            except Exception as e:
+                print(f"✗ Lỗi khi ghi checkpoint: {e}")
+                return
+            finally:
+                self.node_store.apply(self.btree, placed)
+            self._unsaved = False
+            if self.journal is not None:
+                self.journal.reset()
+            self._disk_stamp = _file_stamp(self.filename)
+            print(f"✓ Đã ghi {written} byte thay đổi vào '{self.node_store.filename}'")
+            return
+        # Chế độ lazy đọc bản ghi theo vị trí trong file nên vẫn ghi phiên bản 1; file cũ đang được mmap
+        # (vừa là nguồn đọc khi ghi) chỉ được đóng khi file tạm đã ghi xong
+        lazy = self.backend == 'lazy'
+        version = BINARY_VERSION if lazy else BLOCK_VERSION
+        saved = save_to_binary(self._scan_hot(), self.filename, version,
+                               before_replace=self._close_store if lazy else None)
+        if lazy and not saved and self.btree.store is None:
+            # Thay file thất bại: file cũ vẫn còn nên vị trí bản ghi trong cây vẫn đúng, mở lại
+            self._open_store()
+        if saved:
+            self._unsaved = False
+            if os.path.exists(self.filename + '.nodes'):
+                # File .pat vừa ghi đã gồm mọi thay đổi: bỏ checkpoint cũ để phiên --incremental sau đọc .pat
+                os.remove(self.filename + '.nodes')
+            if self.journal is not None:
+                self.journal.reset()
+            if lazy:
+                # Vị trí bản ghi đổi theo file mới: dựng lại cây từ file vừa ghi
+                self._open_store()
+                self.btree.bulk_load(self.btree.store.refs())
+            self._disk_stamp = _file_stamp(self.filename)
+    
+    def checkpoint(self):
+        """Ghi snapshot .pat và làm rỗng nhật ký. Ở chế độ tăng dần có nhật ký: chốt các node bẩn,
+        xoay vòng nhật ký rồi để luồng nền ghi, các thao tác ghi tiếp theo không phải chờ"""
+        self.wait_loaded()
+        if self.node_store is None or self.journal is None:
+            self.save_to_file()
+            return
+        self._wait_checkpoint()
+        if self.cold is not None:
+            self.cold.save_deleted()
+        self.btree.compact()
+        batch = self.node_store.prepare(self.btree)
+        self.journal.rotate()
+        self._pending_checkpoint = self._checkpointer.submit(self._write_checkpoint, batch)
+    
+    def _write_checkpoint(self, batch):
+        """Chạy trên luồng nền: ghi các node rồi mới bỏ phần nhật ký mà checkpoint đã bao gồm"""
+        placed, _ = self.node_store.write(*batch)
+        self.journal.discard_rotated()
+        return placed
+    
+    def _wait_checkpoint(self):
+        """Chờ checkpoint nền đang chạy (nếu có) rồi áp dụng vị trí mới của các node trên luồng này;
+        nếu lỗi thì nhật ký .old được giữ lại và các node vẫn bẩn để ghi lần sau"""
+        pending, self._pending_checkpoint = self._pending_checkpoint, None
+        if pending is not None:
+            placed = []
+            try:
+                placed = pending.result()
+            except Exception as e:
+                print(f"✗ Lỗi khi ghi checkpoint: {e}")
+            self.node_store.apply(self.btree, placed)
+    
+    def archive(self):
+        """Chuyển ngay các bệnh nhân có ngày khám cũ sang phân đoạn lạnh (chờ luồng nền ghi xong);
+        trả về số bệnh nhân đã chuyển"""
+        if self._archiver is None:
+            raise ValueError("Chưa bật phân tầng nóng/lạnh (hot_days)")
+        pending = self._pending_archive
+        if pending is not None and self._archive_root is not self.btree.root:
+            # Lần đang chờ (vd. bắt đầu lúc mở file) chọn bệnh nhân trên cây cũ: bỏ kết quả, làm lại trên cây hiện tại
+            pending.cancel()
+            futures.wait([pending])
+            self._pending_archive = None
+        if self._pending_archive is None:
+            self._start_archive()
+        return self._finish_archive()
+    
+    def _poll_archive(self):
+        """Gọi trên đường ghi: áp dụng lần lưu trữ nền đã xong, hoặc bắt đầu lần mới sau archive_interval giây"""
+        if self._pending_archive is None:
+            if time.monotonic() - self._last_archive >= self.archive_interval:
+                self._start_archive()
+        elif self._pending_archive.done():
+            self._finish_archive()
+    
+    def _start_archive(self):
+        cutoff = (datetime.date.today() - datetime.timedelta(days=self.hot_days)).isoformat()
+        deleted = set(self.cold.deleted) if self.cold is not None else set()
+        snapshot = self.btree.snapshot()
+        # Mọi thao tác ghi sau snapshot đều sao chép root nên root khác nghĩa là cây đã đổi
+        self._archive_root = snapshot.root
+        self._pending_archive = self._archiver.submit(self._write_archive, snapshot, self.cold, deleted, cutoff)
+        self._last_archive = time.monotonic()
+    
+    def _write_archive(self, snapshot, segment, deleted, cutoff):
+        """Chạy trên luồng nền: chọn bệnh nhân khám trước cutoff trên snapshot của cây và ghi phân đoạn
+        mới (phân đoạn cũ + các bệnh nhân này) ra file tạm. Cây chưa bị thay đổi ở bước này."""
+        cutoff_day = datetime.date.fromisoformat(cutoff).toordinal()
+        migrated = []
+        for patient in snapshot.iter_range():
+            # So chuỗi chỉ để lọc nhanh: ngày không theo YYYY-MM-DD (nhập tay, giữ nguyên trong file) không
+            # so sánh được nên luôn ở tầng nóng
+            if patient.visit_date < cutoff:
+                raw, day = _encode_date(patient.visit_date)
+                if not raw and day < cutoff_day:
+                    migrated.append(patient)
+        if not migrated:
+            return None
+        write_segment(self.filename + '.cold.tmp', migrated, segment, deleted)
+        return migrated, deleted, cutoff
+    
+    def _finish_archive(self):
+        """Chờ lần lưu trữ nền rồi thay phân đoạn lạnh và bỏ các bệnh nhân đã chuyển khỏi cây.
+        Bệnh nhân bị xóa/thay trong lúc ghi nền vẫn ở cây (hoặc đã mất) nên bản trong phân đoạn được đánh
+        dấu xóa; cây (phần nóng) được lưu ngay để file .pat không còn giữ các bệnh nhân đã chuyển."""
+        pending, self._pending_archive = self._pending_archive, None
+        try:
+            result = pending.result()
+        except Exception as e:
+            print(f"✗ Lỗi khi lưu trữ bệnh nhân cũ: {e}")
+            return 0
+        if result is None:
+            return 0
+        migrated, deleted, cutoff = result
+        filename = self.filename + '.cold'
+        old = self.cold
+        if old is not None:
+            old.close()
+        os.replace(filename + '.tmp', filename)
+        # ID bị xóa ở phân đoạn cũ sau khi bắt đầu ghi nền vẫn còn trong phân đoạn mới
+        self.cold = ColdSegment(filename, deleted=())
+        for patient_id in sorted(old.deleted - deleted) if old is not None else ():
+            self.cold.delete(patient_id)
+        moved = []
+        for patient, key in zip(migrated, self.btree.search_many([patient.id for patient in migrated])):
+            if key is patient:
+                moved.append(patient.id)
+            else:
+                self.cold.delete(patient.id)
+        self.btree.delete_many(moved)
+        self._disk_stamp = None
+        self.save_to_file()
+        print(f"✓ Đã chuyển {len(moved)} bệnh nhân khám trước {cutoff} sang phân đoạn lạnh '{filename}'")
+        return len(moved)
+    
+    def _persist(self, op, value, sync=True):
+        """Ghi nhận một thay đổi: vào nhật ký nếu bật, ngược lại ghi lại toàn bộ file.
+        sync=False thì chỉ ghi vào bộ đệm, commit() sẽ đưa xuống đĩa sau."""
+        self._disk_stamp = None
+        if self.backend == 'paged':
+            return  # PagedBTree đã ghi các trang thay đổi
+        if self._archiver is not None:
+            self._poll_archive()
+        if self.journal is None:
+            if sync:
+                self.save_to_file()
+            else:
+                self._unsaved = True
+            return
+        self.journal.append(op, value, sync=sync)
+        if self.journal.entries >= self.checkpoint_interval:
+            self.checkpoint()
+    
+    def commit(self):
+        """Đưa các thay đổi ghi với sync=False xuống đĩa (một lần cho cả nhóm)"""
+        if self.journal is not None:
+            self.journal.sync()
+        elif self._unsaved:
+            self.save_to_file()
+    
+    def insert_patient(self, patient, sync=True):
+        """Thêm một đối tượng Patient và lưu thay đổi, trả về (thành công, thông báo)"""
+        self.wait_loaded()
+        existing = self.cold.get(patient.id) if self.cold is not None else None
+        if existing is not None:
+            return False, f"Mã bệnh nhân {patient.id} đã tồn tại! (Tên: {existing.name})"
+        success, message = self.btree.insert(patient)
+        if not success:
+            return success, message
+        try:
+            self._persist('I', patient_to_fields(patient), sync)
+        except BaseException:
+            # Chưa ghi được nhật ký/file thì bỏ khỏi cây, không để bản ghi mất đi khi khởi động lại
+            self.btree.delete(patient.id)
+            raise
+        if patient.id >= self.next_id:
+            self.next_id = patient.id + 1
+        # Chỉ mục phụ được cập nhật sau khi bản ghi đã được lưu
+        if self._index is not None:
+            self._index.add(patient)
+        if self._columns is not None:
+            self._columns.add(patient)
+        if self._names is not None:
+            self._names.add(patient)
+        return success, message
+    
+    def remove_patient(self, patient_id, sync=True):
+        """Xóa bệnh nhân theo ID và lưu thay đổi"""
+        self.wait_loaded()
+        need_patient = self._index is not None or self._names is not None
+        patient = self.search(patient_id) if need_patient else None
+        removed = self.btree.delete(patient_id)
+        if self.cold is not None and self.cold.delete(patient_id) is not None:
+            removed = True
+        if not removed:
+            return False
+        if patient is not None:
+            if self._index is not None:
+                self._index.remove(patient)
+            if self._names is not None:
+                self._names.remove(patient)
+        if self._columns is not None:
+            self._columns.remove(patient_id)
+        self._persist('D', patient_id, sync)
+        return True
+    
+    def delete_many(self, ids, sync=True):
+        """Xóa nhiều bệnh nhân theo ID trong một lần duyệt cây và một lần ghi xuống đĩa; trả về số đã xóa"""
+        self.wait_loaded()
+        ids = list(ids)
+        removed = self.btree.delete_many(ids)
+        if self.cold is not None:
+            removed = _merge_removed(removed, self.cold.delete_many(ids))
+        return self._removed(removed, sync)
+    
+    def purge_where(self, predicate, sync=True):
+        """Xóa mọi bệnh nhân thỏa predicate(patient), ví dụ hồ sơ quá hạn lưu trữ; trả về số đã xóa"""
+        self.wait_loaded()
+        removed = self.btree.purge_where(predicate)
+        if self.cold is not None:
+            removed = _merge_removed(removed, self.cold.purge_where(predicate))
+        return self._removed(removed, sync)
+    
+    def _removed(self, patients, sync):
+        for patient in patients:
+            if self._index is not None:
+                self._index.remove(patient)
+            if self._columns is not None:
+                self._columns.remove(patient.id)
+            if self._names is not None:
+                self._names.remove(patient)
+            self._persist('D', patient.id, sync=False)
+        if patients and sync:
+            self.commit()
+        return len(patients)
+    
+    def compact(self, limit=None):
+        """Xóa thật các bệnh nhân đã đánh dấu xóa (chế độ tombstone), tối đa limit bản ghi"""
+        if self.backend == 'paged':
+            return 0
+        return self.btree.compact(limit)
+    
+    def enable_metrics(self, metrics=None):
+        """Bật đo đạc cho B-Tree và các thao tác đọc/ghi file"""
+        self.metrics = self.btree.enable_metrics(metrics)
+        for name in ('load_from_file', 'save_to_file', 'checkpoint', 'commit'):
+            setattr(self, name, _timed(self.metrics, name, getattr(type(self), name).__get__(self)))
+        return self.metrics
+    
+    def display_stats(self):
+        """Hiển thị thống kê cấu trúc cây và số liệu đo hiệu năng"""
+        print("\n" + "="*70)
+        print("THỐNG KÊ HIỆU NĂNG B-TREE")
+        print("="*70)
+        height = 0
+        nodes = 0
+        for _, level_nodes in self.btree.iter_levels():
+            height += 1
+            nodes += len(level_nodes)
+        print(f"  Chiều cao cây: {height}")
+        print(f"  Tổng số node: {nodes}")
+        print(f"  Tổng số bệnh nhân: {self.btree.count()}")
+        if self.backend == 'lazy' and self.btree.store is not None:
+            cache = self.btree.store.stats()
+            print(f"  Cache bản ghi: {cache['entries']} bản ghi, {cache['bytes'] / 1024:.1f} KB, "
+                  f"hit {cache['hits']} / miss {cache['misses']} ({cache['hit_rate']:.1%}), "
+                  f"loại bỏ {cache['evictions']}")
+        if self.cold is not None:
+            print(f"  Phân đoạn lạnh: {len(self.cold)} bệnh nhân, {len(self.cold.first_ids)} block, "
+                  f"{self.cold.nbytes() / 1024 / 1024:.1f} MB")
+        
+        if self.metrics is None:
+            print("\n  Chưa bật đo hiệu năng (chạy: python app.py --metrics)")
+            print("="*70)
+            return
+        print("\n  Bộ đếm:")
+        for name, value in sorted(self.metrics.counters.items()):
+            print(f"    {name:<20} {value:>12}")
+        print(f"\n  {'Thao tác':<18} {'Số lần':>8} {'TB (ms)':>10} {'p50 (ms)':>10} {'p99 (ms)':>10}")
+        for op, data in sorted(self.metrics.snapshot()['latency'].items()):
+            print(f"  {op:<18} {data['count']:>8} {data['avg'] * 1000:>10.3f} "
+                  f"{data['p50'] * 1000:>10.3f} {data['p99'] * 1000:>10.3f}")
+        print("="*70)
+        filename = input("Xuất ra file Prometheus (Enter để bỏ qua): ").strip()
+        if filename:
+            self.metrics.write_prometheus(filename)
+            print(f"✓ Đã ghi số liệu vào '{filename}'")
+    
+    @property
+    def index(self):
+        """Chỉ mục phụ (SĐT, tên, ngày khám), được tạo lại từ B-Tree ở lần dùng đầu tiên"""
+        if self._index is None:
+            self._index = PatientIndex.build(self._scan())
+        return self._index
+    
+    def _patients_by_ids(self, ids):
+        return [patient for patient in self.search_many(ids) if patient is not None]
+    
+    def find_by_phone(self, phone):
+        """Tìm bệnh nhân theo số điện thoại"""
+        return self._patients_by_ids(self.index.find_phone(phone))
+    
+    def find_by_name(self, prefix, limit=None):
+        """Tìm bệnh nhân có tên bắt đầu bằng prefix (không phân biệt dấu, hoa/thường)"""
+        return self._patients_by_ids(self.index.find_name_prefix(prefix, limit))
+    
+    def find_by_visit_date(self, start, end=None):
+        """Tìm bệnh nhân có ngày khám trong khoảng [start, end]"""
+        return self._patients_by_ids(self.index.find_dates(start, end))
+    
+    @property
+    def name_index(self):
+        """Chỉ mục trigram của tên: đọc từ file .names nếu file được ghi cho đúng dữ liệu hiện có,
+        ngược lại tạo lại từ B-Tree ở lần dùng đầu tiên (file được ghi lại khi đóng)"""
+        if self._names is None:
+            self.wait_loaded()
+            if self._disk_stamp is not None:
+                self._names = NameIndex.load(self.filename + '.names', self._disk_stamp)
+            if self._names is None:
+                self._names = NameIndex.build(self._scan())
+        return self._names
+    
+    def find_by_name_fuzzy(self, query, limit=20, threshold=0.3):
+        """Tìm theo tên gần đúng (gõ sai, thiếu dấu): [(độ giống, Patient)] xếp theo độ giống giảm dần"""
+        ranked = []
+        for score, _, ids in self.name_index.search(query, limit, threshold):
+            ranked += ((score, patient_id) for patient_id in ids[:limit - len(ranked)])
+            if len(ranked) >= limit:
+                break
+        patients = self.search_many([patient_id for _, patient_id in ranked])
+        return [(score, patient) for (score, _), patient in zip(ranked, patients) if patient is not None]
+    
+    def suggest_names(self, prefix, limit=10):
+        """Gợi ý họ tên theo phần đã gõ: [(tên đã chuẩn hóa, số bệnh nhân)]"""
+        return self.name_index.complete(prefix, limit)
+    
+    @property
+    def columns(self):
+        """Bảng cột cho thống kê, được tạo lại từ B-Tree ở lần dùng đầu tiên"""
+        if self._columns is None:
+            self._columns = PatientColumns.build(self._scan())
+        return self._columns
+    
+    def stats(self, by=None, bin_width=10, **filters):
+        """Thống kê trên bảng cột với điều kiện lọc start, end (YYYY-MM-DD), gender, min_age, max_age.
+        by=None: số bệnh nhân; 'gender'/'age'/'day'/'month': dict nhóm -> số bệnh nhân;
+        'histogram': dict giới tính -> {tuổi đầu nhóm: số bệnh nhân}"""
+        if by is None:
+            return self.columns.count(**filters)
+        if by == 'histogram':
+            return self.columns.histogram(bin_width, **filters)
+        return self.columns.group_count(by, bin_width, **filters)
+    
+    def import_file(self, filename, delimiter=None, chunk_size=50000, workers=0):
+        """Nhập hàng loạt từ file '#'/CSV: đọc theo khối, kiểm tra từng dòng, thêm tất cả
+        vào cây rồi lưu một lần. workers > 1 thì phân tích các khối bằng process pool.
+        Trả về (số bệnh nhân đã nhập, danh sách (số dòng, lỗi))."""
+        if delimiter is None:
+            delimiter = delimiter_for(filename)
+        chunks = read_chunks(filename, delimiter, chunk_size)
+        
+        if workers and workers > 1:
+            with futures.ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(parse_chunk, chunks))
+        else:
+            results = [parse_chunk(chunk) for chunk in chunks]
+        
+        errors = []
+        batch = []
+        for patients, chunk_errors in results:
+            batch.extend(patients)
+            errors.extend(chunk_errors)
+        
+        imported = self._insert_batch(batch, errors)
+        if imported:
+            self._index = None  # Tạo lại chỉ mục phụ, bảng cột và chỉ mục tên khi cần
+            self._columns = None
+            self._names = None
+            self.save_to_file()
+        errors.sort()
+        return imported, errors
+    
+    def _insert_batch(self, rows, errors):
+        """Thêm các (số dòng, Patient) mà không lưu sau từng bản ghi; ID trùng được ghi vào errors"""
+        self.wait_loaded()
+        if self.cold is not None:
+            kept = []
+            for line_no, patient in rows:
+                existing = self.cold.get(patient.id)
+                if existing is None:
+                    kept.append((line_no, patient))
+                else:
+                    errors.append((line_no, f"Mã bệnh nhân {patient.id} đã tồn tại! (Tên: {existing.name})"))
+            rows = kept
+        if self.btree.count() == 0:
+            # Cây rỗng: sắp xếp, loại ID trùng rồi xây cây một lần
+            rows.sort(key=lambda row: (row[1].id, row[0]))
+            unique = []
+            for line_no, patient in rows:
+                if unique and unique[-1].id == patient.id:
+                    errors.append((line_no, f"Mã bệnh nhân {patient.id} bị trùng trong file"))
+                else:
+                    unique.append(patient)
+            if unique:
+                self.btree.bulk_load(unique)
+                self.next_id = max(self.next_id, unique[-1].id + 1)
+            return len(unique)
+        
+        imported = 0
+        results = self.btree.insert_many([patient for _, patient in rows])
+        for (line_no, patient), (success, message) in zip(rows, results):
+            if success:
+                imported += 1
+                self.next_id = max(self.next_id, patient.id + 1)
+            else:
+                errors.append((line_no, message))
+        return imported
+    
+    def export_file(self, filename, delimiter=None):
+        """Xuất toàn bộ bệnh nhân (theo thứ tự ID) ra file '#'/CSV, trả về số dòng đã ghi"""
+        if delimiter is None:
+            delimiter = delimiter_for(filename)
+        count = 0
+        with open(filename, 'w', encoding='utf-8', newline='') as file:
+            if delimiter == ',':
+                writer = csv.writer(file)
+                for patient in self._scan():
+                    writer.writerow(patient_to_fields(patient))
+                    count += 1
+            else:
+                for patient in self._scan():
+                    file.write(format_patient_row(patient, delimiter) + '\n')
+                    count += 1
+        return count
+    
+    def close(self):
+        """Checkpoint lần cuối và đóng nhật ký/file trang khi thoát (chế độ chỉ đọc: chỉ đóng file)"""
+        self.wait_loaded()
+        if self._archiver is not None:
+            if self._pending_archive is not None:
+                self._finish_archive()
+            self._archiver.shutdown()
+        if self._unsaved and not self.read_only:
+            self.save_to_file()
+        if self.journal is not None:
+            if self.journal.entries and not self.read_only:
+                self.checkpoint()
+            self._wait_checkpoint()
+            self.journal.close()
+        if self._checkpointer is not None:
+            self._checkpointer.shutdown()
+        if self.backend == 'paged':
+            self.btree.close()
+        elif self.backend == 'lazy' and self.btree.store is not None:
+            self.btree.store.close()
+        if self.cold is not None:
+            if not self.read_only:
+                self.cold.save_deleted()
+            self.cold.close()
+        if self._names is not None and self.backend != 'paged' and not self.read_only:
+            # Dữ liệu đã xuống đĩa hết: lưu chỉ mục tên để lần mở sau không phải tạo lại
+            stamp = _file_stamp(self.filename)
+            if stamp != self._names.stamp:
+                self._names.save(self.filename + '.names', stamp)
+    
+    def add_patient(self):
+        """Thêm bệnh nhân mới"""
+        print("\n" + "-"*40)
+        print("THÊM BỆNH NHÂN MỚI")
+        print("-"*40)
+        
+        try:
+            # ID tự động tăng
+            id = self.get_next_id()
+            print(f"Mã bệnh nhân (ID): {id} (tự động)")
+            
+            name = input("Nhập họ tên bệnh nhân: ")
+            age = int(input("Nhập tuổi: "))
+            if not 0 <= age <= 150:
+                raise ValueError("Tuổi không hợp lệ")
+            gender = input("Nhập giới tính (Nam/Nu): ")
+            phone = input("Nhập số điện thoại: ")
+            visit_date = input("Nhập ngày khám (YYYY-MM-DD): ")
+            
+            patient = Patient(id, name, age, gender, phone, visit_date)
+            success, message = self.insert_patient(patient)
+            
+            if success:
+                print(f"✓ Đã thêm bệnh nhân thành công!")
+                print(f"  {patient.display()}")
+            else:
+                print(f"✗ Thêm bệnh nhân thất bại! {message}")
+                # Giảm lại ID nếu thêm thất bại
+                self.next_id -= 1
+            
+        except ValueError:
+            print("✗ Dữ liệu không hợp lệ!")
+            # Giảm lại ID nếu có lỗi
+            self.next_id -= 1
+    
+    def search_patient(self):
+        """Tìm kiếm bệnh nhân theo ID"""
+        print("\n" + "-"*40)
+        print("TÌM KIẾM BỆNH NHÂN")
+        print("-"*40)
+        
+        try:
             id = int(input("Nhập mã bệnh nhân cần tìm: "))
-            patient = self.btree.search(id)
+            patient = self.search(id)
             
             if patient:
                 print(f"✓ Tìm thấy bệnh nhân:")
@@ -532,14 +4676,13 @@ class PatientManager:
         
         try:
             id = int(input("Nhập mã bệnh nhân cần xóa: "))
-            patient = self.btree.search(id)
+            patient = self.search(id)
             
             if patient:
                 print(f"  Thông tin: {patient.display()}")
                 confirm = input(f"Bạn có chắc muốn xóa bệnh nhân này? (y/n): ")
                 if confirm.lower() == 'y':
-                    self.btree.delete(id)
-                    self.save_to_file()
+                    self.remove_patient(id)
                     print(f"✓ Đã xóa bệnh nhân ID = {id}")
                 else:
                     print("✗ Hủy xóa")
@@ -549,18 +4692,98 @@ class PatientManager:
         except ValueError:
             print("✗ Mã bệnh nhân không hợp lệ!")
     
+    def search_by_phone(self):
+        """Tìm kiếm bệnh nhân theo số điện thoại"""
+        print("\n" + "-"*40)
+        print("TÌM KIẾM THEO SỐ ĐIỆN THOẠI")
+        print("-"*40)
+        phone = input("Nhập số điện thoại: ")
+        self._print_results(self.find_by_phone(phone))
+    
+    def search_by_name(self):
+        """Tìm kiếm bệnh nhân theo tên (tiền tố, không cần dấu)"""
+        print("\n" + "-"*40)
+        print("TÌM KIẾM THEO TÊN")
+        print("-"*40)
+        prefix = input("Nhập họ tên (hoặc phần đầu của họ tên): ")
+        if not prefix.strip():
+            print("✗ Tên không hợp lệ!")
+            return
+        patients = self.find_by_name(prefix)
+        if patients:
+            self._print_results(patients)
+            return
+        # Không có tên bắt đầu như vậy: có thể gõ sai hoặc gõ tên đệm/tên gọi, thử tìm gần đúng
+        ranked = self.find_by_name_fuzzy(prefix)
+        if not ranked:
+            print("✗ Không tìm thấy bệnh nhân phù hợp")
+            return
+        print(f"Không có tên bắt đầu bằng '{prefix.strip()}'. {len(ranked)} kết quả gần đúng:")
+        for score, patient in ranked:
+            print(f"  [{score:.0%}] {patient.display()}")
+    
+    def search_by_visit_date(self):
+        """Tìm kiếm bệnh nhân theo ngày khám hoặc khoảng ngày"""
+        print("\n" + "-"*40)
+        print("TÌM KIẾM THEO NGÀY KHÁM")
+        print("-"*40)
+        start = input("Từ ngày (YYYY-MM-DD): ").strip()
+        end = input("Đến ngày (YYYY-MM-DD, Enter nếu chỉ tìm 1 ngày): ").strip()
+        self._print_results(self.find_by_visit_date(start, end or None))
+    
+    def stats_report(self):
+        """Báo cáo thống kê: số lượt khám theo tháng, theo giới tính và phân bố tuổi"""
+        print("\n" + "="*70)
+        print("BÁO CÁO THỐNG KÊ")
+        print("="*70)
+        start = input("Từ ngày (YYYY-MM-DD, Enter để bỏ qua): ").strip() or None
+        end = input("Đến ngày (YYYY-MM-DD, Enter để bỏ qua): ").strip() or None
+        try:
+            total = self.stats(start=start, end=end)
+        except ValueError:
+            print("✗ Ngày không hợp lệ!")
+            return
+        print(f"\n  Số bệnh nhân: {total}  (tính bằng {'NumPy' if self.columns.np is not None else 'Python'})")
+        if not total:
+            return
+        print("\n  Theo giới tính:")
+        for gender, n in self.stats('gender', start=start, end=end).items():
+            print(f"    {gender:<10} {n:>8} ({n / total:.1%})")
+        print("\n  Số lượt khám theo tháng:")
+        for month, n in self.stats('month', start=start, end=end).items():
+            print(f"    {month:<10} {n:>8}")
+        histogram = self.stats('histogram', start=start, end=end)
+        genders = list(histogram)
+        print("\n  Phân bố tuổi:")
+        print(f"    {'Tuổi':<10}" + ''.join(f"{gender:>10}" for gender in genders))
+        for low in sorted({low for counts in histogram.values() for low in counts}):
+            cells = ''.join(f"{histogram[gender].get(low, 0):>10}" for gender in genders)
+            print(f"    {f'{low}-{low + 9}':<10}{cells}")
+        print("="*70)
+    
+    def _print_results(self, patients):
+        if not patients:
+            print("✗ Không tìm thấy bệnh nhân phù hợp")
+            return
+        print(f"✓ Tìm thấy {len(patients)} bệnh nhân:")
+        for patient in patients:
+            print(f"  {patient.display()}")
+    
     def display_tree(self):
-        """Hiển thị cấu trúc B-Tree"""
+        """Hiển thị cấu trúc B-Tree (cây lớn chỉ in bảng tóm tắt theo level)"""
+        if self.btree.count() > self.btree.DISPLAY_LIMIT:
+            self.btree.display_summary()
+            return
         self.btree.display()
         self.btree.display_visual()
     
-    def display_all_patients(self):
-        """Hiển thị danh sách tất cả bệnh nhân"""
+    def display_all_patients(self, page_size=20):
+        """Hiển thị danh sách tất cả bệnh nhân theo từng trang"""
         print("\n" + "="*90)
         print("DANH SÁCH TẤT CẢ BỆNH NHÂN (Sắp xếp theo ID)")
         print("="*90)
         
-        patients = self.btree.in_order_traversal()
+        patients = self.page(None, page_size)
         if not patients:
             print("Chưa có bệnh nhân nào trong hệ thống.")
             return
@@ -568,18 +4791,542 @@ class PatientManager:
         print(f"{'ID':<6} {'Họ tên':<25} {'Tuổi':<6} {'Giới tính':<10} {'SĐT':<15} {'Ngày khám':<12}")
         print("-"*90)
         
-        for p in patients:
-            print(f"{p.id:<6} {p.name:<25} {p.age:<6} {p.gender:<10} {p.phone:<15} {p.visit_date:<12}")
+        while True:
+            for p in patients:
+                print(f"{p.id:<6} {p.name:<25} {p.age:<6} {p.gender:<10} {p.phone:<15} {p.visit_date:<12}")
+            if len(patients) < page_size:
+                break
+            next_page = self.page(patients[-1].id, page_size)
+            if not next_page:
+                break
+            if input("-- Enter để xem trang tiếp, 'q' để dừng: ").strip().lower() == 'q':
+                break
+            patients = next_page
         
         print("-"*90)
-        print(f"Tổng số: {len(patients)} bệnh nhân")
+        print(f"Tổng số: {self.count()} bệnh nhân")
+
+
+# ==================== PHÂN MẢNH (SHARDING) ====================
+MIN_ID = -(1 << 63)      # Biên dưới/trên của khoảng ID (vừa kiểu 'q' của node.ids)
+MAX_ID = (1 << 63) - 1
+_shard = None  # PatientManager của shard, chỉ có trong process con
+
+
+def _shard_open(filename, max_keys, journal):
+    """Khởi tạo process con: mở PatientManager của một shard (bỏ các dòng print)"""
+    global _shard
+    sys.stdout = open(os.devnull, 'w')
+    _shard = PatientManager(filename, max_keys, journal=journal)
+
+
+def _shard_call(method, *args):
+    return getattr(_shard, method)(*args)
+
+
+def _shard_search(ids):
+    return _shard.btree.search_many(ids)
+
+
+def _shard_range(lo, hi, limit=None):
+    """Các bệnh nhân có ID trong [lo, hi) theo thứ tự ID (tối đa limit)"""
+    return list(islice(_shard.btree.iter_range(lo, hi - 1), limit))
+
+
+def _shard_count(lo, hi):
+    return _shard.btree.count_range(lo, hi - 1)
+
+
+def _shard_select(lo, ranks):
+    """ID đứng ở các hạng ranks tính từ ID lo trong shard"""
+    base = _shard.btree.rank(lo)
+    return [_shard.btree.select(base + rank).id for rank in ranks]
+
+
+def _shard_put(patients):
+    """Thêm một lô bệnh nhân rồi lưu một lần (shard rỗng thì xây cây bằng bulk_load)"""
+    imported = _shard._insert_batch(list(enumerate(patients)), [])
+    if imported:
+        _shard._index = None
+        _shard._columns = None
+        _shard._names = None
+        _shard.save_to_file()
+    return imported
+
+
+def _shard_prune(lo, hi):
+    """Xóa các bệnh nhân nằm ngoài [lo, hi) (bản sao còn sót sau khi chia lại ranh giới)"""
+    btree = _shard.btree
+    ids = [patient.id for patient in btree.iter_range(None, lo - 1)]
+    ids += [patient.id for patient in btree.iter_range(hi, None)]
+    for patient_id in ids:
+        _shard.remove_patient(patient_id, sync=False)
+    _shard.commit()
+    return len(ids)
+
+
+class ShardedPatientManager:
+    """Chia bệnh nhân theo khoảng ID ('range') hoặc băm ID ('hash') vào nhiều shard. Mỗi shard là một
+    PatientManager với file riêng chạy trong process riêng, nên các thao tác trên nhiều shard
+    (nạp hàng loạt, quét toàn bộ, tra nhiều ID) chạy song song trên nhiều lõi."""
+    PARTITIONS = ('range', 'hash')
+
+    def __init__(self, filename='patients.pat', shards=4, max_keys=5, partition='range', journal=True,
+                 max_shard_size=None):
+        self.meta_filename = filename + '.shards'
+        # Số shard, cách chia và ranh giới đã lưu được ưu tiên hơn tham số
+        meta = {'partition': partition, 'shards': shards, 'bounds': [MIN_ID] * (shards - 1)}
+        if os.path.exists(self.meta_filename):
+            with open(self.meta_filename, 'r', encoding='utf-8') as file:
+                meta = json.load(file)
+        if meta['partition'] not in self.PARTITIONS:
+            raise ValueError(f"Cách chia không hợp lệ: {meta['partition']} (chọn một trong {self.PARTITIONS})")
+        self.partition = meta['partition']
+        # Shard i giữ các ID trong [bounds[i - 1], bounds[i]); ranh giới ban đầu dồn hết vào shard cuối
+        # (ID tự tăng luôn rơi vào đó), rebalance() sẽ chia lại
+        self.bounds = meta['bounds']
+        self.max_shard_size = max_shard_size
+        base, ext = os.path.splitext(filename)
+        self.filenames = [f"{base}.shard{i}{ext}" for i in range(meta['shards'])]
+        self.executors = [futures.ProcessPoolExecutor(max_workers=1, initializer=_shard_open,
+                                                      initargs=(shard_file, max_keys, journal))
+                          for shard_file in self.filenames]
+        self._save_meta()
+        
+        # Dọn bản sao còn sót nếu lần chia lại trước bị dừng giữa chừng, rồi đếm số bệnh nhân mỗi shard
+        if self.partition == 'range':
+            self._gather(_shard_prune, [self._range(i) for i in range(len(self.executors))])
+        self.counts = self._gather(_shard_count, [self._range(i) for i in range(len(self.executors))])
+        self.next_id = max(self._gather(_shard_call, [('get_next_id',)] * len(self.executors)))
+    
+    def _save_meta(self):
+        meta = {'partition': self.partition, 'shards': len(self.executors), 'bounds': self.bounds}
+        tmp_filename = self.meta_filename + '.tmp'
+        with open(tmp_filename, 'w', encoding='utf-8') as file:
+            json.dump(meta, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_filename, self.meta_filename)
+    
+    def _range(self, i, bounds=None):
+        """Khoảng ID [lo, hi) của shard i (theo ranh giới hiện tại hoặc bounds)"""
+        if self.partition == 'hash':
+            return MIN_ID, MAX_ID
+        bounds = self.bounds if bounds is None else bounds
+        lo = bounds[i - 1] if i > 0 else MIN_ID
+        hi = bounds[i] if i < len(bounds) else MAX_ID
+        return lo, hi
+    
+    def _shard_for(self, patient_id, bounds=None):
+        if self.partition == 'hash':
+            return patient_id % len(self.executors)
+        return bisect_right(self.bounds if bounds is None else bounds, patient_id)
+    
+    def _submit(self, i, func, *args):
+        return self.executors[i].submit(func, *args)
+    
+    def _gather(self, func, args_per_shard):
+        """Gọi func song song trên mọi shard (mỗi shard một bộ tham số), trả về kết quả theo thứ tự shard"""
+        futures = [self._submit(i, func, *args) for i, args in enumerate(args_per_shard)]
+        return [future.result() for future in futures]
+    
+    # ---------- Thao tác trên một bệnh nhân ----------
+    def get_next_id(self):
+        current_id = self.next_id
+        self.next_id += 1
+        return current_id
+    
+    def insert_patient(self, patient):
+        i = self._shard_for(patient.id)
+        success, message = self._submit(i, _shard_call, 'insert_patient', patient).result()
+        if success:
+            self.counts[i] += 1
+            self.next_id = max(self.next_id, patient.id + 1)
+            if self._is_oversized(i):
+                self.rebalance()
+        return success, message
+    
+    def remove_patient(self, patient_id):
+        i = self._shard_for(patient_id)
+        removed = self._submit(i, _shard_call, 'remove_patient', patient_id).result()
+        if removed:
+            self.counts[i] -= 1
+        return removed
+    
+    def search(self, patient_id):
+        return self.search_many([patient_id])[0]
+    
+    def search_many(self, ids):
+        """Tra nhiều ID cùng lúc: gom theo shard, tra song song, trả kết quả theo thứ tự đầu vào"""
+        ids = list(ids)
+        groups = defaultdict(list)
+        for position, patient_id in enumerate(ids):
+            groups[self._shard_for(patient_id)].append(position)
+        futures = {i: self._submit(i, _shard_search, [ids[position] for position in positions])
+                   for i, positions in groups.items()}
+        results = [None] * len(ids)
+        for i, positions in groups.items():
+            for position, patient in zip(positions, futures[i].result()):
+                results[position] = patient
+        return results
+    
+    # ---------- Thao tác trên toàn bộ shard ----------
+    def count(self):
+        return sum(self.counts)
+    
+    def load_patients(self, patients):
+        """Nạp hàng loạt: chia theo shard rồi mỗi shard xây cây và lưu file song song.
+        Khi mọi shard còn rỗng và chia theo khoảng, ranh giới được chọn để các shard đều nhau."""
+        patients = sorted(patients, key=lambda patient: patient.id)
+        n = len(self.executors)
+        if self.partition == 'range' and self.count() == 0 and len(patients) >= n:
+            self.bounds = [patients[len(patients) * k // n].id for k in range(1, n)]
+            self._save_meta()
+        parts = [[] for _ in range(n)]
+        for patient in patients:
+            parts[self._shard_for(patient.id)].append(patient)
+        imported = self._gather(_shard_put, [(part,) for part in parts])
+        for i, count in enumerate(imported):
+            self.counts[i] += count
+        if patients:
+            self.next_id = max(self.next_id, patients[-1].id + 1)
+        return sum(imported)
+    
+    def page(self, after_id=None, limit=20):
+        """Tối đa limit bệnh nhân có ID > after_id: mỗi shard trả một trang, trộn k-đường bằng heapq.merge"""
+        pages = self._gather(_shard_range, [self._page_args(i, after_id, limit) for i in range(len(self.executors))])
+        return list(islice(heapq.merge(*pages, key=lambda patient: patient.id), limit))
+    
+    def _page_args(self, i, after_id, limit):
+        lo, hi = self._range(i)
+        if after_id is not None:
+            lo = max(lo, after_id + 1)
+        return lo, max(lo, hi), limit
+    
+    def iter_all(self, batch_size=1000):
+        """Duyệt toàn bộ bệnh nhân theo thứ tự ID: mỗi shard được đọc từng lô batch_size bản ghi
+        (lô kế tiếp được yêu cầu trước khi dùng lô hiện tại), các dòng được trộn k-đường"""
+        streams = []
+        for i in range(len(self.executors)):
+            lo, hi = self._range(i)
+            streams.append(self._iter_shard(i, hi, batch_size, self._submit(i, _shard_range, lo, hi, batch_size)))
+        return heapq.merge(*streams, key=lambda patient: patient.id)
+    
+    def _iter_shard(self, i, hi, batch_size, future):
+        while True:
+            batch = future.result()
+            if len(batch) < batch_size:
+                yield from batch
+                return
+            future = self._submit(i, _shard_range, batch[-1].id + 1, hi, batch_size)
+            yield from batch
+    
+    def _owned(self, results):
+        """Bỏ các bản sao nằm ngoài khoảng của shard chứa nó"""
+        return [[patient for patient in patients if self._shard_for(patient.id) == i]
+                for i, patients in enumerate(results)]
+    
+    def find_by_phone(self, phone):
+        results = self._owned(self._gather(_shard_call, [('find_by_phone', phone)] * len(self.executors)))
+        return sorted((patient for patients in results for patient in patients), key=lambda patient: patient.id)
+    
+    def find_by_name(self, prefix, limit=None):
+        results = self._owned(self._gather(_shard_call, [('find_by_name', prefix, limit)] * len(self.executors)))
+        merged = heapq.merge(*results, key=lambda patient: (normalize_name(patient.name), patient.id))
+        return list(islice(merged, limit))
+    
+    # ---------- Chia lại ranh giới ----------
+    def _is_oversized(self, i):
+        """Shard vượt max_shard_size và lớn hơn gấp đôi mức trung bình"""
+        return (self.partition == 'range' and self.max_shard_size is not None
+                and self.counts[i] > self.max_shard_size and self.counts[i] * len(self.counts) > 2 * self.count())
+    
+    def rebalance(self):
+        """Chia lại ranh giới (chỉ với cách chia theo khoảng) để các shard có số bệnh nhân gần bằng nhau.
+        Dữ liệu được chép sang shard mới và ranh giới mới được lưu trước khi xóa ở shard cũ,
+        nên nếu dừng giữa chừng, bản sao thừa chỉ bị bỏ qua và được dọn ở lần mở sau."""
+        n = len(self.executors)
+        total = self.count()
+        if self.partition != 'range' or total < n:
+            return False
+        # ID ở các hạng total * k / n trên toàn bộ dữ liệu trở thành ranh giới mới
+        wanted = defaultdict(list)
+        starts = [sum(self.counts[:i]) for i in range(n)]
+        for k in range(1, n):
+            rank = total * k // n
+            i = bisect_right(starts, rank) - 1
+            while self.counts[i] == 0 or rank - starts[i] >= self.counts[i]:
+                i += 1
+            wanted[i].append((k, rank - starts[i]))
+        futures = {i: self._submit(i, _shard_select, self._range(i)[0], [rank for _, rank in items])
+                   for i, items in wanted.items()}
+        bounds = [None] * (n - 1)
+        for i, items in wanted.items():
+            for (k, _), patient_id in zip(items, futures[i].result()):
+                bounds[k - 1] = patient_id
+        if bounds == self.bounds:
+            return False
+        
+        # 1. Chép phần mỗi shard cũ không còn giữ sang shard mới
+        moving = []
+        for i in range(n):
+            lo, hi = self._range(i)
+            new_lo, new_hi = self._range(i, bounds)
+            if new_lo > lo:
+                moving.append(self._submit(i, _shard_range, lo, min(hi, new_lo)))
+            if new_hi < hi:
+                moving.append(self._submit(i, _shard_range, max(lo, new_hi), hi))
+        parts = [[] for _ in range(n)]
+        for future in moving:
+            for patient in future.result():
+                parts[self._shard_for(patient.id, bounds)].append(patient)
+        self._gather(_shard_put, [(sorted(part, key=lambda patient: patient.id),) for part in parts])
+        
+        # 2. Lưu ranh giới mới, 3. xóa bản cũ
+        self.bounds = bounds
+        self._save_meta()
+        ranges = [self._range(i) for i in range(n)]
+        self._gather(_shard_prune, ranges)
+        self.counts = self._gather(_shard_count, ranges)
+        return True
+    
+    def close(self):
+        self._gather(_shard_call, [('close',)] * len(self.executors))
+        for executor in self.executors:
+            executor.shutdown()
+
+
+# ==================== MÁY CHỦ NHIỀU QUẦY TIẾP ĐÓN ====================
+class ReadWriteLock:
+    """Khóa đọc-ghi: nhiều luồng đọc cùng lúc, luồng ghi độc quyền (ưu tiên luồng ghi)"""
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextlib.contextmanager
+    def read_locked(self):
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def write_locked(self):
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
 
 
-def main_menu():
+def patient_to_dict(patient):
+    return {name: getattr(patient, name) for name in Patient.__slots__}
+
+
+class PatientServer:
+    """Dịch vụ TCP (mỗi dòng một JSON) bọc PatientManager cho nhiều quầy dùng chung.
+    Lệnh đọc chạy song song trong thread pool dưới khóa đọc; lệnh ghi được tuần tự hóa
+    bằng khóa ghi và được xác nhận sau một lần commit chung cho cả nhóm (group commit).
+    Ở chế độ tombstone, các key đã đánh dấu xóa được dọn ở nền theo từng lô compact_batch key."""
+    READ_OPS = ('ping', 'search', 'search_many', 'count', 'range', 'find_phone', 'find_name', 'find_date', 'metrics',
+                'fuzzy_name', 'suggest_name')
+    WRITE_OPS = ('add', 'delete')
+
+    def __init__(self, manager, host='127.0.0.1', port=8765, workers=8, commit_delay=0.002,
+                 compact_batch=500, compact_interval=0.5):
+        self.manager = manager
+        self.host = host
+        self.port = port
+        self.lock = ReadWriteLock()
+        self.executor = futures.ThreadPoolExecutor(max_workers=workers)
+        self.commit_delay = commit_delay
+        self.compact_batch = compact_batch
+        self.compact_interval = compact_interval
+        self.server = None
+        self._waiters = []
+        self._commit_event = None
+        self._commit_task = None
+        self._compact_task = None
+        # Tạo các chỉ mục trước để luồng đọc không phải tạo (O(N)) đồng thời dưới khóa đọc
+        manager.index
+        manager.name_index
+
+    async def start(self):
+        self._commit_event = asyncio.Event()
+        self._commit_task = asyncio.create_task(self._commit_loop())
+        self._compact_task = asyncio.create_task(self._compact_loop())
+        self.server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        await self.start()
+        print(f"✓ Máy chủ đang chạy tại {self.host}:{self.port}")
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self._commit_task is not None:
+            self._commit_task.cancel()
+        if self._compact_task is not None:
+            self._compact_task.cancel()
+        await self._run(self._commit)
+        self.executor.shutdown(wait=True)
+
+    async def _handle_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                response = await self._dispatch(line)
+                writer.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, line):
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("Yêu cầu phải là một đối tượng JSON")
+            op = request.get('op')
+            if op in self.READ_OPS:
+                result = await self._run(self._read, op, request)
+            elif op in self.WRITE_OPS:
+                result = await self._run(self._write, op, request)
+                await self._wait_commit()
+            else:
+                raise ValueError(f"Lệnh không hợp lệ: {op}")
+            return {'ok': True, 'result': result}
+        except Exception as e:
+            # Lỗi của một yêu cầu chỉ trả về cho quầy đó, không đóng kết nối
+            return {'ok': False, 'error': str(e) or type(e).__name__}
+
+    def _run(self, func, *args):
+        return asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def _read(self, op, request):
+        manager = self.manager
+        with self.lock.read_locked():
+            if op == 'ping':
+                return 'pong'
+            if op == 'search':
+                patient = manager.search(int(request['id']))
+                return patient_to_dict(patient) if patient is not None else None
+            if op == 'search_many':
+                patients = manager.search_many([int(patient_id) for patient_id in request['ids']])
+                return [patient_to_dict(patient) if patient is not None else None for patient in patients]
+            if op == 'count':
+                return manager.count()
+            if op == 'metrics':
+                return manager.metrics.snapshot() if manager.metrics is not None else None
+            if op == 'suggest_name':
+                return manager.suggest_names(request['prefix'], int(request.get('limit', 10)))
+            if op == 'fuzzy_name':
+                ranked = manager.find_by_name_fuzzy(request['name'], int(request.get('limit', 20)))
+                return [dict(patient_to_dict(patient), score=round(score, 3)) for score, patient in ranked]
+            if op == 'range':
+                patients = islice(manager.iter_range(request.get('lo'), request.get('hi')),
+                                  int(request.get('limit', 100)))
+            elif op == 'find_phone':
+                patients = manager.find_by_phone(request['phone'])
+            elif op == 'find_name':
+                patients = manager.find_by_name(request['prefix'], request.get('limit'))
+            else:
+                patients = manager.find_by_visit_date(request['start'], request.get('end'))
+            return [patient_to_dict(patient) for patient in patients]
+
+    def _write(self, op, request):
+        manager = self.manager
+        with self.lock.write_locked():
+            if op == 'delete':
+                return manager.remove_patient(int(request['id']), sync=False)
+            patient_id = request.get('id')
+            patient = Patient(int(patient_id) if patient_id is not None else manager.next_id,
+                              request['name'], int(request['age']), request['gender'],
+                              request['phone'], request['visit_date'])
+            validate_patient(patient)
+            success, message = manager.insert_patient(patient, sync=False)
+            if not success:
+                raise ValueError(message)
+            return patient.id
+
+    async def _wait_commit(self):
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self._commit_event.set()
+        await future
+
+    async def _commit_loop(self):
+        """Gom các lệnh ghi trong commit_delay giây rồi fsync một lần cho cả nhóm"""
+        while True:
+            await self._commit_event.wait()
+            await asyncio.sleep(self.commit_delay)
+            self._commit_event.clear()
+            waiters, self._waiters = self._waiters, []
+            try:
+                await self._run(self._commit)
+            except Exception as e:
+                for waiter in waiters:
+                    waiter.set_exception(e)
+            else:
+                for waiter in waiters:
+                    waiter.set_result(None)
+
+    def _commit(self):
+        with self.lock.read_locked():
+            self.manager.commit()
+
+    async def _compact_loop(self):
+        """Mỗi lô giữ khóa ghi trong thời gian ngắn; giữa các lô trả lượt cho các lệnh đang chờ"""
+        while True:
+            await asyncio.sleep(self.compact_interval)
+            while self.manager.btree.dead_count:
+                await self._run(self._compact)
+
+    def _compact(self):
+        with self.lock.write_locked():
+            return self.manager.compact(self.compact_batch)
+
+
+def main_menu(metrics=False, backend='memory', cache_entries=10000, cache_bytes=None, incremental=False,
+              background_load=False, tombstones=False, hot_days=None):
     """Menu chính"""
+    def open_manager():
+        return PatientManager(filename='patients.pat', max_keys=5, journal=True, metrics=metrics,
+                              backend=backend, cache_entries=cache_entries, cache_bytes=cache_bytes,
+                              incremental=incremental, background_load=background_load,
+                              tombstones=tombstones, hot_days=hot_days)
+    
+    # Nạp nền: bắt đầu đọc dữ liệu ngay trong lúc người dùng đăng nhập
+    manager = open_manager() if background_load else None
     # Đăng nhập trước
     auth = AuthManager()
     if not auth.login():
+        if manager is not None:
+            manager.close()
         return
     
     print("\n" + "="*50)
@@ -587,7 +5334,8 @@ def main_menu():
     print("         (Sử dụng B-Tree & File Nhị Phân)")
     print("="*50)
     
-    manager = PatientManager(filename='patients.pat', max_keys=5)
+    if manager is None:
+        manager = open_manager()
     
     while True:
         print("\n" + "="*50)
@@ -599,10 +5347,15 @@ def main_menu():
         print("4. Hiển thị cấu trúc B-Tree")
         print("5. Hiển thị danh sách bệnh nhân")
         print("6. Lưu dữ liệu vào file")
+        print("7. Tìm kiếm theo số điện thoại")
+        print("8. Tìm kiếm theo tên")
+        print("9. Tìm kiếm theo ngày khám")
+        print("10. Thống kê hiệu năng B-Tree")
+        print("11. Báo cáo thống kê bệnh nhân")
         print("0. Thoát")
         print("-"*50)
         
-        choice = input("Chọn chức năng (0-6): ")
+        choice = input("Chọn chức năng (0-11): ")
         
         if choice == '1':
             manager.add_patient()
@@ -616,12 +5369,105 @@ def main_menu():
             manager.display_all_patients()
         elif choice == '6':
             manager.save_to_file()
+        elif choice == '7':
+            manager.search_by_phone()
+        elif choice == '8':
+            manager.search_by_name()
+        elif choice == '9':
+            manager.search_by_visit_date()
+        elif choice == '10':
+            manager.display_stats()
+        elif choice == '11':
+            manager.stats_report()
         elif choice == '0':
+            manager.close()
             print("\nTạm biệt!")
             break
         else:
             print("✗ Lựa chọn không hợp lệ!")
 
 
+def main(argv=None):
+    """Điểm vào dòng lệnh: không có lệnh con thì mở menu tương tác"""
+    parser = argparse.ArgumentParser(description="Hệ thống quản lý hồ sơ bệnh nhân (B-Tree)")
+    parser.add_argument('--metrics', action='store_true', help="Bật đo hiệu năng B-Tree")
+    parser.add_argument('--lazy', action='store_true',
+                        help="Chỉ giữ ID trong bộ nhớ, đọc hồ sơ từ file .pat khi cần (menu và serve)")
+    parser.add_argument('--cache-entries', type=int, default=10000, help="Số hồ sơ tối đa trong cache (--lazy)")
+    parser.add_argument('--cache-bytes', type=int, help="Dung lượng tối đa của cache, tính bằng byte (--lazy)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Checkpoint chỉ ghi các node thay đổi vào file .nodes (menu và serve)")
+    parser.add_argument('--tombstones', action='store_true',
+                        help="Xóa chỉ đánh dấu; key được dọn theo lô ở nền (serve) hoặc khi checkpoint")
+    parser.add_argument('--background-load', action='store_true',
+                        help="Mở menu ngay, nạp dữ liệu trên luồng nền; thao tác cần dữ liệu sẽ chờ nạp xong")
+    parser.add_argument('--hot-days', type=int,
+                        help="Chỉ giữ trong bộ nhớ bệnh nhân khám trong N ngày gần nhất; bệnh nhân cũ hơn được "
+                             "chuyển ở nền sang phân đoạn nén patients.pat.cold (menu và serve)")
+    subparsers = parser.add_subparsers(dest='command')
+    
+    convert_parser = subparsers.add_parser('convert', help="Chuyển file pickle cũ/patients.txt sang .pat mới")
+    convert_parser.add_argument('source')
+    convert_parser.add_argument('target', nargs='?', default='patients.pat')
+    
+    import_parser = subparsers.add_parser('import', help="Nhập hàng loạt từ file '#' hoặc CSV")
+    import_parser.add_argument('source')
+    import_parser.add_argument('--db', default='patients.pat', help="File dữ liệu .pat")
+    import_parser.add_argument('--delimiter', help="Mặc định: ',' với file .csv, '#' với file khác")
+    import_parser.add_argument('--chunk-size', type=int, default=50000)
+    import_parser.add_argument('--workers', type=int, default=0, help="Số process phân tích song song")
+    
+    export_parser = subparsers.add_parser('export', help="Xuất dữ liệu ra file '#' hoặc CSV")
+    export_parser.add_argument('target')
+    export_parser.add_argument('--db', default='patients.pat', help="File dữ liệu .pat")
+    export_parser.add_argument('--delimiter', help="Mặc định: ',' với file .csv, '#' với file khác")
+    
+    serve_parser = subparsers.add_parser('serve', help="Chạy máy chủ cho nhiều quầy tiếp đón")
+    serve_parser.add_argument('--db', default='patients.pat', help="File dữ liệu .pat")
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8765)
+    serve_parser.add_argument('--workers', type=int, default=8, help="Số luồng xử lý")
+    
+    args = parser.parse_args(argv)
+    manager_options = {'backend': 'lazy' if args.lazy else 'memory', 'incremental': args.incremental,
+                       'cache_entries': args.cache_entries, 'cache_bytes': args.cache_bytes,
+                       'background_load': args.background_load, 'tombstones': args.tombstones,
+                       'hot_days': args.hot_days}
+    if args.command == 'convert':
+        return 0 if convert_to_binary(args.source, args.target) else 1
+    if args.command == 'import':
+        manager = PatientManager(filename=args.db, journal=True, **manager_options)
+        imported, errors = manager.import_file(args.source, args.delimiter, args.chunk_size, args.workers)
+        manager.close()
+        print(f"✓ Đã nhập {imported} bệnh nhân từ '{args.source}'")
+        if errors:
+            print(f"✗ {len(errors)} dòng lỗi:")
+            for line_no, message in errors[:20]:
+                print(f"  Dòng {line_no}: {message}")
+            if len(errors) > 20:
+                print(f"  ... và {len(errors) - 20} lỗi khác")
+        return 0
+    if args.command == 'export':
+        # Mở cả nhật ký để xuất luôn các thao tác chưa được checkpoint vào .pat, nhưng chỉ đọc:
+        # không checkpoint hay cắt nhật ký của máy chủ có thể đang chạy
+        manager = PatientManager(filename=args.db, journal=True, read_only=True, **manager_options)
+        count = manager.export_file(args.target, args.delimiter)
+        manager.close()
+        print(f"✓ Đã xuất {count} bệnh nhân ra '{args.target}'")
+        return 0
+    if args.command == 'serve':
+        manager = PatientManager(filename=args.db, journal=True, metrics=args.metrics, **manager_options)
+        server = PatientServer(manager, args.host, args.port, args.workers)
+        try:
+            asyncio.run(server.serve_forever())
+        except KeyboardInterrupt:
+            print("\nĐang dừng máy chủ...")
+        finally:
+            manager.close()
+        return 0
+    main_menu(metrics=args.metrics, **manager_options)
+    return 0
+
+
 if __name__ == "__main__":
-    main_menu()
+    sys.exit(main())
@@ -0,0 +1 @@
+"""Các script đo hiệu năng cho app.py. Chạy từ thư mục gốc: python -m benchmarks.<tên_script>"""
@@ -0,0 +1,48 @@
+"""So sánh chèn ID tăng dần (get_next_id) có và không có fast path cạnh phải.
+
+    python -m benchmarks.bench_append --sizes 10000 100000 --max-keys 5 64
+"""
+import argparse
+
+from benchmarks.common import make_patients, timed
+from app import BTree
+
+
+def insert_sequential(patients, max_keys, append_optimized):
+    tree = BTree(max_keys=max_keys, append_optimized=append_optimized)
+    for patient in patients:
+        tree.insert(patient)
+    return tree
+
+
+def tree_shape(tree):
+    """Số node và tỉ lệ lấp đầy trung bình (số key / sức chứa)"""
+    nodes = 0
+    stack = [tree.root]
+    while stack:
+        node = stack.pop()
+        nodes += 1
+        stack.extend(node.children)
+    return nodes, tree.count() / (nodes * tree.max_keys)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--max-keys', type=int, nargs='+', default=[5, 64])
+    args = parser.parse_args()
+    
+    print(f"{'N':>8} {'max_keys':>8} {'mode':>8} {'time (s)':>9} {'ops/s':>10} {'nodes':>8} {'fill':>6} {'height':>6}")
+    for n in args.sizes:
+        patients = make_patients(n)
+        for max_keys in args.max_keys:
+            for append_optimized in (False, True):
+                tree, elapsed = timed(insert_sequential, patients, max_keys, append_optimized)
+                nodes, fill = tree_shape(tree)
+                mode = 'append' if append_optimized else 'split'
+                print(f"{n:>8} {max_keys:>8} {mode:>8} {elapsed:>9.3f} {n / elapsed:>10.0f} "
+                      f"{nodes:>8} {fill:>6.1%} {tree.get_tree_height():>6}")
+
+
+if __name__ == '__main__':
+    main()
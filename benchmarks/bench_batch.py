@@ -0,0 +1,68 @@
+"""So sánh search_many/insert_many với vòng lặp search/insert trên cùng một lô ID ngẫu nhiên.
+
+    python -m benchmarks.bench_batch --size 100000 --batches 100 1000 10000 --max-keys 5 64 --fill 0.7
+"""
+import random
+import argparse
+
+from benchmarks.common import make_patients, timed
+from app import BTree
+
+
+def build_tree(patients, max_keys, fill_factor):
+    """Cây chứa các ID chẵn để lô chèn (ID lẻ) không bị trùng"""
+    return BTree.from_sorted(patients, max_keys=max_keys, fill_factor=fill_factor)
+
+
+def search_loop(tree, ids):
+    return [tree.search(patient_id) for patient_id in ids]
+
+
+def insert_loop(tree, patients):
+    return [tree.insert(patient) for patient in patients]
+
+
+def best_of(repeat, setup, func, *args):
+    """Thời gian nhỏ nhất sau repeat lần chạy; setup() tạo đối số đầu tiên mới cho mỗi lần"""
+    best = None
+    for _ in range(repeat):
+        result, elapsed = timed(func, setup(), *args)
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=100_000)
+    parser.add_argument('--batches', type=int, nargs='+', default=[100, 1000, 10_000])
+    parser.add_argument('--max-keys', type=int, nargs='+', default=[5, 64])
+    parser.add_argument('--fill', type=float, default=0.7, help='tỉ lệ lấp đầy của cây ban đầu')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    
+    rng = random.Random(7)
+    population = make_patients(2 * args.size)
+    stored = population[1::2]    # ID chẵn
+    incoming = population[0::2]  # ID lẻ
+    
+    print(f"{'max_keys':>8} {'batch':>7} {'op':>7} {'loop (s)':>9} {'batch (s)':>9} {'speedup':>8}")
+    for max_keys in args.max_keys:
+        for batch in args.batches:
+            ids = [rng.randint(1, 2 * args.size) for _ in range(batch)]
+            tree = build_tree(stored, max_keys, args.fill)
+            expected, loop_time = best_of(args.repeat, lambda: tree, search_loop, ids)
+            found, batch_time = best_of(args.repeat, lambda: tree, BTree.search_many, ids)
+            assert found == expected
+            print(f"{max_keys:>8} {batch:>7} {'search':>7} {loop_time:>9.4f} {batch_time:>9.4f} "
+                  f"{loop_time / batch_time:>7.2f}x")
+            
+            patients = rng.sample(incoming, batch)
+            fresh = lambda: build_tree(stored, max_keys, args.fill)  # noqa: E731
+            _, loop_time = best_of(args.repeat, fresh, insert_loop, patients)
+            results, batch_time = best_of(args.repeat, fresh, BTree.insert_many, patients)
+            assert all(success for success, _ in results)
+            print(f"{max_keys:>8} {batch:>7} {'insert':>7} {loop_time:>9.4f} {batch_time:>9.4f} "
+                  f"{loop_time / batch_time:>7.2f}x")
+
+if __name__ == '__main__':
+    main()
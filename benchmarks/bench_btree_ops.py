@@ -0,0 +1,57 @@
+"""Micro-benchmark cho BTree.insert/search/delete theo max_keys.
+
+    python -m benchmarks.bench_btree_ops -n 100000 --max-keys 5 16 64 256
+"""
+import random
+import argparse
+
+from benchmarks.common import make_patients, timed
+from app import BTree
+
+
+def run(patients, max_keys, seed):
+    rng = random.Random(seed)
+    order = patients[:]
+    rng.shuffle(order)
+    lookups = [p.id for p in order]
+    rng.shuffle(lookups)
+    victims = lookups[:len(lookups) // 2]
+    
+    tree = BTree(max_keys=max_keys)
+
+    def insert_all():
+        for patient in order:
+            tree.insert(patient)
+
+    def search_all():
+        for patient_id in lookups:
+            tree.search(patient_id)
+
+    def delete_half():
+        for patient_id in victims:
+            tree.delete(patient_id)
+
+    _, insert_time = timed(insert_all)
+    height = tree.get_tree_height()
+    _, search_time = timed(search_all)
+    _, delete_time = timed(delete_half)
+    return height, len(order) / insert_time, len(lookups) / search_time, len(victims) / delete_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', type=int, default=100_000)
+    parser.add_argument('--max-keys', type=int, nargs='+', default=[5, 8, 16, 32, 64, 128, 256])
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    
+    patients = make_patients(args.n)
+    print(f"N = {args.n}")
+    print(f"{'max_keys':>9} {'cao':>4} {'insert/s':>11} {'search/s':>11} {'delete/s':>11}")
+    for max_keys in args.max_keys:
+        height, inserts, searches, deletes = run(patients, max_keys, args.seed)
+        print(f"{max_keys:>9} {height:>4} {inserts:>11,.0f} {searches:>11,.0f} {deletes:>11,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""So sánh thời gian khởi động PatientManager: chèn từng key so với bulk_load.
+
+    python -m benchmarks.bench_bulk_load --sizes 10000 100000 1000000
+"""
+import os
+import argparse
+
+from benchmarks.common import make_patients, quiet, temp_dir, timed
+from app import BTree, PatientManager, save_to_binary
+
+
+def insert_one_by_one(patients, max_keys):
+    tree = BTree(max_keys=max_keys)
+    for patient in patients:
+        tree.insert(patient)
+    return tree
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--max-keys', type=int, default=5)
+    args = parser.parse_args()
+    
+    print(f"{'N':>10} {'insert (s)':>12} {'bulk_load (s)':>14} {'load_from_file (s)':>19} {'x':>7}")
+    for n in args.sizes:
+        patients = make_patients(n)
+        _, insert_time = timed(insert_one_by_one, patients, args.max_keys)
+        _, bulk_time = timed(BTree.from_sorted, patients, args.max_keys)
+        
+        with temp_dir() as path, quiet():
+            filename = os.path.join(path, 'patients.pat')
+            save_to_binary(patients, filename)
+            _, startup_time = timed(PatientManager, filename, args.max_keys)
+        
+        print(f"{n:>10} {insert_time:>12.3f} {bulk_time:>14.3f} {startup_time:>19.3f} {insert_time / bulk_time:>6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
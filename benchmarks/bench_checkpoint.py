@@ -0,0 +1,61 @@
+"""Số byte ghi xuống đĩa cho mỗi lần đăng ký bệnh nhân: ghi lại cả file .pat (mặc định)
+so với checkpoint tăng dần chỉ ghi các node bẩn vào file .nodes.
+
+    python -m benchmarks.bench_checkpoint --sizes 10000 100000 --inserts 200
+"""
+import os
+import random
+import argparse
+
+from benchmarks.common import make_patient, make_patients, quiet, temp_dir, timed
+from app import PatientManager, save_to_binary
+
+
+def register(manager, count, rng, on_save):
+    """Thêm count bệnh nhân, mỗi lần lưu ngay (không dùng nhật ký); on_save() trả về số byte vừa ghi"""
+    written = 0
+    for _ in range(count):
+        with quiet():
+            manager.insert_patient(make_patient(manager.get_next_id(), rng))
+        written += on_save()
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--inserts', type=int, default=200)
+    parser.add_argument('--max-keys', type=int, default=64)
+    args = parser.parse_args()
+    
+    print(f"{'N':>8} {'mode':>12} {'bytes/insert':>13} {'ms/insert':>10}")
+    for n in args.sizes:
+        with temp_dir() as path:
+            filename = os.path.join(path, 'patients.pat')
+            with quiet():
+                save_to_binary(make_patients(n), filename)
+            
+            with quiet():
+                manager = PatientManager(filename, args.max_keys)
+            written, elapsed = timed(register, manager, args.inserts, random.Random(1),
+                                     lambda: os.path.getsize(filename))
+            print(f"{n:>8} {'full .pat':>12} {written / args.inserts:>13.0f} {elapsed / args.inserts * 1000:>10.2f}")
+            
+            with quiet():
+                manager = PatientManager(filename, args.max_keys, incremental=True)
+                manager.save_to_file()  # Lần đầu ghi toàn bộ node
+            store = manager.node_store
+            before = store.bytes_written
+            
+            def delta():
+                nonlocal before
+                written, before = store.bytes_written - before, store.bytes_written
+                return written
+            written, elapsed = timed(register, manager, args.inserts, random.Random(1), delta)
+            print(f"{n:>8} {'incremental':>12} {written / args.inserts:>13.0f} {elapsed / args.inserts * 1000:>10.2f}")
+            with quiet():
+                manager.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""So sánh các định dạng .pat: file pickle cũ, nhị phân phiên bản 1 (từng bản ghi) và phiên bản 2
+(block nén theo cột): kích thước, thời gian ghi và đọc cả file, và thời gian đọc lẻ một bệnh nhân
+từ file phiên bản 2 (chỉ giải nén một block) so với phải nạp cả file.
+
+    python -m benchmarks.bench_format --sizes 10000 100000 1000000
+"""
+import os
+import pickle
+import random
+import argparse
+
+from benchmarks.common import make_patients, quiet, temp_dir, timed
+from app import (BINARY_VERSION, BLOCK_VERSION, BlockReader, save_to_binary, load_from_binary,
+                 load_legacy_pickle)
+
+
+def save_pickle(patients, filename):
+    with open(filename, 'wb') as file:
+        pickle.dump(patients, file)
+
+
+def fetch_latency(filename, ids):
+    """Mở file phiên bản 2 rồi đọc từng ID (mỗi lần một block khác nhau, không trúng cache): (mở, p50) tính bằng ms"""
+    reader, open_time = timed(BlockReader, filename, 0)
+    times = sorted(timed(reader.get, patient_id)[1] for patient_id in ids)
+    reader.close()
+    return open_time * 1000, times[len(times) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--lookups', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'N':>10} {'định dạng':>10} {'kích thước (MB)':>16} {'so với pickle':>14} {'ghi (s)':>9} {'đọc (s)':>9}")
+    for n in args.sizes:
+        patients = make_patients(n)
+        with temp_dir() as path:
+            pickle_file = os.path.join(path, 'legacy.pat')
+            v1_file = os.path.join(path, 'v1.pat')
+            v2_file = os.path.join(path, 'v2.pat')
+            _, pickle_save = timed(save_pickle, patients, pickle_file)
+            _, pickle_load = timed(load_legacy_pickle, pickle_file)
+            rows = [('pickle', pickle_file, pickle_save, pickle_load)]
+            for name, filename, version in (('v1', v1_file, BINARY_VERSION), ('v2', v2_file, BLOCK_VERSION)):
+                with quiet():
+                    _, save_time = timed(save_to_binary, patients, filename, version)
+                    loaded, load_time = timed(load_from_binary, filename)
+                assert len(loaded) == n
+                rows.append((name, filename, save_time, load_time))
+
+            pickle_size = os.path.getsize(pickle_file)
+            for name, filename, save_time, load_time in rows:
+                size = os.path.getsize(filename)
+                print(f"{n:>10} {name:>10} {size / 2**20:>16.2f} {pickle_size / size:>13.1f}x "
+                      f"{save_time:>9.3f} {load_time:>9.3f}")
+            open_time, fetch = fetch_latency(v2_file, random.Random(1).sample(range(1, n + 1), min(n, args.lookups)))
+            print(f"{n:>10} {'v2 đọc lẻ':>10}   mở file {open_time:.2f} ms, một bệnh nhân p50 {fetch:.3f} ms "
+                  f"(nạp cả file v1: {rows[1][3] * 1000:.0f} ms)")
+
+
+if __name__ == '__main__':
+    main()
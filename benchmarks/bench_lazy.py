@@ -0,0 +1,51 @@
+"""So sánh backend 'memory' và 'lazy' (cây chỉ giữ ID + vị trí, hồ sơ đọc từ .pat qua LRU):
+bộ nhớ sau khi khởi động, thời gian khởi động và tra cứu theo phân phối Zipf.
+
+    python -m benchmarks.bench_lazy --sizes 100000 1000000 --cache-entries 10000
+"""
+import os
+import argparse
+import tracemalloc
+
+from benchmarks.common import make_patients, quiet, temp_dir, timed
+from benchmarks.workloads import zipf_lookups
+from app import BINARY_VERSION, PatientManager, save_to_binary
+
+
+def open_manager(filename, backend, cache_entries):
+    """Khởi động PatientManager, trả về (manager, số MB được cấp phát sau khi nạp)"""
+    tracemalloc.start()
+    with quiet():
+        manager = PatientManager(filename, 64, backend=backend, cache_entries=cache_entries)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return manager, current / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 500_000])
+    parser.add_argument('--cache-entries', type=int, default=10_000)
+    parser.add_argument('--lookups', type=int, default=200_000)
+    args = parser.parse_args()
+    
+    print(f"{'N':>9} {'backend':>8} {'startup (s)':>12} {'memory (MB)':>12} {'lookup (µs)':>12} {'hit rate':>9}")
+    for n in args.sizes:
+        lookups = zipf_lookups(range(1, n + 1), args.lookups)
+        with temp_dir() as path:
+            filename = os.path.join(path, 'patients.pat')
+            with quiet():
+                save_to_binary(make_patients(n), filename, BINARY_VERSION)  # lazy cần vị trí từng bản ghi
+            for backend in ('memory', 'lazy'):
+                (manager, memory), startup = timed(open_manager, filename, backend, args.cache_entries)
+                search = manager.btree.search
+                _, elapsed = timed(lambda: [search(patient_id) for patient_id in lookups])
+                hit_rate = manager.btree.store.stats()['hit_rate'] if backend == 'lazy' else 1.0
+                print(f"{n:>9} {backend:>8} {startup:>12.3f} {memory:>12.1f} "
+                      f"{elapsed / len(lookups) * 1e6:>12.2f} {hit_rate:>9.1%}")
+                with quiet():
+                    manager.close()
+
+
+if __name__ == '__main__':
+    main()
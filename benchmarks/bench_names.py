@@ -0,0 +1,98 @@
+"""Tìm tên gần đúng và gợi ý theo tiền tố bằng chỉ mục trigram (NameIndex): thời gian tạo, ghi/đọc
+file .names, độ trễ p50/p99 mỗi truy vấn, so với duyệt toàn bộ bệnh nhân để tính độ giống.
+Tên sinh ngẫu nhiên có dấu, 3-4 từ, để có nhiều tên phân biệt như dữ liệu thật.
+
+    python -m benchmarks.bench_names --size 1000000 --queries 200
+"""
+import os
+import random
+import argparse
+
+from benchmarks.common import make_patients, temp_dir, timed
+from app import NameIndex, name_trigrams, normalize_name
+
+LAST = ['Nguyễn', 'Trần', 'Lê', 'Phạm', 'Hoàng', 'Huỳnh', 'Phan', 'Vũ', 'Võ', 'Đặng', 'Bùi', 'Đỗ', 'Hồ', 'Ngô',
+        'Dương', 'Lý', 'Đinh', 'Trương', 'Lâm', 'Quách']
+MIDDLE = ['Văn', 'Thị', 'Minh', 'Thu', 'Đức', 'Ngọc', 'Hữu', 'Thanh', 'Quốc', 'Xuân', 'Hoài', 'Kim', 'Bảo',
+          'Gia', 'Anh', 'Mỹ', 'Phương', 'Tuấn']
+FIRST = ['An', 'Bích', 'Cường', 'Dũng', 'Em', 'Giang', 'Hoa', 'Hùng', 'Khánh', 'Lan', 'Long', 'Mai', 'Nam',
+         'Nga', 'Oanh', 'Phúc', 'Quân', 'Sơn', 'Tâm', 'Thảo', 'Trang', 'Uyên', 'Vinh', 'Yến', 'Hải', 'Hạnh',
+         'Hiếu', 'Huy', 'Linh', 'Ly', 'Minh', 'Nhung', 'Phong', 'Quang', 'Tùng', 'Tú', 'Việt', 'Vy', 'Xuân', 'Đạt']
+
+
+def make_name(rng):
+    words = [rng.choice(LAST), rng.choice(MIDDLE)]
+    if rng.random() < 0.4:
+        words.append(rng.choice(MIDDLE))
+    words.append(rng.choice(FIRST))
+    return ' '.join(words)
+
+
+def typo(name, rng):
+    """Bỏ dấu và làm sai một ký tự như khi gõ vội ở quầy"""
+    text = list(normalize_name(name))
+    i = rng.randrange(len(text))
+    if text[i] != ' ':
+        text[i] = rng.choice('aeinouy') if rng.random() < 0.5 else ''
+    return ''.join(text)
+
+
+def scan_search(patients, query, limit=10, threshold=0.3):
+    """Cách làm khi không có chỉ mục: tính độ giống với tên của từng bệnh nhân"""
+    grams = name_trigrams(normalize_name(query))
+    results = []
+    for patient in patients:
+        other = name_trigrams(normalize_name(patient.name))
+        common = len(grams & other)
+        score = common / (len(grams) + len(other) - common)
+        if score >= threshold:
+            results.append((score, patient.id))
+    results.sort(key=lambda result: -result[0])
+    return results[:limit]
+
+
+def latencies(func, queries):
+    times = sorted(timed(func, query)[1] for query in queries)
+    return times[len(times) // 2] * 1000, times[min(len(times) - 1, len(times) * 99 // 100)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=1_000_000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--scan-queries', type=int, default=2, help="Số truy vấn đo bằng cách duyệt toàn bộ")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    patients = make_patients(args.size)
+    for patient in patients:
+        patient.name = make_name(rng)
+
+    index, build_time = timed(NameIndex.build, patients)
+    print(f"Tạo chỉ mục: {build_time:.2f} s, {len(index.sorted_terms)} tên phân biệt, {len(index.grams)} trigram")
+    with temp_dir() as path:
+        filename = os.path.join(path, 'patients.pat.names')
+        stamp = (0,) * 6
+        _, save_time = timed(index.save, filename, stamp)
+        loaded, load_time = timed(NameIndex.load, filename, stamp)
+        assert loaded is not None and loaded.sorted_terms == index.sorted_terms
+        print(f"File .names: {os.path.getsize(filename) / 1024 / 1024:.1f} MB, "
+              f"ghi {save_time:.2f} s, đọc {load_time:.2f} s")
+
+    names = [patient.name for patient in rng.sample(patients, args.queries)]
+    fuzzy = [typo(name, rng) for name in names]
+    prefixes = [normalize_name(name)[:rng.randint(2, 8)] for name in names]
+    words = [' '.join(normalize_name(name).split()[1:])[:rng.randint(3, 9)] for name in names]
+    print(f"\n{'Truy vấn':<28} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+    for label, func, queries in [('search (gõ sai, không dấu)', index.search, fuzzy),
+                                 ('complete (tiền tố tên)', index.complete, prefixes),
+                                 ('complete (tiền tố từ giữa)', index.complete, words)]:
+        p50, p99 = latencies(func, queries)
+        print(f"{label:<28} {p50:>9.3f} {p99:>9.3f}")
+    if args.scan_queries:
+        p50, _ = latencies(lambda query: scan_search(patients, query), fuzzy[:args.scan_queries])
+        print(f"{'duyệt toàn bộ (không chỉ mục)':<28} {p50:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
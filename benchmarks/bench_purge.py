@@ -0,0 +1,61 @@
+"""Xóa hàng loạt 10-50% cây: vòng lặp delete, delete_many (xóa thật ngay) và delete_many ở chế độ
+tombstone (chỉ đánh dấu) kèm thời gian compact() dọn dẹp sau đó.
+
+    python -m benchmarks.bench_purge --size 200000 --fractions 0.1 0.3 0.5 --max-keys 5 64
+"""
+import random
+import argparse
+
+from benchmarks.common import make_patients, timed
+from app import BTree
+
+
+def build_tree(patients, max_keys, tombstones=False):
+    tree = BTree(max_keys=max_keys, tombstones=tombstones)
+    for patient in patients:
+        tree.insert(patient)
+    return tree
+
+
+def delete_loop(tree, ids):
+    for patient_id in ids:
+        tree.delete(patient_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=200_000)
+    parser.add_argument('--fractions', type=float, nargs='+', default=[0.1, 0.3, 0.5])
+    parser.add_argument('--max-keys', type=int, nargs='+', default=[5, 64])
+    args = parser.parse_args()
+    
+    rng = random.Random(11)
+    patients = make_patients(args.size)
+    shuffled = patients[:]
+    rng.shuffle(shuffled)  # Chèn ngẫu nhiên để cây có hình dạng như khi dùng thật
+    
+    print(f"{'max_keys':>8} {'purge':>6} {'loop (s)':>9} {'many (s)':>9} {'mark (s)':>9} "
+          f"{'compact (s)':>12} {'speedup':>8}")
+    for max_keys in args.max_keys:
+        for fraction in args.fractions:
+            ids = rng.sample(range(1, args.size + 1), int(args.size * fraction))
+            
+            tree = build_tree(shuffled, max_keys)
+            _, loop_time = timed(delete_loop, tree, ids)
+            expected = tree.count()
+            
+            tree = build_tree(shuffled, max_keys)
+            _, many_time = timed(tree.delete_many, ids)
+            assert tree.count() == expected
+            
+            tree = build_tree(shuffled, max_keys, tombstones=True)
+            _, mark_time = timed(tree.delete_many, ids)
+            assert tree.count() == expected
+            _, compact_time = timed(tree.compact)
+            assert tree.count() == expected and tree.dead_count == 0
+            print(f"{max_keys:>8} {fraction:>6.0%} {loop_time:>9.3f} {many_time:>9.3f} {mark_time:>9.3f} "
+                  f"{compact_time:>12.3f} {loop_time / mark_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
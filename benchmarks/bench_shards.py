@@ -0,0 +1,62 @@
+"""So sánh PatientManager một process với ShardedPatientManager (mỗi shard một process):
+nạp hàng loạt, tra nhiều ID, quét toàn bộ theo thứ tự ID và tìm theo tên (lần đầu phải tạo chỉ mục).
+
+    python -m benchmarks.bench_shards --size 200000 --shards 1 2 4
+"""
+import os
+import random
+import argparse
+
+from benchmarks.common import make_patients, quiet, temp_dir, timed
+from app import PatientManager, ShardedPatientManager
+
+
+def load_single(manager, patients):
+    """Giống _shard_put: thêm cả lô (bulk_load khi cây rỗng) rồi lưu file một lần"""
+    with quiet():
+        manager._insert_batch(list(enumerate(patients)), [])
+        manager.save_to_file()
+
+
+def run_single(path, patients, lookups):
+    with quiet():
+        manager = PatientManager(os.path.join(path, 'single.pat'), 64)
+    _, load = timed(load_single, manager, patients)
+    search = manager.btree.search
+    _, lookup = timed(lambda: [search(patient_id) for patient_id in lookups])
+    _, scan = timed(lambda: sum(1 for _ in manager.btree.iter_range()))
+    _, name = timed(manager.find_by_name, 'Nguyen Van A', 50)
+    with quiet():
+        manager.close()
+    return load, lookup, scan, name
+
+
+def run_sharded(path, patients, lookups, shards):
+    manager = ShardedPatientManager(os.path.join(path, f'sharded{shards}.pat'), shards, 64, journal=False)
+    _, load = timed(manager.load_patients, patients)
+    _, lookup = timed(manager.search_many, lookups)
+    _, scan = timed(lambda: sum(1 for _ in manager.iter_all(10000)))
+    _, name = timed(manager.find_by_name, 'Nguyen Van A', 50)
+    manager.close()
+    return load, lookup, scan, name
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=200_000)
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--lookups', type=int, default=50_000)
+    args = parser.parse_args()
+    
+    patients = make_patients(args.size)
+    lookups = random.Random(3).choices(range(1, args.size + 1), k=args.lookups)
+    print(f"{'mode':>10} {'load (s)':>9} {'lookups (s)':>12} {'scan (s)':>9} {'find_name (s)':>14}")
+    with temp_dir() as path:
+        rows = [('single', run_single(path, patients, lookups))]
+        rows += [(f'{shards} shards', run_sharded(path, patients, lookups, shards)) for shards in args.shards]
+    for name, (load, lookup, scan, find) in rows:
+        print(f"{name:>10} {load:>9.3f} {lookup:>12.3f} {scan:>9.3f} {find:>14.3f}")
+
+
+if __name__ == '__main__':
+    main()
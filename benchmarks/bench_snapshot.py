@@ -0,0 +1,58 @@
+"""Chi phí copy-on-write của BTree.snapshot(): thông lượng chèn (ID ngẫu nhiên) khi không có snapshot,
+khi tạo snapshot định kỳ rồi bỏ ngay (như một lần lưu nền) và khi giữ lại các snapshot gần nhất,
+cùng bộ nhớ tăng thêm do các node cũ còn được snapshot tham chiếu.
+
+    python -m benchmarks.bench_snapshot --size 100000 --every 1000 --keep 10
+"""
+import random
+import argparse
+import tracemalloc
+from collections import deque
+
+from benchmarks.common import make_patients, timed
+from app import BTree
+
+
+def run(patients, max_keys, every, keep):
+    """Chèn patients; every > 0 thì tạo snapshot sau mỗi every lần chèn và giữ lại keep snapshot mới nhất"""
+    tree = BTree(max_keys=max_keys)
+    retained = deque(maxlen=keep or None)
+    for i, patient in enumerate(patients, 1):
+        tree.insert(patient)
+        if every and i % every == 0:
+            snapshot = tree.snapshot()
+            if keep:
+                retained.append(snapshot)
+    return tree, retained
+
+
+def measure(patients, max_keys, every, keep):
+    tracemalloc.start()
+    (tree, retained), elapsed = timed(run, patients, max_keys, every, keep)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, memory / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=100_000)
+    parser.add_argument('--max-keys', type=int, nargs='+', default=[5, 64])
+    parser.add_argument('--every', type=int, default=1000, help="Số lần chèn giữa hai snapshot")
+    parser.add_argument('--keep', type=int, default=10, help="Số snapshot được giữ lại")
+    args = parser.parse_args()
+    
+    patients = make_patients(args.size)
+    random.Random(7).shuffle(patients)
+    modes = [('mutable', 0, 0), ('snap+drop', args.every, 0), (f'snap+keep{args.keep}', args.every, args.keep)]
+    print(f"{'max_keys':>8} {'mode':>12} {'time (s)':>9} {'ops/s':>10} {'memory (MB)':>12}")
+    for max_keys in args.max_keys:
+        for name, every, keep in modes:
+            # Đo thời gian và bộ nhớ ở hai lần chạy riêng vì tracemalloc làm chậm đáng kể
+            _, elapsed = timed(run, patients, max_keys, every, keep)
+            _, memory = measure(patients, max_keys, every, keep)
+            print(f"{max_keys:>8} {name:>12} {elapsed:>9.3f} {args.size / elapsed:>10.0f} {memory:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Đo thời gian khởi động trong một process mới: import app.py, tới lúc menu hiện được
+(PatientManager tạo xong) và tới lúc có kết quả tìm kiếm đầu tiên, với nạp đồng bộ và nạp nền.
+
+    python -m benchmarks.bench_startup --sizes 10000 100000 1000000 --repeat 3
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+from benchmarks.common import make_patients, quiet, temp_dir
+from app import BINARY_VERSION, save_to_binary
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Chạy trong process con để tính cả thời gian import; kết quả ghi ra stdout gốc vì
+# thông báo của luồng nạp nền có thể in sau khi constructor đã trả về
+CHILD = r'''
+import io, sys, json, time, contextlib
+start = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import app
+imported = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    manager = app.PatientManager(sys.argv[2], 64, backend=sys.argv[3], background_load=sys.argv[4] == '1')
+    menu = time.perf_counter()
+    manager.btree.search(int(sys.argv[5]))
+    searched = time.perf_counter()
+    manager.close()
+sys.__stdout__.write(json.dumps([imported - start, menu - start, searched - start]))
+'''
+
+MODES = [('memory', False), ('memory', True), ('lazy', False), ('lazy', True)]
+
+
+def measure(filename, backend, background, patient_id):
+    output = subprocess.run([sys.executable, '-c', CHILD, ROOT, filename, backend,
+                             '1' if background else '0', str(patient_id)],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3, help='lấy thời gian nhỏ nhất sau số lần chạy')
+    args = parser.parse_args()
+    
+    print(f"{'N':>9} {'backend':>8} {'load':>10} {'import (s)':>11} {'menu (s)':>9} {'search (s)':>11}")
+    for n in args.sizes:
+        with temp_dir() as path:
+            filename = os.path.join(path, 'patients.pat')
+            with quiet():
+                save_to_binary(make_patients(n), filename, BINARY_VERSION)  # lazy cần vị trí từng bản ghi
+            for backend, background in MODES:
+                runs = [measure(filename, backend, background, n // 2) for _ in range(args.repeat)]
+                imported, menu, searched = (min(column) for column in zip(*runs))
+                load = 'nền' if background else 'đồng bộ'
+                print(f"{n:>9} {backend:>8} {load:>10} {imported:>11.3f} {menu:>9.3f} {searched:>11.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Thống kê trên bảng cột (PatientColumns) so với vòng lặp Python qua các đối tượng Patient:
+đếm theo khoảng ngày + giới tính, số lượt khám theo tháng, phân bố tuổi theo giới tính.
+Bảng cột chạy bằng NumPy nếu đã cài, và luôn đo thêm bản không dùng NumPy.
+
+    python -m benchmarks.bench_stats --size 1000000 --repeat 3
+"""
+import argparse
+from collections import Counter
+
+from benchmarks.common import make_patients, timed
+from app import BTree, PatientColumns, _optional_module
+
+START, END = '2025-03-01', '2025-05-31'
+
+
+def loop_count(patients):
+    return sum(1 for p in patients if START <= p.visit_date <= END and p.gender == 'Nu' and p.age >= 40)
+
+
+def loop_months(patients):
+    return dict(sorted(Counter(p.visit_date[:7] for p in patients).items()))
+
+
+def loop_histogram(patients):
+    counts = Counter((p.gender, p.age // 10 * 10) for p in patients)
+    result = {}
+    for (gender, low), n in sorted(counts.items()):
+        result.setdefault(gender, {})[low] = n
+    return result
+
+
+def columns_count(columns):
+    return columns.count(start=START, end=END, gender='Nu', min_age=40)
+
+
+def columns_months(columns):
+    return columns.group_count('month')
+
+
+def columns_histogram(columns):
+    return columns.histogram(10)
+
+
+QUERIES = [('count', loop_count, columns_count),
+           ('months', loop_months, columns_months),
+           ('histogram', loop_histogram, columns_histogram)]
+
+
+def best_of(repeat, func, *args):
+    result, best = timed(func, *args)
+    for _ in range(repeat - 1):
+        best = min(best, timed(func, *args)[1])
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    tree = BTree(max_keys=64)
+    tree.bulk_load(make_patients(args.size))
+    patients = tree.in_order_traversal()
+
+    variants = [('python', False)]
+    if _optional_module('numpy') is not None:
+        variants.insert(0, ('numpy', True))
+    else:
+        print("(chưa cài NumPy: chỉ đo bảng cột bằng vòng lặp Python)")
+    tables = {}
+    for name, use_numpy in variants:
+        tables[name], build_time = timed(PatientColumns.build, patients, use_numpy)
+        print(f"Tạo bảng cột ({name}): {build_time:.2f} s cho {args.size} bệnh nhân")
+
+    columns = tables[variants[0][0]]
+    _, update_time = timed(lambda: [columns.add(p) for p in patients[:10000]])
+    print(f"Cập nhật tăng dần: {update_time / 10000 * 1e6:.2f} µs mỗi bản ghi")
+
+    header = f"{'Truy vấn':<10} {'loop (s)':>9}" + ''.join(f" {name + ' (s)':>12} {'speedup':>8}" for name, _ in variants)
+    print(header)
+    for query, loop, vectorized in QUERIES:
+        expected, loop_time = best_of(args.repeat, loop, patients)
+        line = f"{query:<10} {loop_time:>9.3f}"
+        for name, _ in variants:
+            result, elapsed = best_of(args.repeat, vectorized, tables[name])
+            assert result == expected, (query, name)
+            line += f" {elapsed:>12.4f} {loop_time / elapsed:>7.1f}x"
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
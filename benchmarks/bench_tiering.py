@@ -0,0 +1,88 @@
+"""Phân tầng nóng/lạnh theo ngày khám: so PatientManager giữ toàn bộ lịch sử trong cây với bản chỉ giữ
+bệnh nhân khám trong --hot-days ngày gần nhất (phần còn lại ở phân đoạn lạnh .cold): bộ nhớ sau khi nạp,
+thời gian nạp/lưu, kích thước file và độ trễ tìm theo ID ở từng tầng.
+Ngày khám sinh ngẫu nhiên đều trong --years năm gần nhất.
+
+    python -m benchmarks.bench_tiering --size 1000000 --hot-days 180
+"""
+import os
+import random
+import argparse
+import datetime
+import tracemalloc
+
+from benchmarks.common import make_patients, quiet, temp_dir, timed
+from app import PatientManager, save_to_binary
+
+
+def make_history(size, years):
+    rng = random.Random(3)
+    today = datetime.date.today()
+    patients = make_patients(size)
+    for patient in patients:
+        patient.visit_date = (today - datetime.timedelta(days=rng.randrange(years * 365))).isoformat()
+    return patients
+
+
+def open_manager(filename, hot_days):
+    """Nạp manager, trả về (manager, số giây, MB bộ nhớ Python còn giữ sau khi nạp)"""
+    tracemalloc.start()
+    with quiet():
+        manager, load_time = timed(PatientManager, filename, 64, hot_days=hot_days, archive_interval=1e9)
+    memory = tracemalloc.get_traced_memory()[0] / 1024 / 1024
+    tracemalloc.stop()
+    return manager, load_time, memory
+
+
+def latencies(manager, ids):
+    times = sorted(timed(manager.search, patient_id)[1] for patient_id in ids)
+    return times[len(times) // 2] * 1e6, times[min(len(times) - 1, len(times) * 99 // 100)] * 1e6
+
+
+def files_size(filename):
+    return sum(os.path.getsize(filename + suffix) for suffix in ('', '.cold') if os.path.exists(filename + suffix))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=1_000_000)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--hot-days', type=int, default=180)
+    parser.add_argument('--queries', type=int, default=2000)
+    args = parser.parse_args()
+
+    patients = make_history(args.size, args.years)
+    cutoff = (datetime.date.today() - datetime.timedelta(days=args.hot_days)).isoformat()
+    rng = random.Random(5)
+    hot_ids = rng.sample([p.id for p in patients if p.visit_date >= cutoff], args.queries)
+    cold_ids = rng.sample([p.id for p in patients if p.visit_date < cutoff], args.queries)
+
+    print(f"{'':<10} {'nạp (s)':>8} {'bộ nhớ (MB)':>12} {'lưu (s)':>8} {'file (MB)':>10} "
+          f"{'nóng p50/p99 (µs)':>19} {'lạnh p50/p99 (µs)':>19}")
+    with temp_dir() as path:
+        for label, hot_days in [('một tầng', None), ('phân tầng', args.hot_days)]:
+            filename = os.path.join(path, f'{label.replace(" ", "_")}.pat')
+            with quiet():
+                save_to_binary(patients, filename)
+            if hot_days is not None:
+                # Lần chuyển đầu tiên: cả lịch sử đang nằm trong file .pat
+                with quiet():
+                    manager = PatientManager(filename, 64, hot_days=hot_days, archive_interval=1e9)
+                    moved, archive_time = timed(manager.archive)
+                    manager.close()
+                print(f"(chuyển {moved} bệnh nhân sang phân đoạn lạnh: {archive_time:.2f} s)")
+            manager, load_time, memory = open_manager(filename, hot_days)
+            with quiet():
+                _, save_time = timed(manager.save_to_file)
+            hot = latencies(manager, hot_ids)
+            cold = latencies(manager, cold_ids)
+            assert manager.count() == args.size
+            print(f"{label:<10} {load_time:>8.2f} {memory:>12.1f} {save_time:>8.2f} "
+                  f"{files_size(filename) / 1024 / 1024:>10.1f} {hot[0]:>9.1f}/{hot[1]:<9.1f} "
+                  f"{cold[0]:>9.1f}/{cold[1]:<9.1f}")
+            with quiet():
+                manager.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+import os
+import sys
+import time
+import random
+import tempfile
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import Patient  # noqa: E402
+
+LAST_NAMES = ['Nguyen', 'Tran', 'Le', 'Pham', 'Hoang', 'Vo', 'Dang', 'Bui', 'Do', 'Ngo']
+MIDDLE_NAMES = ['Van', 'Thi', 'Minh', 'Thu', 'Duc', 'Ngoc']
+FIRST_NAMES = ['An', 'Bich', 'Cuong', 'Dung', 'Em', 'Giang', 'Hoa', 'Ich', 'Kim', 'Long', 'Mai', 'Nam']
+
+
+def make_patient(patient_id, rng):
+    """Sinh một bệnh nhân giả lập với ID cho trước"""
+    name = f"{rng.choice(LAST_NAMES)} {rng.choice(MIDDLE_NAMES)} {rng.choice(FIRST_NAMES)}"
+    gender = rng.choice(['Nam', 'Nu'])
+    phone = f"09{rng.randrange(10**8):08d}"
+    visit_date = f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+    return Patient(patient_id, name, rng.randint(1, 95), gender, phone, visit_date)
+
+
+def make_patients(n, seed=42):
+    """Sinh n bệnh nhân có ID tuần tự 1..n (giống get_next_id)"""
+    rng = random.Random(seed)
+    return [make_patient(i, rng) for i in range(1, n + 1)]
+
+
+@contextlib.contextmanager
+def quiet():
+    """Tắt các dòng print của app.py trong lúc đo"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+@contextlib.contextmanager
+def temp_dir():
+    with tempfile.TemporaryDirectory(prefix='clinic_bench_') as path:
+        yield path
+
+
+def timed(func, *args, **kwargs):
+    """Chạy func, trả về (kết quả, số giây)"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
@@ -0,0 +1,101 @@
+"""Bộ sinh tải cho máy chủ 'python app.py serve': đo thông lượng và độ trễ p50/p99
+với tỉ lệ đọc/ghi tùy chọn.
+
+    python -m benchmarks.loadgen --clients 16 --duration 10 --read-ratio 0.9
+    python -m benchmarks.loadgen --connect 127.0.0.1:8765
+Không có --connect thì tự chạy một máy chủ tạm với --preload bệnh nhân.
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+
+from benchmarks.common import make_patients, make_patient, quiet, temp_dir
+from app import PatientManager, PatientServer, save_to_binary
+
+
+async def client(host, port, deadline, read_ratio, max_id, seed, latencies, counts):
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            if rng.random() < read_ratio:
+                request = {'op': 'search', 'id': rng.randint(1, max_id)}
+                kind = 'read'
+            else:
+                patient = make_patient(0, rng)
+                request = {'op': 'add', 'name': patient.name, 'age': patient.age, 'gender': patient.gender,
+                           'phone': patient.phone, 'visit_date': patient.visit_date}
+                kind = 'write'
+            start = time.perf_counter()
+            writer.write(json.dumps(request).encode('utf-8') + b'\n')
+            await writer.drain()
+            response = json.loads(await reader.readline())
+            latencies[kind].append(time.perf_counter() - start)
+            counts['error'] += not response['ok']
+    finally:
+        writer.close()
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def run(args, host, port, max_id):
+    latencies = {'read': [], 'write': []}
+    counts = {'error': 0}
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(*(client(host, port, deadline, args.read_ratio, max_id, i, latencies, counts)
+                           for i in range(args.clients)))
+    elapsed = time.perf_counter() - start
+    
+    total = len(latencies['read']) + len(latencies['write'])
+    print(f"{args.clients} client, {elapsed:.1f}s, tỉ lệ đọc {args.read_ratio:.0%}")
+    print(f"  Thông lượng: {total / elapsed:,.0f} lệnh/s ({counts['error']} lỗi)")
+    for kind, values in latencies.items():
+        if values:
+            print(f"  {kind:<5}: {len(values):>8} lệnh | p50 {percentile(values, 0.50) * 1000:7.2f} ms"
+                  f" | p99 {percentile(values, 0.99) * 1000:7.2f} ms")
+
+
+async def run_with_local_server(args):
+    with temp_dir() as path:
+        filename = os.path.join(path, 'patients.pat')
+        with quiet():
+            save_to_binary(make_patients(args.preload), filename)
+            manager = PatientManager(filename, max_keys=args.max_keys, journal=True)
+        server = await PatientServer(manager, port=0).start()
+        try:
+            await run(args, '127.0.0.1', server.port, args.preload)
+        finally:
+            await server.stop()
+            with quiet():
+                manager.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--connect', help="host:port của máy chủ đang chạy")
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--read-ratio', type=float, default=0.9)
+    parser.add_argument('--preload', type=int, default=100_000)
+    parser.add_argument('--max-keys', type=int, default=64)
+    parser.add_argument('--max-id', type=int, default=None, help="ID lớn nhất dùng cho lệnh đọc khi --connect")
+    args = parser.parse_args()
+    
+    if args.connect:
+        host, port = args.connect.rsplit(':', 1)
+        asyncio.run(run(args, host, int(port), args.max_id or args.preload))
+    else:
+        asyncio.run(run_with_local_server(args))
+
+
+if __name__ == '__main__':
+    main()
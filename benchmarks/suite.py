@@ -0,0 +1,149 @@
+"""Bộ benchmark tái lập được cho BTree và PatientManager.
+
+Đo BTree.insert (ID tuần tự), search (Zipf), delete (ngẫu nhiên), in_order_traversal,
+save_to_file và load_from_file theo từng cỡ dữ liệu và max_keys; ghi kết quả JSON và so sánh
+với baseline đã lưu (thoát với mã 1 nếu có thao tác chậm hơn ngưỡng).
+
+    python -m benchmarks.suite --sizes 1000 10000 100000 --max-keys 5 64 --output results.json
+    python -m benchmarks.suite --compare benchmarks/baseline.json
+    python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+"""
+import os
+import gc
+import sys
+import json
+import time
+import argparse
+import platform
+
+from benchmarks.common import quiet, temp_dir
+from benchmarks.workloads import sequential_patients, zipf_lookups, random_deletes
+from app import BTree, PatientManager
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+DEFAULT_MAX_KEYS = [5, 64]
+
+
+def best_of(repeat, func):
+    """Chạy func (trả về số giây) repeat lần, lấy lần nhanh nhất"""
+    return min(func() for _ in range(repeat))
+
+
+def stopwatch(func, *args):
+    gc.collect()
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def bench_case(n, max_keys, repeat, seed):
+    """Đo tất cả thao tác cho một cặp (n, max_keys), trả về danh sách kết quả"""
+    patients = sequential_patients(n, seed)
+    ids = [p.id for p in patients]
+    lookups = zipf_lookups(ids, n, seed=seed + 1)
+    victims = random_deletes(ids, 0.1, seed=seed + 2)
+    results = []
+
+    def record(name, seconds, ops):
+        results.append({'name': name, 'n': n, 'max_keys': max_keys, 'seconds': seconds,
+                        'ops_per_sec': ops / seconds if seconds else None})
+
+    def build():
+        tree = BTree(max_keys=max_keys)
+        for patient in patients:
+            tree.insert(patient)
+        return tree
+
+    def run_insert():
+        tree = BTree(max_keys=max_keys)
+        return stopwatch(lambda: [tree.insert(patient) for patient in patients])
+
+    record('insert_sequential', best_of(repeat, run_insert), n)
+    tree = build()
+    record('search_zipf', best_of(repeat, lambda: stopwatch(lambda: [tree.search(i) for i in lookups])), n)
+    record('in_order_traversal', best_of(repeat, lambda: stopwatch(tree.in_order_traversal)), n)
+
+    def run_delete():
+        victim_tree = build()
+        return stopwatch(lambda: [victim_tree.delete(i) for i in victims])
+
+    record('delete_random', best_of(repeat, run_delete), len(victims))
+    
+    with temp_dir() as path, quiet():
+        filename = os.path.join(path, 'patients.pat')
+        manager = PatientManager(filename, max_keys=max_keys)
+        manager.btree = tree
+        save_time = best_of(repeat, lambda: stopwatch(manager.save_to_file))
+        load_time = best_of(repeat, lambda: stopwatch(PatientManager, filename, max_keys))
+    record('save_to_file', save_time, n)
+    record('load_from_file', load_time, n)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """So sánh với baseline; trả về danh sách (tên, n, max_keys, tỉ lệ) chậm hơn ngưỡng"""
+    reference = {(r['name'], r['n'], r['max_keys']): r['seconds'] for r in baseline['results']}
+    regressions = []
+    print(f"\n{'thao tác':<20} {'N':>9} {'max_keys':>9} {'baseline (s)':>13} {'hiện tại (s)':>13} {'tỉ lệ':>7}")
+    for r in results:
+        key = (r['name'], r['n'], r['max_keys'])
+        if key not in reference:
+            continue
+        ratio = r['seconds'] / reference[key]
+        flag = ' <-- chậm hơn' if ratio > 1 + threshold else ''
+        print(f"{r['name']:<20} {r['n']:>9} {r['max_keys']:>9} {reference[key]:>13.4f} {r['seconds']:>13.4f} "
+              f"{ratio:>6.2f}x{flag}")
+        if flag:
+            regressions.append(key + (ratio,))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="Cỡ dữ liệu (1k..10M), mặc định %(default)s")
+    parser.add_argument('--max-keys', type=int, nargs='+', default=DEFAULT_MAX_KEYS)
+    parser.add_argument('--repeat', type=int, default=3, help="Lấy lần chạy nhanh nhất trong N lần")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="Ghi kết quả JSON ra file")
+    parser.add_argument('--compare', help="File baseline JSON để so sánh")
+    parser.add_argument('--threshold', type=float, default=0.25, help="Ngưỡng chậm hơn cho phép (0.25 = 25%%)")
+    parser.add_argument('--save-baseline', help="Ghi kết quả thành baseline mới")
+    args = parser.parse_args()
+    
+    results = []
+    print(f"{'thao tác':<20} {'N':>9} {'max_keys':>9} {'giây':>10} {'ops/s':>12}")
+    for n in args.sizes:
+        for max_keys in args.max_keys:
+            for r in bench_case(n, max_keys, args.repeat, args.seed):
+                results.append(r)
+                print(f"{r['name']:<20} {r['n']:>9} {r['max_keys']:>9} {r['seconds']:>10.4f} {r['ops_per_sec']:>12,.0f}")
+    
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+    for filename in filter(None, (args.output, args.save_baseline)):
+        with open(filename, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+        print(f"\n✓ Đã ghi kết quả vào '{filename}'")
+    
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        if regressions:
+            print(f"\n✗ {len(regressions)} thao tác chậm hơn baseline quá {args.threshold:.0%}")
+            return 1
+        print("\n✓ Không có thao tác nào chậm hơn baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
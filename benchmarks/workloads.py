@@ -0,0 +1,37 @@
+"""Sinh tải giả lập cho phòng khám: ID tuần tự như get_next_id, tra cứu theo phân phối Zipf
+(một số ít bệnh nhân được tra rất nhiều) và xóa ngẫu nhiên. Mọi hàm đều nhận seed để tái lập."""
+import random
+from bisect import bisect_left
+from itertools import accumulate
+
+from benchmarks.common import make_patients
+
+
+class ZipfSampler:
+    """Lấy mẫu hạng 1..n theo phân phối Zipf với số mũ s (dùng CDF + bisect)"""
+    def __init__(self, n, s=1.1, seed=0):
+        self.cdf = list(accumulate(1.0 / (rank ** s) for rank in range(1, n + 1)))
+        self.total = self.cdf[-1]
+        self.rng = random.Random(seed)
+
+    def sample(self):
+        return bisect_left(self.cdf, self.rng.random() * self.total) + 1
+
+
+def sequential_patients(n, seed=42):
+    """n bệnh nhân có ID 1..n, đúng thứ tự get_next_id sinh ra"""
+    return make_patients(n, seed)
+
+
+def zipf_lookups(ids, count, s=1.1, seed=1):
+    """count lượt tra cứu ID; các ID phổ biến được xáo trộn để không trùng với thứ tự ID"""
+    hot = list(ids)
+    random.Random(seed).shuffle(hot)
+    sampler = ZipfSampler(len(hot), s, seed)
+    return [hot[sampler.sample() - 1] for _ in range(count)]
+
+
+def random_deletes(ids, fraction=0.1, seed=2):
+    """Chọn ngẫu nhiên fraction số ID để xóa"""
+    ids = list(ids)
+    return random.Random(seed).sample(ids, int(len(ids) * fraction))
@@ -0,0 +1,101 @@
+"""Kiểm thử BTree: chuỗi thao tác ngẫu nhiên so với một danh sách ID đã sắp xếp"""
+import random
+from bisect import bisect_left, insort
+
+import pytest
+
+from app import BTree, PagedBTree, Patient
+
+
+def patient(patient_id):
+    return Patient(patient_id, f"Benh Nhan {patient_id}", patient_id % 90 + 1, 'Nam' if patient_id % 2 else 'Nu',
+                   '0901234567', '2025-01-15')
+
+
+@pytest.mark.parametrize('max_keys', [3, 4, 5, 16])
+@pytest.mark.parametrize('tombstones', [False, True])
+def test_random_operations_keep_size_invariants(max_keys, tombstones):
+    rng = random.Random(max_keys * 10 + tombstones)
+    tree = BTree(max_keys=max_keys, tombstones=tombstones)
+    reference = []
+    for step in range(1500):
+        op = rng.random()
+        if op < 0.45:
+            patient_id = rng.randrange(1, 500)
+            success, _ = tree.insert(patient(patient_id))
+            assert success == (patient_id not in reference)
+            if success:
+                insort(reference, patient_id)
+        elif op < 0.75:
+            patient_id = rng.randrange(1, 500)
+            assert bool(tree.delete(patient_id)) == (patient_id in reference)
+            if patient_id in reference:
+                reference.remove(patient_id)
+        elif op < 0.85:
+            patient_id = rng.randrange(0, 501)
+            assert tree.rank(patient_id) == bisect_left(reference, patient_id)
+        elif op < 0.95:
+            if reference:
+                k = rng.randrange(len(reference))
+                assert tree.select(k).id == reference[k]
+            with pytest.raises(IndexError):
+                tree.select(len(reference))
+        elif tombstones and op < 0.97:
+            tree.compact(rng.choice([None, 5]))
+        else:
+            lo, hi = sorted(rng.randrange(0, 501) for _ in range(2))
+            assert tree.count_range(lo, hi) == bisect_left(reference, hi + 1) - bisect_left(reference, lo)
+        assert tree.check_invariants(), step
+        assert tree.count() == len(reference)
+    assert [p.id for p in tree.iter_range()] == reference
+
+
+def test_display_marks_tombstoned_keys(capsys):
+    tree = BTree(max_keys=3, tombstones=True)
+    for patient_id in range(1, 8):
+        tree.insert(patient(patient_id))
+    tree.delete(3)
+    levels, _ = tree.level_summary()
+    assert sum(row['dead'] for row in levels) == 1
+    for show in (tree.display, tree.display_visual, tree.display_summary):
+        show()
+        out = capsys.readouterr().out
+        assert 'chờ compact: 1 key' in out
+    tree.display()
+    out = capsys.readouterr().out
+    assert '(3)' in out and '[3' not in out and ' 3]' not in out and ', 3,' not in out
+    tree.compact()
+    tree.display()
+    out = capsys.readouterr().out
+    assert '(3)' not in out and 'chờ compact' not in out
+
+def test_paged_rank_and_select_match_reference(tmp_path):
+    rng = random.Random(5)
+    ids = rng.sample(range(1, 2000), 300)
+    tree = PagedBTree(str(tmp_path / 'tree.pbt'), max_keys=5)
+    tree.insert_many(patient(patient_id) for patient_id in ids)
+    for patient_id in ids[:100]:
+        tree.delete(patient_id)
+    reference = sorted(ids[100:])
+    for patient_id in rng.sample(range(0, 2001), 50):
+        assert tree.rank(patient_id) == bisect_left(reference, patient_id)
+    for k in rng.sample(range(len(reference)), 50):
+        assert tree.select(k).id == reference[k]
+    with pytest.raises(IndexError):
+        tree.select(len(reference))
+    tree.close()
+
+
+def test_paged_snapshot_is_read_only_and_unaffected_by_writes(tmp_path):
+    tree = PagedBTree(str(tmp_path / 'tree.pbt'), max_keys=4)
+    tree.insert_many(patient(patient_id) for patient_id in range(1, 101))
+    snap = tree.snapshot()
+    tree.delete(50)
+    tree.insert(patient(500))
+    assert [p.id for p in snap.iter_range()] == list(range(1, 101))
+    assert snap.search(50) is not None and snap.search(500) is None
+    assert snap.rank(51) == 50 and snap.select(99).id == 100
+    with pytest.raises(TypeError):
+        snap.insert(patient(600))
+    assert tree.search(50) is None and tree.count() == 100
+    tree.close()
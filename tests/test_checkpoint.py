@@ -0,0 +1,40 @@
+"""Checkpoint tăng dần (.nodes): số byte còn dùng trong header phải khớp với các node đọc được từ root"""
+import os
+import random
+
+import pytest
+
+from app import BTree, NodeStore, PatientManager
+from benchmarks.common import make_patients
+
+
+def reachable_bytes(filename):
+    store = NodeStore(filename)
+    store.load(BTree())
+    return store.live_bytes, sum(store.extents.values())
+
+
+@pytest.mark.parametrize('compact_min_bytes', [NodeStore.COMPACT_MIN_BYTES, 16 * 1024])
+def test_live_bytes_match_reachable_nodes(tmp_path, monkeypatch, compact_min_bytes):
+    monkeypatch.setattr(NodeStore, 'COMPACT_MIN_BYTES', compact_min_bytes)
+    db = str(tmp_path / 'db.pat')
+    manager = PatientManager(db, journal=True, incremental=True, checkpoint_interval=20)
+    rng = random.Random(3)
+    patients = make_patients(3000)
+    for i, patient in enumerate(patients):
+        manager.insert_patient(patient, sync=False)
+        if i % 3 == 2:
+            manager.remove_patient(rng.choice(patients[:i]).id, sync=False)
+    manager._wait_checkpoint()
+    live_bytes, reachable = reachable_bytes(db + '.nodes')
+    assert manager.node_store.live_bytes == live_bytes == reachable
+    # Khi phần không còn dùng vượt quá nửa file, file được ghi lại nên không phình mãi
+    assert os.path.getsize(db + '.nodes') < max(compact_min_bytes, 3 * reachable)
+    expected = [p.id for p in manager.iter_range()]
+    manager.close()
+    
+    live_bytes, reachable = reachable_bytes(db + '.nodes')
+    assert live_bytes == reachable
+    manager = PatientManager(db, journal=True, incremental=True)
+    assert [p.id for p in manager.iter_range()] == expected
+    manager.close()
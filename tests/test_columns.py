@@ -0,0 +1,113 @@
+"""Kiểm thử PatientColumns: bản vòng lặp Python và bản NumPy cho cùng kết quả (cả sau khi xóa và dọn bảng)"""
+import datetime
+import random
+from collections import Counter
+
+import pytest
+
+from app import Patient, PatientColumns
+from benchmarks.common import make_patients
+
+FILTERS = [
+    {},
+    {'gender': 'Nam'},
+    {'gender': 'Khac'},
+    {'min_age': 30, 'max_age': 60},
+    {'max_age': 0},
+    {'start': '2025-03-01'},
+    {'end': '2025-06-30'},
+    {'start': '2025-04-01', 'end': '2025-04-30', 'gender': 'Nu', 'min_age': 20},
+    {'start': '2030-01-01'},
+]
+
+
+def make_table(stage, use_numpy):
+    """Bảng cột cùng danh sách bệnh nhân còn lại; có cả ngày khám không đọc được (NaT)"""
+    rng = random.Random(3)
+    patients = make_patients(2000)
+    for patient in rng.sample(patients, 100):
+        patient.visit_date = 'khong ro'
+    columns = PatientColumns.build(patients, use_numpy=use_numpy)
+    live = {patient.id: patient for patient in patients}
+    if stage in ('deleted', 'compacted'):
+        for patient_id in rng.sample(sorted(live), 700):
+            columns.remove(patient_id)
+            del live[patient_id]
+        # Sửa lại vài bệnh nhân (add thay dòng cũ) và thêm mới
+        for patient_id in rng.sample(sorted(live), 50):
+            patient = live[patient_id]
+            patient = live[patient_id] = Patient(patient.id, patient.name, (patient.age + 7) % 100, 'Nu',
+                                                 patient.phone, '2025-04-15')
+            columns.add(patient)
+        for patient in make_patients(2100)[2000:]:
+            live[patient.id] = patient
+            columns.add(patient)
+    if stage == 'compacted':
+        columns._compact()
+        assert columns.dead == 0 and len(columns.ids) == len(live)
+    return columns, sorted(live.values(), key=lambda p: p.id)
+
+
+def visit_day(patient):
+    try:
+        return datetime.date.fromisoformat(patient.visit_date)
+    except ValueError:
+        return None
+
+
+def matches(patient, start=None, end=None, gender=None, min_age=None, max_age=None):
+    day = visit_day(patient)
+    if (start is not None or end is not None) and day is None:
+        return False
+    return ((start is None or day >= datetime.date.fromisoformat(start)) and
+            (end is None or day <= datetime.date.fromisoformat(end)) and
+            (gender is None or patient.gender == gender) and
+            (min_age is None or patient.age >= min_age) and
+            (max_age is None or patient.age <= max_age))
+
+
+def reference(patients, filters):
+    """Kết quả tính trực tiếp trên danh sách bệnh nhân"""
+    chosen = [patient for patient in patients if matches(patient, **filters)]
+    dated = [visit_day(patient) for patient in chosen if visit_day(patient) is not None]
+    histogram = {}
+    for patient in chosen:
+        cell = histogram.setdefault(patient.gender, {})
+        cell[patient.age // 10 * 10] = cell.get(patient.age // 10 * 10, 0) + 1
+    return {
+        'count': len(chosen),
+        'ids': [patient.id for patient in chosen],
+        'gender': dict(sorted(Counter(patient.gender for patient in chosen).items())),
+        'age': dict(sorted(Counter(patient.age // 10 * 10 for patient in chosen).items())),
+        'day': dict(sorted(Counter(day.isoformat() for day in dated).items())),
+        'month': dict(sorted(Counter(day.isoformat()[:7] for day in dated).items())),
+        'histogram': {gender: dict(sorted(cell.items())) for gender, cell in sorted(histogram.items())},
+    }
+
+
+def results(columns, filters):
+    result = {'count': columns.count(**filters), 'ids': columns.select_ids(**filters),
+              'histogram': columns.histogram(**filters)}
+    for by in PatientColumns.GROUPS:
+        result[by] = columns.group_count(by, **filters)
+    return result
+
+
+@pytest.mark.parametrize('stage', ['fresh', 'deleted', 'compacted'])
+def test_python_path_matches_reference(stage):
+    columns, patients = make_table(stage, use_numpy=False)
+    for filters in FILTERS:
+        assert results(columns, filters) == reference(patients, filters), filters
+    assert results(PatientColumns(use_numpy=False), {}) == {
+        'count': 0, 'ids': [], 'histogram': {}, 'gender': {}, 'age': {}, 'day': {}, 'month': {}}
+
+
+@pytest.mark.parametrize('stage', ['fresh', 'deleted', 'compacted'])
+def test_numpy_path_matches_python_path(stage):
+    pytest.importorskip('numpy')
+    python_columns, _ = make_table(stage, use_numpy=False)
+    numpy_columns, _ = make_table(stage, use_numpy=True)
+    assert numpy_columns.np is not None
+    for filters in FILTERS:
+        assert results(numpy_columns, filters) == results(python_columns, filters), filters
+    assert results(PatientColumns(use_numpy=True), {}) == results(PatientColumns(use_numpy=False), {})
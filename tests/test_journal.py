@@ -0,0 +1,76 @@
+"""Khôi phục sau sự cố: nhật ký bị cắt ở mọi vị trí byte hoặc hỏng phần đuôi"""
+import os
+import random
+
+from app import Journal, PatientManager, patient_to_fields
+from benchmarks.common import make_patients
+
+
+def write_journal(filename, records):
+    """Ghi các bản ghi, trả về nội dung file và vị trí kết thúc của từng bản ghi"""
+    journal = Journal(filename, fsync=False)
+    ends = []
+    for op, value in records:
+        journal.append(op, value)
+        ends.append(os.path.getsize(filename))
+    journal.close()
+    with open(filename, 'rb') as file:
+        return file.read(), ends
+
+
+def test_replay_keeps_exactly_the_complete_prefix(tmp_path):
+    filename = str(tmp_path / 'p.pat.log')
+    records = [('I', patient_to_fields(p)) for p in make_patients(12)] + [('D', 3), ('D', 7)]
+    data, ends = write_journal(filename, records)
+    
+    for offset in range(len(data) + 1):
+        with open(filename, 'wb') as file:
+            file.write(data[:offset])
+        complete = sum(1 for end in ends if end <= offset)
+        journal = Journal(filename, fsync=False)
+        assert journal.replay() == records[:complete]
+        # Phần đuôi cắt dở bị cắt khỏi file nên bản ghi mới nối tiếp ngay sau phần hợp lệ
+        assert os.path.getsize(filename) == (ends[complete - 1] if complete else 0)
+        journal.open()
+        journal.append('D', 99)
+        journal.close()
+        assert Journal(filename, fsync=False).replay()[-1] == ('D', 99)
+
+
+def test_replay_ignores_corrupt_tail_record(tmp_path):
+    filename = str(tmp_path / 'p.pat.log')
+    records = [('I', patient_to_fields(p)) for p in make_patients(5)]
+    data, ends = write_journal(filename, records)
+    rng = random.Random(1)
+    for _ in range(50):
+        # Hỏng một byte bất kỳ của bản ghi cuối (header hoặc payload): CRC/độ dài không khớp
+        pos = rng.randrange(ends[-2], ends[-1])
+        corrupt = bytearray(data)
+        corrupt[pos] ^= 1 << rng.randrange(8)
+        with open(filename, 'wb') as file:
+            file.write(corrupt)
+        assert Journal(filename, fsync=False).replay() == records[:-1]
+        assert os.path.getsize(filename) == ends[-2]
+
+
+def test_manager_recovers_prefix_after_truncated_log(tmp_path):
+    db = str(tmp_path / 'db.pat')
+    manager = PatientManager(db, journal=True)
+    ends = []
+    for patient in make_patients(30):
+        manager.insert_patient(patient)
+        ends.append(os.path.getsize(db + '.log'))
+    manager.journal.close()  # Dừng đột ngột: không checkpoint
+    with open(db + '.log', 'rb') as file:
+        data = file.read()
+    
+    rng = random.Random(7)
+    for offset in sorted(rng.sample(range(len(data) + 1), 40)) + [0, len(data)]:
+        with open(db + '.log', 'wb') as file:
+            file.write(data[:offset])
+        complete = sum(1 for end in ends if end <= offset)
+        manager = PatientManager(db, journal=True)
+        assert manager.count() == complete
+        assert [p.id for p in manager.iter_range()] == list(range(1, complete + 1))
+        assert manager.next_id == complete + 1
+        manager.journal.close()
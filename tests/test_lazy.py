@@ -0,0 +1,96 @@
+"""Backend lazy: cây chỉ giữ ID + vị trí bản ghi, Patient đọc từ file .pat qua RecordStore (LRU)"""
+import os
+
+import pytest
+
+from app import BINARY_VERSION, PatientManager, PatientRef, RecordStore, save_to_binary
+from benchmarks.common import make_patients
+
+
+@pytest.fixture
+def db(tmp_path):
+    filename = str(tmp_path / 'db.pat')
+    save_to_binary(make_patients(200), filename, BINARY_VERSION)
+    return filename
+
+
+def test_cache_respects_entry_limit_and_counts(db):
+    store = RecordStore(db, max_entries=10)
+    refs = list(store.refs())
+    assert [ref.id for ref in refs] == list(range(1, 201))
+    for ref in refs[:50]:
+        assert store.get(ref).id == ref.id
+    assert store.get(refs[49]) is store.get(refs[49])
+    stats = store.stats()
+    assert (stats['entries'], stats['misses'], stats['hits'], stats['evictions']) == (10, 50, 2, 40)
+    assert stats['hit_rate'] == pytest.approx(2 / 52)
+    # Bản ghi dùng gần nhất được giữ, bản cũ nhất bị đẩy ra
+    store.get(refs[40])
+    store.get(refs[0])
+    assert refs[40].offset in store.cache and refs[41].offset not in store.cache
+    store.close()
+
+
+def test_cache_respects_byte_limit(db):
+    store = RecordStore(db, max_entries=None, max_bytes=4096)
+    for ref in store.refs():
+        store.get(ref)
+        assert store.nbytes <= 4096
+    assert 0 < store.stats()['entries'] < 200
+    assert store.nbytes == sum(size for _, size in store.cache.values())
+    store.read(next(store.refs()))  # Đọc thẳng không qua cache
+    assert store.stats()['misses'] == 200
+    store.close()
+
+
+def test_lazy_manager_reads_writes_and_reopens(db):
+    manager = PatientManager(db, journal=True, backend='lazy', cache_entries=20)
+    assert all(type(key) is PatientRef for key in manager.btree._iter_in_order(None))
+    assert manager.search(7).name == make_patients(200)[6].name
+    # Quét toàn bộ (xuất file, tạo chỉ mục) không làm đầy cache
+    assert [p.id for p in manager._scan()] == list(range(1, 201))
+    assert manager.btree.store.stats()['entries'] == 1
+    manager.insert_patient(make_patients(201)[-1])
+    manager.remove_patient(3)
+    manager.checkpoint()
+    assert os.path.getsize(db + '.log') == 0
+    manager.close()
+    
+    manager = PatientManager(db, journal=True, backend='lazy')
+    assert manager.count() == 200 and manager.search(3) is None and manager.search(201).id == 201
+    manager.close()
+
+
+def test_lazy_save_closes_the_old_file_before_replacing_it(db, monkeypatch):
+    """Windows không cho thay file đang được mmap: giả lập bằng cách từ chối os.replace khi store còn mở"""
+    manager = PatientManager(db, journal=True, backend='lazy')
+    real_replace = os.replace
+    
+    def strict_replace(source, target):
+        if target == db and manager.btree.store is not None:
+            raise PermissionError(f"'{target}' đang được mở")
+        real_replace(source, target)
+    monkeypatch.setattr(os, 'replace', strict_replace)
+    
+    manager.remove_patient(1)
+    manager.checkpoint()
+    assert os.path.getsize(db + '.log') == 0
+    assert manager.search(2).id == 2 and manager.btree.store is not None
+    manager.close()
+    assert PatientManager(db, backend='lazy').count() == 199
+
+
+def test_lazy_save_failure_keeps_store_and_journal(db, monkeypatch):
+    manager = PatientManager(db, journal=True, backend='lazy')
+    manager.remove_patient(1)
+    
+    def failing_replace(source, target):
+        raise PermissionError(f"'{target}' đang được mở")
+    monkeypatch.setattr(os, 'replace', failing_replace)
+    manager.checkpoint()
+    # File cũ được mở lại: vẫn đọc được, nhật ký giữ nguyên để không mất thao tác
+    assert manager.search(2).id == 2
+    assert manager.journal.entries == 1 and os.path.getsize(db + '.log') > 0
+    monkeypatch.undo()
+    manager.close()
+    assert PatientManager(db, backend='lazy').count() == 199
@@ -0,0 +1,82 @@
+"""Kiểm thử PatientManager và các lệnh dòng lệnh trên thư mục tạm"""
+import os
+
+import pytest
+
+from app import Patient, PatientManager, main, validate_patient
+from benchmarks.common import make_patients
+
+
+def write_rows(filename, patients):
+    with open(filename, 'w', encoding='utf-8') as file:
+        for p in patients:
+            file.write(f"{p.id}#{p.name}#{p.age}#{p.gender}#{p.phone}#{p.visit_date}\n")
+
+
+def test_import_after_incremental_session_is_kept(tmp_path):
+    db = str(tmp_path / 'db.pat')
+    manager = PatientManager(db, journal=True, incremental=True)
+    for patient in make_patients(10):
+        manager.insert_patient(patient)
+    manager.close()
+    assert os.path.exists(db + '.nodes')
+    
+    source = str(tmp_path / 'in.txt')
+    write_rows(source, [Patient(100, 'Le Van Moi', 40, 'Nam', '0901234567', '2025-06-01')])
+    assert main(['--incremental', 'import', source, '--db', db]) == 0
+    write_rows(source, [Patient(101, 'Tran Thi Hai', 33, 'Nu', '0912345678', '2025-06-02')])
+    assert main(['import', source, '--db', db]) == 0
+    
+    for incremental in (True, False):
+        manager = PatientManager(db, journal=True, incremental=incremental)
+        assert manager.count() == 12
+        assert manager.search(100).name == 'Le Van Moi'
+        assert manager.search(101).name == 'Tran Thi Hai'
+        manager.close()
+
+
+def test_export_includes_journaled_writes(tmp_path):
+    db = str(tmp_path / 'db.pat')
+    manager = PatientManager(db, journal=True)
+    for patient in make_patients(5):
+        manager.insert_patient(patient)
+    # Chưa checkpoint: 5 thao tác chỉ nằm trong nhật ký (như máy chủ đang chạy hoặc vừa bị dừng đột ngột)
+    assert not os.path.exists(db)
+    
+    # Máy chủ đang ghi dở bản ghi tiếp theo
+    manager.journal.file.write(b'\x40\x00')
+    manager.journal.sync()
+    with open(db + '.log', 'rb') as file:
+        log = file.read()
+    
+    target = str(tmp_path / 'out.txt')
+    assert main(['export', target, '--db', db]) == 0
+    with open(target, encoding='utf-8') as file:
+        assert [line.split('#')[0] for line in file] == ['1', '2', '3', '4', '5']
+    # Xuất chỉ đọc: không checkpoint, không cắt nhật ký của phiên đang chạy
+    assert not os.path.exists(db)
+    with open(db + '.log', 'rb') as file:
+        assert file.read() == log
+
+
+@pytest.mark.parametrize('field, value', [('phone', 901234567), ('name', None), ('gender', 1),
+                                          ('visit_date', 20250115), ('age', '30'), ('id', 1.5)])
+def test_validate_patient_checks_field_types(field, value):
+    patient = Patient(1, 'Le Van An', 30, 'Nam', '0901234567', '2025-01-15')
+    setattr(patient, field, value)
+    with pytest.raises(ValueError):
+        validate_patient(patient)
+
+
+def test_failed_persist_leaves_no_record_behind(tmp_path, monkeypatch):
+    manager = PatientManager(str(tmp_path / 'db.pat'), journal=True)
+    manager.index  # Chỉ mục phụ đã tạo cũng không được giữ bản ghi chưa lưu
+    
+    def broken_persist(op, value, sync=True):
+        raise OSError("đĩa đầy")
+    monkeypatch.setattr(manager, '_persist', broken_persist)
+    with pytest.raises(OSError):
+        manager.insert_patient(Patient(1, 'Le Van An', 30, 'Nam', '0901234567', '2025-01-15'))
+    assert manager.count() == 0
+    assert manager.search(1) is None
+    assert manager.find_by_phone('0901234567') == []
@@ -0,0 +1,88 @@
+"""Kiểm thử NameIndex: cập nhật khi thêm/xóa, file .names và dấu vết dữ liệu (stamp)"""
+import random
+
+import pytest
+
+from app import NameIndex, Patient, PatientManager
+from benchmarks.common import make_patients
+
+
+def snapshot(index):
+    """Nội dung logic của chỉ mục (không phụ thuộc số thứ tự tên/từ)"""
+    names = {term: list(index.patients[term_id]) for term, term_id in index.term_ids.items()
+             if index.patients[term_id]}
+    suffixes = [index._suffix_key(code) for code in index.suffixes]
+    return names, index.sorted_terms, suffixes
+
+
+def queries(index):
+    return ([index.complete(prefix, 50) for prefix in ('nguyen', 'van', 'thi h', 'an', 'le v')] +
+            [index.search(query, 20) for query in ('nguyen van an', 'tran thi hoa', 'lee van')])
+
+
+def test_add_and_remove_keep_suffix_array_in_order():
+    rng = random.Random(7)
+    patients = make_patients(400)
+    index = NameIndex.build(patients[:200])
+    live = {p.id: p for p in patients[:200]}
+    for patient in patients[200:]:
+        index.add(patient)
+        live[patient.id] = patient
+        if rng.random() < 0.5:
+            victim = live.pop(rng.choice(list(live)))
+            index.remove(victim)
+    extra = Patient(1000, 'Zo Xu Quy', 30, 'Nam', '0901234567', '2025-01-15')
+    index.add(extra)
+    live[extra.id] = extra
+    
+    keys = [index._suffix_key(code) for code in index.suffixes]
+    assert keys == sorted(keys)
+    expected = NameIndex.build(sorted(live.values(), key=lambda p: p.id))
+    assert snapshot(index) == snapshot(expected)
+    assert queries(index) == queries(expected)
+    assert index.complete('xu q') == [('zo xu quy', 1)]
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = NameIndex.build(make_patients(300))
+    for patient in make_patients(300)[::3]:
+        index.remove(patient)
+    filename = str(tmp_path / 'db.pat.names')
+    stamp = (1, 2, 3, 4, 5, 6)
+    index.save(filename, stamp)
+    
+    loaded = NameIndex.load(filename, stamp)
+    assert loaded is not None and loaded.stamp == stamp
+    assert snapshot(loaded) == snapshot(index)
+    assert queries(loaded) == queries(index)
+    assert NameIndex.load(filename, (1, 2, 3, 4, 5, 7)) is None
+    assert NameIndex.load(str(tmp_path / 'missing.names'), stamp) is None
+    with open(filename, 'r+b') as file:
+        file.write(b'XXXX')
+    assert NameIndex.load(filename, stamp) is None
+
+
+@pytest.mark.parametrize('journal', [False, True])
+def test_names_file_is_ignored_after_a_write(tmp_path, monkeypatch, journal):
+    db = str(tmp_path / 'db.pat')
+    manager = PatientManager(db, journal=journal)
+    for patient in make_patients(50):
+        manager.insert_patient(patient)
+    manager.suggest_names('nguyen')
+    manager.close()
+    
+    # Dữ liệu không đổi: chỉ mục được đọc lại từ file .names, không tạo lại
+    build = NameIndex.build
+    monkeypatch.setattr(NameIndex, 'build', classmethod(lambda cls, patients: pytest.fail('rebuilt')))
+    manager = PatientManager(db, journal=journal)
+    assert manager.name_index.stamp is not None
+    # Ghi mà không dùng tới chỉ mục tên: file .names không được ghi lại nên đã cũ
+    manager._names = None
+    manager.insert_patient(Patient(51, 'Zo Van Moi', 40, 'Nam', '0901234567', '2025-06-01'))
+    manager.close()
+    
+    monkeypatch.setattr(NameIndex, 'build', build)
+    manager = PatientManager(db, journal=journal)
+    assert manager.suggest_names('zo van') == [('zo van moi', 1)]
+    assert [p.id for _, p in manager.find_by_name_fuzzy('zo van moi')][:1] == [51]
+    manager.close()
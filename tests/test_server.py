@@ -0,0 +1,138 @@
+"""Kiểm thử PatientServer qua kết nối TCP thật (cổng ngẫu nhiên)"""
+import json
+import asyncio
+
+from app import PatientManager, PatientServer
+from benchmarks.common import make_patients
+
+PATIENT = {'name': 'Nguyen Van An', 'age': 30, 'gender': 'Nam', 'phone': '0901234567', 'visit_date': '2025-01-15'}
+
+
+async def talk(server, requests):
+    """Gửi lần lượt các yêu cầu trên một kết nối, trả về các phản hồi"""
+    reader, writer = await asyncio.open_connection(server.host, server.port)
+    replies = []
+    for request in requests:
+        data = request if isinstance(request, bytes) else json.dumps(request).encode('utf-8')
+        writer.write(data + b'\n')
+        await writer.drain()
+        replies.append(json.loads(await reader.readline()))
+    writer.close()
+    await writer.wait_closed()
+    return replies
+
+
+def run(manager, scenario, **options):
+    async def main():
+        server = await PatientServer(manager, port=0, **options).start()
+        try:
+            return await scenario(server)
+        finally:
+            await server.stop()
+    return asyncio.run(main())
+
+
+def test_bad_requests_get_an_error_and_keep_the_connection(tmp_path):
+    manager = PatientManager(str(tmp_path / 'db.pat'), journal=True)
+    replies = run(manager, lambda server: talk(server, [
+        b'not json',
+        [1],
+        'add',
+        {'op': 'nope'},
+        {'op': 'search'},
+        {'op': 'search', 'id': 'abc'},
+        dict(PATIENT, op='add', phone=901234567),
+        dict(PATIENT, op='add', age=None),
+        {'op': 'fuzzy_name', 'name': 5},
+        {'op': 'suggest_name', 'prefix': None},
+        {'op': 'ping'},
+    ]))
+    assert [reply['ok'] for reply in replies] == [False] * 10 + [True]
+    assert all(reply['error'] for reply in replies[:-1])
+    assert replies[-1]['result'] == 'pong'
+    assert manager.count() == 0 and manager.search(1) is None
+    manager.close()
+
+
+def test_read_and_write_paths(tmp_path):
+    db = str(tmp_path / 'db.pat')
+    manager = PatientManager(db, journal=True)
+    
+    async def scenario(server):
+        replies = await talk(server, [
+            dict(PATIENT, op='add'),
+            dict(PATIENT, op='add', id=10, name='Tran Thi Binh', gender='Nu', phone='0912345678',
+                 visit_date='2025-02-01'),
+            dict(PATIENT, op='add', id=10),
+            {'op': 'search', 'id': 10},
+            {'op': 'search_many', 'ids': [1, 2, 10]},
+            {'op': 'count'},
+            {'op': 'range', 'lo': 1, 'hi': 5},
+            {'op': 'find_phone', 'phone': '0912345678'},
+            {'op': 'find_name', 'prefix': 'tran'},
+            {'op': 'find_date', 'start': '2025-01-01', 'end': '2025-01-31'},
+            {'op': 'suggest_name', 'prefix': 'nguy'},
+            {'op': 'fuzzy_name', 'name': 'Nguyen Van Anh'},
+            {'op': 'delete', 'id': 1},
+            {'op': 'delete', 'id': 1},
+            {'op': 'count'},
+        ])
+        return [reply.get('result', reply.get('error')) for reply in replies]
+    
+    (added, added_id, duplicate, found, many, count, listed, by_phone, by_name, by_date, suggested, fuzzy,
+     deleted, deleted_again, count_after) = run(manager, scenario)
+    assert (added, added_id) == (1, 10)
+    assert 'đã tồn tại' in duplicate
+    assert found['name'] == 'Tran Thi Binh'
+    assert [p and p['id'] for p in many] == [1, None, 10]
+    assert count == 2 and count_after == 1
+    assert [p['id'] for p in listed] == [1]
+    assert [p['id'] for p in by_phone] == [10]
+    assert [p['id'] for p in by_name] == [10]
+    assert [p['id'] for p in by_date] == [1]
+    assert suggested == [['nguyen van an', 1]]
+    assert fuzzy[0]['id'] == 1 and 0 < fuzzy[0]['score'] <= 1
+    assert (deleted, deleted_again) == (True, False)
+    manager.close()
+    
+    manager = PatientManager(db, journal=True)
+    assert [p.id for p in manager.iter_range()] == [10]
+    manager.close()
+
+
+def test_concurrent_writes_share_commits(tmp_path):
+    db = str(tmp_path / 'db.pat')
+    manager = PatientManager(db, journal=True)
+    commits = []
+    commit = manager.commit
+    manager.commit = lambda: (commits.append(1), commit())
+    
+    async def scenario(server):
+        sessions = [talk(server, [dict(PATIENT, op='add', id=desk * 100 + i) for i in range(1, 6)])
+                    for desk in range(1, 9)]
+        return sum(await asyncio.gather(*sessions), [])
+    
+    replies = run(manager, scenario, commit_delay=0.05)
+    assert all(reply['ok'] for reply in replies) and len(replies) == 40
+    # Mỗi lệnh ghi chỉ được xác nhận sau commit, nhưng các quầy ghi cùng lúc dùng chung một lần fsync
+    assert 1 <= len(commits) < 40
+    manager.journal.close()  # Dừng đột ngột: chỉ còn nhật ký
+    manager = PatientManager(db, journal=True)
+    assert manager.count() == 40
+    manager.close()
+
+
+def test_indexes_are_built_before_serving(tmp_path):
+    manager = PatientManager(str(tmp_path / 'db.pat'), journal=True)
+    for patient in make_patients(20):
+        manager.insert_patient(patient)
+    manager.close()
+    manager = PatientManager(str(tmp_path / 'db.pat'), journal=True)
+    assert manager._index is None and manager._names is None
+    
+    async def scenario(server):
+        assert manager._index is not None and manager._names is not None
+        return await talk(server, [{'op': 'suggest_name', 'prefix': 'zzz'}])
+    
+    assert run(manager, scenario) == [{'ok': True, 'result': []}]
+    manager.close()
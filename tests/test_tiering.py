@@ -0,0 +1,85 @@
+"""Kiểm thử phân tầng nóng/lạnh của PatientManager"""
+import time
+import datetime
+
+import app
+from app import ColdSegment, PatientManager, format_patient_row
+from benchmarks.common import make_patients
+
+
+def old_and_new(n):
+    """n bệnh nhân, ID lẻ khám từ năm 2000 (cần chuyển sang tầng lạnh), ID chẵn khám hôm nay"""
+    today = datetime.date.today().isoformat()
+    patients = make_patients(n)
+    for patient in patients:
+        patient.visit_date = '2000-01-01' if patient.id % 2 else today
+    return patients
+
+
+def test_first_archive_moves_records_added_after_open(tmp_path):
+    db = str(tmp_path / 'db.pat')
+    source = tmp_path / 'in.txt'
+    source.write_text(''.join(format_patient_row(p) + '\n' for p in old_and_new(1000)), encoding='utf-8')
+    # Lần lưu trữ bắt đầu lúc mở file (cây rỗng) chưa được áp dụng khi nhập hàng loạt
+    manager = PatientManager(db, journal=True, hot_days=30, archive_interval=1e9)
+    assert manager.import_file(str(source)) == (1000, [])
+    assert manager.archive() == 500
+    assert len(manager.cold) == 500 and manager.btree.count() == 500
+    assert manager.count() == 1000
+    manager.close()
+    
+    manager = PatientManager(db, journal=True, hot_days=30, archive_interval=1e9)
+    assert manager.count() == 1000
+    assert manager.search(1).visit_date == '2000-01-01'
+    assert manager.archive() == 0
+    manager.close()
+
+
+def make_tiered(db, n=1000):
+    """File .pat + .cold: ID lẻ ở tầng lạnh, ID chẵn ở tầng nóng"""
+    manager = PatientManager(db, journal=True, hot_days=30, archive_interval=1e9)
+    for patient in old_and_new(n):
+        manager.insert_patient(patient, sync=False)
+    assert manager.archive() == n // 2
+    manager.close()
+
+
+class SlowSegment(ColdSegment):
+    def __init__(self, *args, **kwargs):
+        time.sleep(0.2)
+        super().__init__(*args, **kwargs)
+
+
+def test_background_load_waits_before_reading_cold(tmp_path, monkeypatch):
+    db = str(tmp_path / 'db.pat')
+    make_tiered(db)
+    monkeypatch.setattr(app, 'ColdSegment', SlowSegment)
+    
+    manager = PatientManager(db, journal=True, background_load=True)
+    assert [p.id for p in manager.page(None, 3)] == [1, 2, 3]
+    manager.close()
+    manager = PatientManager(db, journal=True, background_load=True)
+    assert manager.count() == 1000
+    manager.close()
+    manager = PatientManager(db, journal=True, background_load=True)
+    assert [p.id for p in manager._scan()][:3] == [1, 2, 3]
+    manager.close()
+    manager = PatientManager(db, journal=True, background_load=True)
+    success, _ = manager.insert_patient(make_patients(1)[0])
+    assert not success
+    assert manager.count() == 1000
+    manager.close()
+
+
+def test_unparseable_visit_dates_stay_hot(tmp_path):
+    db = str(tmp_path / 'db.pat')
+    manager = PatientManager(db, journal=True, hot_days=30, archive_interval=1e9)
+    patients = make_patients(4)
+    for patient, visit_date in zip(patients, ['2000-01-01', datetime.date.today().strftime('%d/%m/%Y'),
+                                              '15-01-2000', '']):
+        patient.visit_date = visit_date
+        manager.insert_patient(patient, sync=False)
+    assert manager.archive() == 1
+    assert [p.id for p in manager.cold.iter_range()] == [1]
+    assert [p.id for p in manager.btree.iter_range()] == [2, 3, 4]
+    manager.close()
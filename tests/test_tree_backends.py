@@ -0,0 +1,132 @@
+"""Cùng một bộ kiểm thử hành vi cho BTree (trong bộ nhớ) và PagedBTree (trang trên file)"""
+import random
+
+import pytest
+
+from app import BTree, PagedBTree, Patient, load_from_binary, save_to_binary
+
+
+def patient(patient_id, name=None):
+    return Patient(patient_id, name or f"Benh Nhan {patient_id}", patient_id % 90 + 1,
+                   'Nam' if patient_id % 2 else 'Nu', f"09{patient_id:08d}", '2025-01-15')
+
+
+class MemoryBackend:
+    def __init__(self, path):
+        self.filename = str(path / 'tree.pat')
+
+    def open(self, max_keys):
+        return BTree(max_keys=max_keys)
+
+    def reopen(self, tree):
+        """Lưu ra file .pat rồi dựng lại cây như PatientManager khi khởi động"""
+        save_to_binary(tree.iter_range(), self.filename)
+        return BTree.from_sorted(load_from_binary(self.filename), tree.max_keys)
+
+
+class PagedBackend:
+    def __init__(self, path):
+        self.filename = str(path / 'tree.pbt')
+
+    def open(self, max_keys):
+        return PagedBTree(self.filename, max_keys=max_keys)
+
+    def reopen(self, tree):
+        tree.close()
+        return PagedBTree(self.filename)
+
+
+@pytest.fixture(params=[MemoryBackend, PagedBackend], ids=['memory', 'paged'])
+def backend(request, tmp_path):
+    return request.param(tmp_path)
+
+
+@pytest.fixture
+def tree(backend):
+    tree = backend.open(max_keys=4)
+    yield tree
+    if isinstance(tree, PagedBTree):
+        tree.close()
+
+
+def shuffled(ids, seed=1):
+    ids = list(ids)
+    random.Random(seed).shuffle(ids)
+    return ids
+
+
+def test_insert_search_delete(tree):
+    for patient_id in shuffled(range(1, 201)):
+        assert tree.insert(patient(patient_id))[0]
+    assert not tree.insert(patient(17))[0]
+    assert tree.count() == 200
+    assert tree.search(17).name == 'Benh Nhan 17'
+    assert tree.search(0) is None and tree.search(201) is None
+    assert [p and p.id for p in tree.search_many([5, 500, 1])] == [5, None, 1]
+    
+    for patient_id in shuffled(range(1, 201, 3), seed=2):
+        assert tree.delete(patient_id)
+    assert not tree.delete(1)
+    remaining = [i for i in range(1, 201) if i % 3 != 1]
+    assert tree.count() == len(remaining)
+    assert all(tree.search(i) is None for i in range(1, 201, 3))
+    assert [p.id for p in tree.in_order_traversal()] == remaining
+    assert tree.max_id() == 200
+
+
+def test_update_replaces_record(tree):
+    for patient_id in range(1, 51):
+        tree.insert(patient(patient_id))
+    assert tree.delete(20)
+    assert tree.insert(patient(20, 'Ten Moi'))[0]
+    assert tree.search(20).name == 'Ten Moi'
+    assert tree.count() == 50
+
+
+def test_iteration_range_and_page(tree):
+    ids = shuffled(range(2, 402, 2))
+    tree.insert_many(patient(patient_id) for patient_id in ids)
+    assert [p.id for p in tree.iter_range()] == sorted(ids)
+    assert [p.id for p in tree.iter_range(11, 31)] == [12, 14, 16, 18, 20, 22, 24, 26, 28, 30]
+    assert [p.id for p in tree.iter_range(390, None)] == list(range(390, 401, 2))
+    assert list(tree.iter_range(500, 600)) == []
+    assert tree.count_range(10, 20) == 6
+    
+    pages = []
+    after = None
+    while True:
+        page = tree.page(after, 37)
+        if not page:
+            break
+        pages.append([p.id for p in page])
+        after = page[-1].id
+    assert [len(page) for page in pages] == [37] * 5 + [15]
+    assert sum(pages, []) == sorted(ids)
+    assert [p.id for p in tree.page(395, 10)] == [396, 398, 400]
+
+
+def test_delete_many_and_purge_where(tree):
+    tree.insert_many(patient(patient_id) for patient_id in range(1, 101))
+    removed = tree.delete_many([3, 5, 1000, 7])
+    assert sorted(p.id for p in removed) == [3, 5, 7]
+    purged = tree.purge_where(lambda p: p.id % 10 == 0)
+    assert len(purged) == 10
+    assert tree.count() == 87
+    assert [p.id for p in tree.iter_range(1, 12)] == [1, 2, 4, 6, 8, 9, 11, 12]
+
+
+def test_reopen_keeps_data(backend):
+    tree = backend.open(max_keys=5)
+    tree.bulk_load(patient(patient_id) for patient_id in range(1, 301))
+    for patient_id in range(1, 301, 7):
+        tree.delete(patient_id)
+    tree.insert(patient(1000, 'Nguyen Thi Cuoi'))
+    expected = [(p.id, p.name, p.age, p.gender, p.phone, p.visit_date) for p in tree.iter_range()]
+    
+    tree = backend.reopen(tree)
+    assert [(p.id, p.name, p.age, p.gender, p.phone, p.visit_date) for p in tree.iter_range()] == expected
+    assert tree.count() == len(expected)
+    assert tree.search(1000).name == 'Nguyen Thi Cuoi'
+    assert tree.insert(patient(1001))[0] and tree.count() == len(expected) + 1
+    if isinstance(tree, PagedBTree):
+        tree.close()